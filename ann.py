@@ -0,0 +1,450 @@
+import inspect
+import json
+import os
+import numpy as np
+
+from sklearn.base import BaseEstimator, ClassifierMixin, RegressorMixin
+
+# tìm láng giềng gần đúng bằng NumPy cho KNN khi tập đào tạo rất lớn
+#     model = ApproximateKNeighborsClassifier(n_neighbors=5, p=2, index="ivf", index_params={"n_probe": 8})
+#     EmotionRecognizer(KNeighborsClassifier(), knn_index="ivf", knn_index_params={"n_probe": 8})
+# chỉ mục chỉ chọn ra các ứng viên, khoảng cách Minkowski (p) được tính chính xác trên ứng viên nên
+# sai khác so với KNN của sklearn chỉ đến từ các láng giềng không nằm trong ứng viên (recall)
+
+FORMAT_VERSION = 1
+# số phần tử tối đa của ma trận khoảng cách trung gian khi tính theo khối
+BLOCK_SIZE = 2 ** 22
+DATA_BLOCK_ROWS = 65536
+
+
+def pairwise_distances(X, Y, p=2):
+    "Khoảng cách Minkowski bậc `p` giữa từng dòng của `X` và `Y`"
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if p == 2:
+        distances = (X ** 2).sum(axis=1)[:, None] + (Y ** 2).sum(axis=1)[None, :] - 2 * X @ Y.T
+        return np.sqrt(np.maximum(distances, 0))
+    difference = np.abs(X[:, None, :] - Y[None, :, :])
+    if p == 1:
+        return difference.sum(axis=2)
+    return (difference ** p).sum(axis=2) ** (1 / p)
+
+
+def _top_k(distances, candidates, k):
+    # k ứng viên gần nhất, sắp xếp tăng dần
+    if len(candidates) > k:
+        index = np.argpartition(distances, k - 1)[:k]
+        distances, candidates = distances[index], candidates[index]
+    order = np.argsort(distances, kind="stable")
+    return distances[order], candidates[order]
+
+
+class NeighborIndex:
+    """
+    Lop co so cua chi muc: `fit(X)` xay chi muc, `search(Q, k)` tra ve (khoang cach, chi so) k lang gieng gan nhat
+    cua tung dong, `save(folder)` / `load(folder)` luu moi mang thanh mot tep .npy (mo lai duoc bang mmap)
+    Lop con chi can `_build` va `_candidates` (chi so cac ung vien cho mot truy van)
+    """
+    name = None
+    # tên các mảng được lưu khi `save()`
+    arrays = ("data", "norms")
+
+    def __init__(self, p=2, random_state=0):
+        self.p = p
+        self.random_state = random_state
+        self.data = None
+
+    def get_params(self):
+        return { name: getattr(self, name) for name in self._param_names() }
+
+    @classmethod
+    def _param_names(cls):
+        return [ name for name in inspect.signature(cls.__init__).parameters if name != "self" ]
+
+    def fit(self, X):
+        self.data = np.asarray(X)
+        self._set_norms()
+        self._build(self.data)
+        return self
+
+    def _set_norms(self):
+        # ||x||^2 của từng dòng, tính trước để khoảng cách euclidean chỉ cần một phép nhân ma trận
+        self.norms = np.einsum("ij,ij->i", self.data, self.data, dtype=np.float64)
+
+    def _distances(self, q, positions):
+        # khoảng cách chính xác từ truy vấn `q` đến các dòng `positions` của data
+        X = self.data[positions]
+        if self.p == 2:
+            q = np.asarray(q, dtype=np.float64)
+            return np.sqrt(np.maximum(self.norms[positions] + q @ q - 2 * (X @ q), 0))
+        return pairwise_distances(q[None, :], X, self.p)[0]
+
+    def _build(self, X):
+        pass
+
+    def __len__(self):
+        return 0 if self.data is None else len(self.data)
+
+    def _candidates(self, q, k):
+        raise NotImplementedError
+
+    def search(self, Q, k):
+        if self.data is None:
+            raise TypeError("Chỉ mục chưa được xây, hãy gọi fit() trước")
+        Q = np.asarray(Q)
+        if Q.ndim == 1:
+            Q = Q.reshape(1, -1)
+        k = min(k, len(self.data))
+        distances = np.empty((len(Q), k))
+        indices = np.empty((len(Q), k), dtype=np.int64)
+        for i, q in enumerate(Q):
+            candidates = self._candidates(q, k)
+            if len(candidates) < k:
+                # không đủ ứng viên, tìm trên toàn bộ dữ liệu
+                candidates = np.arange(len(self.data))
+            distances[i], indices[i] = _top_k(self._distances(q, candidates), candidates, k)
+        return distances, indices
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        for name in self.arrays:
+            np.save(os.path.join(folder, f"{name}.npy"), getattr(self, name))
+        # ghi tệp mô tả sau cùng để thư mục ghi dở không được tải như một chỉ mục hoàn chỉnh
+        temp_path = os.path.join(folder, f"index.json.{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"format_version": FORMAT_VERSION, "index": self.name, "params": self.get_params()}, f)
+        os.replace(temp_path, os.path.join(folder, "index.json"))
+
+    @staticmethod
+    def load(folder, mmap_mode=None):
+        """
+        Tai chi muc da luu bang `save()`, `mmap_mode="r"` mo cac mang tren dia thay vi doc vao bo nho
+        """
+        with open(os.path.join(folder, "index.json"), encoding="utf-8") as f:
+            header = json.load(f)
+        if header["format_version"] > FORMAT_VERSION:
+            raise TypeError(f"Phiên bản chỉ mục: {header['format_version']} mới hơn phiên bản được hỗ trợ ({FORMAT_VERSION})")
+        index = INDEXES[header["index"]](**header["params"])
+        for name in index.arrays:
+            setattr(index, name, np.load(os.path.join(folder, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False))
+        return index
+
+
+class BruteIndex(NeighborIndex):
+    """
+    Tim chinh xac tren toan bo du lieu (theo khoi), dung de so sanh recall cua cac chi muc gan dung
+    """
+    name = "brute"
+
+    def search(self, Q, k):
+        if self.data is None:
+            raise TypeError("Chỉ mục chưa được xây, hãy gọi fit() trước")
+        Q = np.asarray(Q)
+        if Q.ndim == 1:
+            Q = Q.reshape(1, -1)
+        k = min(k, len(self.data))
+        block = max(1, BLOCK_SIZE // (len(self.data) * (1 if self.p == 2 else self.data.shape[1])))
+        distances, indices = [], []
+        for start in range(0, len(Q), block):
+            if self.p == 2:
+                q = np.asarray(Q[start:start + block], dtype=np.float64)
+                D = np.empty((len(q), len(self.data)))
+                # đổi data sang float64 theo từng đoạn thay vì sao chép cả ma trận
+                for offset in range(0, len(self.data), DATA_BLOCK_ROWS):
+                    D[:, offset:offset + DATA_BLOCK_ROWS] = q @ np.asarray(self.data[offset:offset + DATA_BLOCK_ROWS], dtype=np.float64).T
+                D = np.sqrt(np.maximum(self.norms[None, :] + (q ** 2).sum(axis=1)[:, None] - 2 * D, 0))
+            else:
+                D = pairwise_distances(Q[start:start + block], self.data, self.p)
+            index = np.argpartition(D, k - 1, axis=1)[:, :k] if k < D.shape[1] else np.tile(np.arange(D.shape[1]), (len(D), 1))
+            d = np.take_along_axis(D, index, axis=1)
+            order = np.argsort(d, axis=1, kind="stable")
+            distances.append(np.take_along_axis(d, order, axis=1))
+            indices.append(np.take_along_axis(index, order, axis=1))
+        return np.concatenate(distances), np.concatenate(indices)
+
+
+class IVFIndex(NeighborIndex):
+    """
+    Chi muc tep dao (IVF): k-means chia du lieu thanh `n_lists` cum, truy van chi xet cac diem trong `n_probe` cum
+    co tam gan nhat (tang `n_probe` de tang recall, doi lai cham hon)
+    Du lieu duoc sap xep lai theo cum nen moi cum la mot doan lien tiep trong bo nho
+    """
+    name = "ivf"
+    arrays = ("data", "norms", "ids", "centroids", "offsets")
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, max_train_size=65536, p=2, random_state=0):
+        super().__init__(p=p, random_state=random_state)
+        # mặc định sqrt(n) cụm
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.max_train_size = max_train_size
+
+    def _assign(self, X, centroids):
+        # cụm có tâm gần nhất (euclidean) của từng dòng, tính theo khối
+        labels = np.empty(len(X), dtype=np.int64)
+        block = max(1, BLOCK_SIZE // len(centroids))
+        squared = (centroids ** 2).sum(axis=1)
+        for start in range(0, len(X), block):
+            x = np.asarray(X[start:start + block], dtype=np.float64)
+            labels[start:start + block] = (squared[None, :] - 2 * x @ centroids.T).argmin(axis=1)
+        return labels
+
+    def fit(self, X):
+        X = np.asarray(X)
+        rng = np.random.default_rng(self.random_state)
+        n_lists = min(len(X), self.n_lists or max(1, int(np.sqrt(len(X)))))
+        # k-means (Lloyd) trên một mẫu ngẫu nhiên của dữ liệu
+        sample = X[np.sort(rng.choice(len(X), min(len(X), max(self.max_train_size, n_lists)), replace=False))].astype(np.float64)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            labels = self._assign(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            # cụm rỗng giữ nguyên tâm cũ
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        labels = self._assign(X, centroids)
+        self.ids = np.argsort(labels, kind="stable")
+        self.offsets = np.concatenate([ [0], np.cumsum(np.bincount(labels, minlength=n_lists)) ]).astype(np.int64)
+        self.centroids = centroids
+        self.data = X[self.ids]
+        self._set_norms()
+        return self
+
+    def search(self, Q, k):
+        if self.data is None:
+            raise TypeError("Chỉ mục chưa được xây, hãy gọi fit() trước")
+        Q = np.asarray(Q)
+        if Q.ndim == 1:
+            Q = Q.reshape(1, -1)
+        k = min(k, len(self.data))
+        sizes = np.diff(self.offsets)
+        centroid_distances = (self.centroids ** 2).sum(axis=1)[None, :] - 2 * np.asarray(Q, dtype=np.float64) @ self.centroids.T
+        distances = np.empty((len(Q), k))
+        indices = np.empty((len(Q), k), dtype=np.int64)
+        for i, q in enumerate(Q):
+            lists = np.argsort(centroid_distances[i])
+            # ít nhất `n_probe` cụm và đủ k điểm
+            n_probe = max(self.n_probe, int(np.searchsorted(np.cumsum(sizes[lists]), k)) + 1)
+            positions = np.concatenate([ np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists[:n_probe] ])
+            distances[i], positions = _top_k(self._distances(q, positions), positions, k)
+            indices[i] = self.ids[positions]
+        return distances, indices
+
+
+class RandomProjectionIndex(NeighborIndex):
+    """
+    Bam nhay dia phuong (LSH) bang phep chieu ngau nhien: moi bang (`n_tables`) bam moi diem thanh `n_bits` bit dau cua
+    cac phep chieu, ung vien la cac diem cung ma bam voi truy van o bat ky bang nao. `n_flips` xet them cac ma bam lech
+    mot bit (cac bit co phep chieu gan 0 nhat). Nhieu bang / nhieu bit lat tang recall, nhieu bit hon thi it ung vien hon
+    """
+    name = "lsh"
+    arrays = ("data", "norms", "mean", "projections", "codes", "orders")
+
+    def __init__(self, n_tables=8, n_bits=12, n_flips=2, p=2, random_state=0):
+        super().__init__(p=p, random_state=random_state)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_flips = n_flips
+
+    def _project(self, X):
+        # (n_tables, n, n_bits)
+        X = np.asarray(X, dtype=np.float64) - self.mean
+        return np.einsum("nd,tdb->tnb", X, self.projections)
+
+    def _hash(self, projected):
+        return (projected > 0).astype(np.int64) @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def _build(self, X):
+        if self.n_bits > 62:
+            raise TypeError(f"n_bits: {self.n_bits} quá lớn, tối đa 62")
+        rng = np.random.default_rng(self.random_state)
+        self.mean = np.asarray(X, dtype=np.float64).mean(axis=0)
+        self.projections = rng.standard_normal((self.n_tables, X.shape[1], self.n_bits))
+        codes, orders = [], []
+        block = max(1, BLOCK_SIZE // (self.n_tables * self.n_bits))
+        table_codes = np.empty((self.n_tables, len(X)), dtype=np.int64)
+        for start in range(0, len(X), block):
+            table_codes[:, start:start + block] = self._hash(self._project(X[start:start + block]))
+        for table in table_codes:
+            order = np.argsort(table, kind="stable")
+            codes.append(table[order])
+            orders.append(order)
+        # mỗi bảng: mã băm đã sắp xếp và chỉ số tương ứng, tìm một mã bằng searchsorted
+        self.codes = np.array(codes)
+        self.orders = np.array(orders)
+
+    def _candidates(self, q, k):
+        projected = self._project(q[None, :])[:, 0, :]
+        code = self._hash(projected)
+        candidates = []
+        for t in range(self.n_tables):
+            probes = [ code[t] ]
+            # lật các bit kém chắc chắn nhất
+            for bit in np.argsort(np.abs(projected[t]))[:self.n_flips]:
+                probes.append(code[t] ^ (1 << int(bit)))
+            for probe in probes:
+                start, end = np.searchsorted(self.codes[t], [ probe, probe + 1 ])
+                candidates.append(self.orders[t, start:end])
+        return np.unique(np.concatenate(candidates))
+
+
+INDEXES = { index.name: index for index in (BruteIndex, IVFIndex, RandomProjectionIndex) }
+
+
+def make_index(index="ivf", p=2, **params):
+    "Tạo chỉ mục theo tên (\"ivf\", \"lsh\", \"brute\") hoặc trả về `index` nếu đã là một NeighborIndex"
+    if isinstance(index, NeighborIndex):
+        return index
+    if index not in INDEXES:
+        raise TypeError(f"Chỉ mục: {index} không được chấp nhận, chỉ chấp nhận {', '.join(INDEXES)}")
+    return INDEXES[index](p=p, **params)
+
+
+def recall(index, Q, k=5, exact=None):
+    """
+    Ty le k lang gieng that (tim chinh xac) nam trong ket qua cua `index`, dung de chon tham so chi muc
+    """
+    if exact is None:
+        exact = BruteIndex(p=index.p).fit(index.data if not isinstance(index, IVFIndex) else index.data[np.argsort(index.ids)])
+    _, expected = exact.search(Q, k)
+    _, found = index.search(Q, k)
+    return np.mean([ len(np.intersect1d(a, b)) / len(a) for a, b in zip(expected, found) ])
+
+
+class _ApproximateKNeighbors(BaseEstimator):
+    def __init__(self, n_neighbors=5, weights="uniform", p=2, index="ivf", index_params=None):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.p = p
+        self.index = index
+        self.index_params = index_params
+
+    def _fit_index(self, X):
+        self.index_ = make_index(self.index, p=self.p, **(self.index_params or {})).fit(X)
+        self.n_features_in_ = np.asarray(X).shape[1]
+
+    def kneighbors(self, X):
+        if getattr(self, "index_", None) is None:
+            raise TypeError("Chỉ mục chưa được xây hoặc chưa được tải (load_index)")
+        return self.index_.search(X, self.n_neighbors)
+
+    def _get_weights(self, distances):
+        if self.weights == "uniform":
+            return np.ones_like(distances)
+        if self.weights != "distance":
+            raise TypeError(f"Trọng số: {self.weights} không được chấp nhận, chỉ chấp nhận uniform hoặc distance")
+        # như sklearn: dòng có khoảng cách 0 chỉ tính các điểm trùng
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / distances
+        inf_mask = np.isinf(weights)
+        inf_row = inf_mask.any(axis=1)
+        weights[inf_row] = inf_mask[inf_row]
+        return weights
+
+    def save_index(self, folder):
+        "Lưu chỉ mục (kèm ma trận đào tạo) vào thư mục `folder`"
+        self.index_.save(folder)
+
+    def load_index(self, folder, mmap_mode=None):
+        self.index_ = NeighborIndex.load(folder, mmap_mode=mmap_mode)
+        return self
+
+    def without_index(self):
+        "Bản sao không có chỉ mục, để pickle mô hình mà không kèm ma trận đào tạo"
+        model = self.__class__(**self.get_params())
+        model.__dict__.update({ name: value for name, value in self.__dict__.items() if name != "index_" })
+        model.index_ = None
+        return model
+
+
+class ApproximateKNeighborsClassifier(ClassifierMixin, _ApproximateKNeighbors):
+    """
+    Nhu KNeighborsClassifier (n_neighbors, weights, p) nhung tim lang gieng bang chi muc `index`
+    ("ivf", "lsh", "brute" hoac mot NeighborIndex) voi tham so `index_params`
+    """
+    def fit(self, X, y):
+        self.classes_, self._y = np.unique(y, return_inverse=True)
+        self._fit_index(X)
+        return self
+
+    def predict_proba(self, X):
+        distances, indices = self.kneighbors(X)
+        weights = self._get_weights(distances)
+        labels = self._y[indices]
+        proba = np.zeros((len(indices), len(self.classes_)))
+        for c in range(len(self.classes_)):
+            proba[:, c] = (weights * (labels == c)).sum(axis=1)
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0] = 1
+        return proba / normalizer
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class ApproximateKNeighborsRegressor(RegressorMixin, _ApproximateKNeighbors):
+    """
+    Nhu KNeighborsRegressor (n_neighbors, weights, p) nhung tim lang gieng bang chi muc `index`
+    """
+    def fit(self, X, y):
+        self._y = np.asarray(y, dtype=np.float64)
+        self._fit_index(X)
+        return self
+
+    def predict(self, X):
+        distances, indices = self.kneighbors(X)
+        weights = self._get_weights(distances)
+        y = self._y[indices]
+        return (weights * y).sum(axis=1) / weights.sum(axis=1)
+
+
+def from_kneighbors(model, index="ivf", index_params=None):
+    """
+    Mo hinh gan dung (chua dao tao) cung n_neighbors/weights/p voi `model` (KNeighborsClassifier/Regressor cua sklearn)
+    """
+    if model.metric != "minkowski" or callable(model.weights):
+        raise TypeError("Chỉ hỗ trợ KNN với khoảng cách minkowski và trọng số uniform hoặc distance")
+    approximate = ApproximateKNeighborsClassifier if model.__class__.__name__ == "KNeighborsClassifier" else ApproximateKNeighborsRegressor
+    return approximate(n_neighbors=model.n_neighbors, weights=model.weights, p=model.p, index=index, index_params=index_params)
+
+
+if __name__ == "__main__":
+    import argparse
+    from time import perf_counter
+    parser = argparse.ArgumentParser(description="Do recall va do tre cua cac chi muc tren ma tran dac trung (.npy) hoac du lieu ngau nhien")
+    parser.add_argument("-f", "--features", help="tep .npy ma tran dac trung, mac dinh la du lieu ngau nhien theo cum")
+    parser.add_argument("-n", "--n-samples", type=int, help="so diem du lieu ngau nhien", default=100000)
+    parser.add_argument("-d", "--dim", type=int, help="so chieu du lieu ngau nhien", default=180)
+    parser.add_argument("-q", "--n-queries", type=int, help="so truy van", default=200)
+    parser.add_argument("-k", type=int, help="so lang gieng", default=5)
+    parser.add_argument("-p", type=float, help="bac khoang cach Minkowski", default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.features:
+        data = np.load(args.features, mmap_mode="r")
+    else:
+        centers = rng.standard_normal((max(1, args.n_samples // 500), args.dim)) * 3
+        data = (centers[rng.integers(0, len(centers), args.n_samples)] + rng.standard_normal((args.n_samples, args.dim))).astype(np.float32)
+    queries = data[rng.choice(len(data), args.n_queries, replace=False)] + rng.standard_normal((args.n_queries, data.shape[1])).astype(np.float32) * 0.1
+    exact = BruteIndex(p=args.p).fit(data)
+    configurations = [ ("brute", {}) ] + [ ("ivf", {"n_probe": n_probe}) for n_probe in (1, 4, 8, 16, 32) ] \
+        + [ ("lsh", {"n_tables": n_tables, "n_bits": n_bits}) for n_tables, n_bits in ((8, 12), (16, 12), (16, 10)) ]
+    built = {}
+    for name, params in configurations:
+        # IVF chỉ xây một lần, n_probe chỉ ảnh hưởng đến truy vấn
+        key = (name, tuple(sorted(params.items())) if name != "ivf" else ())
+        if key not in built:
+            start = perf_counter()
+            built[key] = (make_index(name, p=args.p, **params).fit(data), perf_counter() - start)
+        index, build_time = built[key]
+        for param, value in params.items():
+            setattr(index, param, value)
+        start = perf_counter()
+        index.search(queries, args.k)
+        latency = (perf_counter() - start) / len(queries) * 1000
+        print(f"{name:6} {json.dumps(params):36} xây {build_time:7.2f}s, {latency:7.3f}ms/truy vấn, "
+              f"recall@{args.k} {recall(index, queries, args.k, exact):.3f}")
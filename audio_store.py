@@ -0,0 +1,160 @@
+import numpy as np
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from convert_wavs import convert_audio_ffmpeg, load_audio, TARGET_SAMPLE_RATE
+from utils import extract_feature_from_array, get_n_jobs
+
+
+def decode_normalized(audio_path, dtype="float32"):
+    """
+    Giai ma `audio_path` thanh tin hieu mono 16000Hz, dinh dang soundfile khong doc duoc thi chuyen doi bang ffmpeg
+    vao thu muc tam (khong tao tep `_0.wav` canh tep goc)
+    """
+    try:
+        return load_audio(audio_path, dtype=dtype)
+    except RuntimeError:
+        with tempfile.TemporaryDirectory() as folder:
+            target_path = os.path.join(folder, "audio.wav")
+            if convert_audio_ffmpeg(audio_path, target_path):
+                raise NotImplementedError("Chuyển đổi không đúng, nếu không được hãy tải ffmpeg và cài trên máy tính ở Path.")
+            return load_audio(target_path, dtype=dtype)
+
+
+def _decode_chunk(audio_paths):
+    # hàm chạy trong tiến trình con
+    return [ decode_normalized(audio_path) for audio_path in audio_paths ]
+
+
+class AudioStore:
+    """
+    Bo nho dem am thanh da giai ma (16000Hz, mono) cho cac lan thu dac trung lap lai
+        `store = AudioStore("features/audio"); store.add_many(paths); X = store.get(path)`
+    Tat ca tin hieu nam lien nhau trong mot tep `audio_<dtype>.bin` (float32 hoac int16), `index_<dtype>.json` luu vi tri
+    (offset, so mau) theo khoa duong dan + kich thuoc + thoi gian sua doi. `get()` tra ve mot lat cua np.memmap
+    nen khong sao chep va khong doc ca tep vao bo nho. Chi mot tien trinh nen ghi (`add_many`) tai mot thoi diem
+    """
+    def __init__(self, folder="features/audio", dtype="float32"):
+        self.folder = folder
+        self.dtype = np.dtype(dtype)
+        if self.dtype.name not in ("float32", "int16"):
+            raise TypeError(f"Kiểu dữ liệu: {self.dtype.name} không được chấp nhận, chỉ chấp nhận float32 hoặc int16")
+        self.sample_rate = TARGET_SAMPLE_RATE
+        self.blob_path = os.path.join(folder, f"audio_{self.dtype.name}.bin")
+        self.index_path = os.path.join(folder, f"index_{self.dtype.name}.json")
+        # {khóa: [vị trí (số mẫu), số mẫu]}
+        self.index = {}
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                self.index = json.load(f)
+        self._blob = None
+
+    def __getstate__(self):
+        # gửi sang tiến trình con không kèm memmap, tiến trình con tự mở lại khi cần
+        state = self.__dict__.copy()
+        state["_blob"] = None
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+    @staticmethod
+    def get_key(audio_path):
+        stat = os.stat(audio_path)
+        key = f"{os.path.abspath(audio_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def __contains__(self, audio_path):
+        return self.get_key(audio_path) in self.index
+
+    def _get_blob(self, end):
+        # mở lại memmap khi tệp đã được ghi thêm sau lần mở trước
+        if self._blob is None or len(self._blob) < end:
+            self._blob = np.memmap(self.blob_path, dtype=self.dtype, mode="r")
+        return self._blob
+
+    def get(self, audio_path):
+        """
+        Tra ve tin hieu (view chi doc cua memmap, khong sao chep) cua `audio_path`, None neu chua co
+        """
+        entry = self.index.get(self.get_key(audio_path))
+        if entry is None:
+            instrumentation.increment("audio_cache_misses")
+            return None
+        instrumentation.increment("audio_cache_hits")
+        offset, length = entry
+        if not length:
+            return np.zeros(0, dtype=self.dtype)
+        return self._get_blob(offset + length)[offset:offset + length]
+
+    def get_float(self, audio_path):
+        "Như `get` nhưng luôn là số thực trong [-1, 1] (chỉ sao chép khi lưu int16)"
+        X = self.get(audio_path)
+        if X is not None and self.dtype == np.int16:
+            return X / np.float32(32768)
+        return X
+
+    def extract_feature(self, audio_path, **kwargs):
+        """
+        Trich xuat dac trung tu tin hieu da luu (giai ma truc tiep neu tep chua co), nhu `utils.extract_feature`
+        """
+        X = self.get_float(audio_path)
+        if X is None:
+            X = decode_normalized(audio_path)
+        return extract_feature_from_array(X, self.sample_rate, **kwargs)
+
+    def add_many(self, audio_paths, n_jobs=1, chunksize=16):
+        """
+        Giai ma (song song `n_jobs` tien trinh) va ghi them cac tep chua co, tra ve so tep da them
+        """
+        keys, missing = set(), []
+        for audio_path in audio_paths:
+            key = self.get_key(audio_path)
+            if key not in self.index and key not in keys:
+                keys.add(key)
+                missing.append(audio_path)
+        if not missing:
+            return 0
+        chunks = [ missing[i:i + chunksize] for i in range(0, len(missing), chunksize) ]
+        n_jobs = get_n_jobs(n_jobs)
+        if n_jobs == 1:
+            decoded = map(_decode_chunk, chunks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+            decoded = executor.map(_decode_chunk, chunks)
+        os.makedirs(self.folder, exist_ok=True)
+        try:
+            with open(self.blob_path, "ab") as f:
+                size = f.tell()
+                if size % self.dtype.itemsize:
+                    # phần ghi dở của lần bị dừng trước, đệm để vị trí mới thẳng hàng theo kiểu dữ liệu
+                    f.write(b"\0" * (self.dtype.itemsize - size % self.dtype.itemsize))
+                    size = f.tell()
+                offset = size // self.dtype.itemsize
+                for chunk, signals in zip(chunks, decoded):
+                    for audio_path, X in zip(chunk, signals):
+                        if self.dtype == np.int16:
+                            # cùng thang đo với soundfile: int16 = số thực * 32768
+                            X = np.clip(np.round(X * 32768), -32768, 32767)
+                        X = np.ascontiguousarray(X, dtype=self.dtype)
+                        f.write(X.tobytes())
+                        self.index[self.get_key(audio_path)] = [ offset, len(X) ]
+                        offset += len(X)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            # chỉ lưu chỉ mục sau khi dữ liệu đã được ghi, tiến trình bị dừng giữa chừng chỉ để lại phần thừa cuối tệp
+            self.save()
+        instrumentation.increment("audio_cache_added", len(missing))
+        return len(missing)
+
+    def save(self):
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(temp_path, self.index_path)
@@ -0,0 +1,340 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import soundfile
+
+from datetime import datetime
+from time import perf_counter
+
+# đo thời gian các bước chính của pipeline trên tệp wav tổng hợp, không cần tập dữ liệu thật
+
+
+# tần số cơ bản (Hz) của tín hiệu tổng hợp cho từng cảm xúc
+SYNTHETIC_PITCHES = {"sad": 140.0, "neutral": 220.0, "happy": 330.0}
+
+
+def make_synthetic_dataset(folder, emotions=("sad", "neutral", "happy"), n_files=40, duration=3.0, rate=16000, seed=0):
+    """
+    Tao `n_files` tep wav (16000Hz, mono) moi cam xuc trong `folder`/data/train-custom va `folder`/data/test-custom (80% / 20%),
+    dat ten theo quy uoc "<so>_<cam xuc>.wav" cua `create_csv.write_custom_csv`
+    Moi tep la cac hoa am cua mot tan so co ban rieng cho tung cam xuc, co dieu bien bien do va nhieu ngau nhien
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * rate)) / rate
+    paths = []
+    for i in range(n_files):
+        partition = "test-custom" if i % 5 == 4 else "train-custom"
+        directory = os.path.join(folder, "data", partition)
+        os.makedirs(directory, exist_ok=True)
+        for j, emotion in enumerate(emotions):
+            pitch = SYNTHETIC_PITCHES.get(emotion, 110.0 * (j + 1)) * rng.uniform(0.9, 1.1)
+            X = sum(np.sin(2 * np.pi * pitch * k * t + rng.uniform(0, 2 * np.pi)) / k for k in range(1, 6))
+            X *= 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(1, 5) * t)
+            X = 0.3 * X / np.max(np.abs(X)) + 0.01 * rng.standard_normal(len(t))
+            path = os.path.join(directory, f"{i:05d}_{emotion}.wav")
+            soundfile.write(path, X, rate, subtype="PCM_16")
+            paths.append(path)
+    return paths
+
+
+def get_machine_info():
+    "Thông tin máy và phiên bản thư viện đi kèm kết quả để so sánh giữa các lần chạy"
+    import librosa
+    import sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except FileNotFoundError:
+        commit = None
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "sklearn": sklearn.__version__,
+        "soundfile": soundfile.__version__,
+        "commit": commit,
+    }
+
+
+def get_result(benchmark, name, durations, n=1, **extra):
+    """
+    Mot dong ket qua: thoi gian (giay) trung binh / trung vi / p95 cua moi lan do, moi lan xu ly `n` phan tu
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    median = float(np.median(durations))
+    result = {
+        "benchmark": benchmark,
+        "name": name,
+        "repeat": len(durations),
+        "n": n,
+        "mean_s": float(np.mean(durations)),
+        "median_s": median,
+        "p95_s": float(np.percentile(durations, 95)),
+        # số phần tử mỗi giây theo trung vị
+        "throughput": n / median if median > 0 else float("inf"),
+    }
+    result.update(extra)
+    return result
+
+
+def timeit(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        durations.append(perf_counter() - start)
+    return durations
+
+
+def bench_extract(audio_paths, dtype, verbose=1):
+    "Độ trễ trích xuất trên từng tệp, riêng từng đặc trưng và cả ba"
+    from utils import extract_feature, get_audio_config
+    results = []
+    # lần gọi đầu tiên của librosa mất thêm thời gian biên dịch (numba), không tính
+    extract_feature(audio_paths[0], **get_audio_config(["mfcc", "chroma", "mel"], dtype))
+    durations = [ timeit(lambda: soundfile.read(audio_path, dtype=dtype), 1)[0] for audio_path in audio_paths ]
+    results.append(get_result("extract_feature", "read", durations))
+    for features in (["mfcc"], ["chroma"], ["mel"], ["mfcc", "chroma", "mel"]):
+        audio_config = get_audio_config(features, dtype)
+        durations = [ timeit(lambda: extract_feature(audio_path, **audio_config), 1)[0] for audio_path in audio_paths ]
+        results.append(get_result("extract_feature", "-".join(features), durations))
+        if verbose:
+            print(f"[extract_feature] {results[-1]['name']:18} {results[-1]['median_s']*1000:8.2f}ms/tệp")
+    return results
+
+
+def bench_load_data(train_desc_files, test_desc_files, emotions, dtype, repeat, n_jobs, verbose=1):
+    "Tải dữ liệu khi chưa có đặc trưng (cold, trích xuất tất cả) và khi đã có (warm, chỉ đọc ma trận)"
+    from data_extractor import load_data
+    from utils import get_audio_config
+    audio_config = get_audio_config(["mfcc", "chroma", "mel"], dtype)
+    load = lambda: load_data(train_desc_files, test_desc_files, audio_config, emotions=emotions, n_jobs=n_jobs, random_state=0)
+    n_files = sum(len(load()[name]) for name in ("train_audio_paths", "test_audio_paths"))
+    results = []
+    cold = []
+    for _ in range(repeat):
+        shutil.rmtree("features", ignore_errors=True)
+        cold.extend(timeit(load, 1))
+    results.append(get_result("load_data", "cold", cold, n=n_files, n_jobs=n_jobs))
+    results.append(get_result("load_data", "warm", timeit(load, repeat), n=n_files, n_jobs=n_jobs))
+    if verbose:
+        for result in results:
+            print(f"[load_data] {result['name']:5} {result['median_s']:8.3f}s ({result['throughput']:.1f} tệp/giây)")
+    return results
+
+
+def bench_fit(estimators, data, repeat, sample_sizes, n_classes, verbose=1):
+    """
+    Thoi gian dao tao / du doan va do chinh xac cua tung mo hinh tren mot phan du lieu dao tao (`sample_sizes`, vi du 1%, 10%, 100%)
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import accuracy_score
+    results = []
+    for estimator in estimators:
+        name = estimator.__class__.__name__
+        for sample_size in sample_sizes:
+            # tối thiểu vài mẫu mỗi lớp để mô hình đào tạo được
+            n_samples = min(len(data["X_train"]), max(int(len(data["X_train"]) * sample_size), 5 * n_classes))
+            X_train, y_train = data["X_train"][:n_samples], data["y_train"][:n_samples]
+            models = []
+            fit = timeit(lambda: models.append(clone(estimator).fit(X_train, y_train)), repeat)
+            predict = timeit(lambda: models[-1].predict(data["X_test"]), repeat)
+            accuracy = accuracy_score(data["y_test"], models[-1].predict(data["X_test"]))
+            results.append(get_result("fit", name, fit, n=n_samples, sample_size=sample_size, accuracy=accuracy))
+            results.append(get_result("predict_test", name, predict, n=len(data["X_test"]), sample_size=sample_size, accuracy=accuracy))
+            if verbose:
+                print(f"[fit] {name:24} {sample_size*100:5.0f}% ({n_samples} mẫu): đào tạo {results[-2]['median_s']:.3f}s, "
+                      f"dự đoán {results[-1]['median_s']:.3f}s, độ chính xác {accuracy*100:.1f}%")
+    return results
+
+
+def bench_predict(estimator, emotions, audio_paths, dtype, repeat, n_jobs, verbose=1):
+    "Dự đoán từng tệp (`predict`) so với theo lô (`predict_many`, tuần tự và song song)"
+    from emotion_recognition import EmotionRecognizer
+    rec = EmotionRecognizer(estimator, emotions=emotions, tess_ravdess=False, emodb=False, custom_db=True, dtype=dtype,
+                            random_state=0, verbose=0)
+    rec.train(verbose=0)
+    results = [
+        get_result("predict", "single", timeit(lambda: [ rec.predict(audio_path) for audio_path in audio_paths ], repeat), n=len(audio_paths)),
+        get_result("predict", "batch", timeit(lambda: rec.predict_many(audio_paths, n_jobs=1), repeat), n=len(audio_paths), n_jobs=1),
+    ]
+    if n_jobs != 1:
+        results.append(get_result("predict", "batch_parallel", timeit(lambda: rec.predict_many(audio_paths, n_jobs=n_jobs), repeat),
+                                  n=len(audio_paths), n_jobs=n_jobs))
+    if verbose:
+        for result in results:
+            print(f"[predict] {result['name']:14} {result['throughput']:8.1f} tệp/giây")
+    return results
+
+
+# các thư viện nặng không được import khi chỉ import module / tải mô hình để dự đoán
+HEAVY_MODULES = ("sklearn", "pandas", "matplotlib", "tqdm", "librosa")
+
+
+def get_heavy_imports(statement):
+    "Các module trong `HEAVY_MODULES` đã được import sau khi chạy `statement` trong một tiến trình Python mới"
+    code = f"import json, sys\n{statement}\nprint(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))"
+    output = subprocess.run([ sys.executable, "-c", code ], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_startup(estimator, emotions, audio_path, dtype, repeat, verbose=1):
+    """
+    Thoi gian cua mot tien trinh moi: import `emotion_recognition` va chay `inference.py` tren mot tep (mo hinh .pickle va .npz),
+    kem danh sach thu vien nang bi import, trong `HEAVY_MODULES` ma khong can
+    """
+    from emotion_recognition import EmotionRecognizer
+    rec = EmotionRecognizer(estimator, emotions=emotions, tess_ravdess=False, emodb=False, custom_db=True, dtype=dtype,
+                            random_state=0, verbose=0)
+    rec.train(verbose=0)
+    rec.save("models/startup.pickle")
+    rec.export("models/startup.npz")
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    # thời gian tính cả dự đoán, thư viện nặng chỉ kiểm tra đến khi tải xong mô hình (trích xuất đặc trưng phải import librosa)
+    commands = {"import": ([ sys.executable, "-c", "import emotion_recognition" ], "import emotion_recognition")}
+    for name, model_path in (("inference_pickle", "models/startup.pickle"), ("inference_npz", "models/startup.npz")):
+        model_path = os.path.abspath(model_path)
+        commands[name] = ([ sys.executable, "inference.py", model_path, audio_path ],
+                          f"from inference import load_predictor; load_predictor({model_path!r})")
+    results = []
+    for name, (command, statement) in commands.items():
+        durations = timeit(lambda: subprocess.run(command, capture_output=True, check=True, cwd=cwd), repeat)
+        results.append(get_result("startup", name, durations, heavy_imports=",".join(get_heavy_imports(statement))))
+        if verbose:
+            print(f"[startup] {name:16} {results[-1]['median_s']:8.3f}s, thư viện nặng: {results[-1]['heavy_imports'] or 'không'}")
+    return results
+
+
+def check_startup(results):
+    """
+    Danh sach loi khi import `emotion_recognition` keo theo thu vien nang hoac mo hinh .npz van can sklearn
+    """
+    # bỏ pickle mô hình sklearn thì phải import sklearn, và sklearn tự import pandas
+    allowed = {"import": set(), "inference_npz": set(), "inference_pickle": {"sklearn", "pandas"}}
+    errors = []
+    for result in results:
+        if result["benchmark"] != "startup":
+            continue
+        leaked = set(filter(None, result["heavy_imports"].split(","))) - allowed[result["name"]]
+        if leaked:
+            errors.append(f"{result['name']}: {', '.join(sorted(leaked))}")
+    return errors
+
+
+def compare(results, baseline_path, threshold):
+    """
+    So sanh trung vi voi lan chay truoc (`baseline_path`), tra ve danh sach cac phep do cham hon `threshold` lan
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = { (r["benchmark"], r["name"], r.get("sample_size")): r for r in json.load(f)["results"] }
+    regressions = []
+    for result in results:
+        old = baseline.get((result["benchmark"], result["name"], result.get("sample_size")))
+        if old and old["median_s"] > 0 and result["median_s"] / old["median_s"] > threshold:
+            regressions.append((result, old))
+    return regressions
+
+
+def write_results(output, machine, config, results):
+    "Ghi kết quả ra `output` (.json) và bảng cùng tên (.csv), mỗi dòng một phép đo kèm thông tin máy"
+    dirname = os.path.dirname(output)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"machine": machine, "config": config, "results": results}, f, indent=2, ensure_ascii=False)
+    columns = [ "benchmark", "name", "repeat", "n", "mean_s", "median_s", "p95_s", "throughput", "n_jobs", "sample_size", "accuracy", "heavy_imports" ]
+    with open(f"{os.path.splitext(output)[0]}.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns + list(machine), extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            writer.writerow({ **machine, **result })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Do hieu nang trich xuat dac trung, tai du lieu, dao tao va du doan tren tep wav tong hop")
+    parser.add_argument("-o", "--output", help="tep ket qua JSON (kem tep CSV cung ten)", default="benchmark/results.json")
+    parser.add_argument("-n", "--n-files", type=int, help="so tep tong hop moi cam xuc", default=40)
+    parser.add_argument("-d", "--duration", type=float, help="do dai moi tep (giay)", default=3.0)
+    parser.add_argument("-r", "--repeat", type=int, help="so lan lap moi phep do", default=3)
+    parser.add_argument("-j", "--n-jobs", type=int, help="so tien trinh cho tai du lieu va du doan song song", default=-1)
+    parser.add_argument("--dtype", help="kieu so thuc khi trich xuat", default="float32")
+    parser.add_argument("--sample-sizes", help="ty le du lieu dao tao khi do thoi gian dao tao, cach nhau boi dau phay", default="0.01,0.1,1")
+    parser.add_argument("--only", help="chi chay cac nhom (extract,load,fit,predict,startup), cach nhau boi dau phay", default="extract,load,fit,predict,startup")
+    parser.add_argument("--baseline", help="tep JSON cua lan chay truoc de phat hien cham di")
+    parser.add_argument("--threshold", type=float, help="cham hon bao nhieu lan so voi --baseline thi bao loi", default=1.25)
+    parser.add_argument("--keep", action="store_true", help="giu lai thu muc tam chua du lieu tong hop")
+    args = parser.parse_args()
+
+    only = set(args.only.split(","))
+    emotions = list(SYNTHETIC_PITCHES)
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    from parameters import classification_grid_parameters
+    from utils import get_best_estimators
+    # mô hình tốt nhất từ tìm kiếm lưới nếu có, không thì dùng tham số mặc định
+    if os.path.isfile("grid/best_classifiers.pickle"):
+        estimators = [ estimator for estimator, params, cv_score in get_best_estimators(True) ]
+    else:
+        estimators = list(classification_grid_parameters)
+
+    # chạy trong thư mục tạm để CSV, features và manifests không lẫn với dữ liệu thật
+    folder = tempfile.mkdtemp(prefix="benchmark_")
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        audio_paths = make_synthetic_dataset(folder, emotions, n_files=args.n_files, duration=args.duration)
+        test_paths = sorted(path for path in audio_paths if "test-custom" in path)
+        from create_csv import write_custom_csv
+        write_custom_csv(verbose=0)
+        train_desc_files, test_desc_files = [ "train_custom.csv" ], [ "test_custom.csv" ]
+
+        results = []
+        if "extract" in only:
+            results += bench_extract(audio_paths, args.dtype)
+        if "load" in only:
+            results += bench_load_data(train_desc_files, test_desc_files, emotions, args.dtype, args.repeat, args.n_jobs)
+        if "fit" in only:
+            from data_extractor import load_data
+            from utils import get_audio_config
+            data = load_data(train_desc_files, test_desc_files, get_audio_config(["mfcc", "chroma", "mel"], args.dtype),
+                             emotions=emotions, random_state=0)
+            sample_sizes = [ float(size) for size in args.sample_sizes.split(",") ]
+            results += bench_fit(estimators, data, args.repeat, sample_sizes, len(emotions))
+        if "predict" in only:
+            results += bench_predict(estimators[0], emotions, test_paths, args.dtype, args.repeat, args.n_jobs)
+        if "startup" in only:
+            results += bench_startup(estimators[0], emotions, test_paths[0], args.dtype, args.repeat)
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    config = { "n_files": args.n_files, "duration": args.duration, "repeat": args.repeat, "n_jobs": args.n_jobs, "dtype": args.dtype,
+               "emotions": emotions }
+    write_results(output, get_machine_info(), config, results)
+    print(f"Đã ghi kết quả vào {output}")
+
+    # import thừa thư viện nặng luôn là lỗi, không phụ thuộc tốc độ máy
+    startup_errors = check_startup(results)
+    for error in startup_errors:
+        print(f"IMPORT THỪA: {error}")
+    regressions = []
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for result, old in regressions:
+            print(f"CHẬM HƠN: {result['benchmark']}/{result['name']} {old['median_s']:.4f}s -> {result['median_s']:.4f}s")
+    if regressions or startup_errors:
+        sys.exit(1)
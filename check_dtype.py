@@ -0,0 +1,46 @@
+import argparse
+import sys
+import numpy as np
+
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+
+from emotion_recognition import EmotionRecognizer
+from utils import get_best_estimators
+
+# kiểm tra độ chính xác khi trích xuất / đào tạo bằng float32 so với float64 (cách cũ)
+
+parser = argparse.ArgumentParser(description="So sanh dac trung va do chinh xac cua cac mo hinh tot nhat giua float32 va float64")
+parser.add_argument("-e", "--emotions", help="cac cam xuc, cach nhau boi dau phay", default="sad,neutral,happy")
+parser.add_argument("-t", "--tolerance", type=float, help="muc giam do chinh xac toi da cho phep (0.01 la 1%%)", default=0.01)
+parser.add_argument("-j", "--n-jobs", type=int, help="so tien trinh trich xuat dac trung", default=-1)
+args = parser.parse_args()
+
+emotions = args.emotions.split(",")
+data = {}
+for dtype in ("float64", "float32"):
+    # cùng hạt giống để hai lần tải chia và cân bằng dữ liệu giống hệt nhau
+    rec = EmotionRecognizer(get_best_estimators(True)[0][0], emotions=emotions, dtype=dtype, n_jobs=args.n_jobs, random_state=0, verbose=0)
+    rec.load_data()
+    data[dtype] = rec
+baseline, candidate = data["float64"], data["float32"]
+assert np.array_equal(baseline.train_audio_paths, candidate.train_audio_paths), "Hai lần tải phải cho cùng thứ tự tệp"
+
+# sai số tương đối của đặc trưng, so với độ lớn của từng cột
+scale = np.abs(baseline.X_train).max(axis=0) + 1e-12
+error = np.abs(baseline.X_train - candidate.X_train.astype(np.float64)) / scale
+print(f"Sai số tương đối của đặc trưng: lớn nhất {error.max():.2e}, trung bình {error.mean():.2e}")
+print(f"Kích thước đặc trưng: {baseline.X_train.nbytes / 1024:.1f}KB (float64) -> {candidate.X_train.nbytes / 1024:.1f}KB (float32)")
+
+failed = False
+for estimator, params, cv_score in get_best_estimators(True):
+    scores = {}
+    for dtype, rec in data.items():
+        model = clone(estimator).fit(rec.X_train, rec.y_train)
+        scores[dtype] = accuracy_score(rec.y_test, model.predict(rec.X_test))
+    drop = scores["float64"] - scores["float32"]
+    status = "OK" if drop <= args.tolerance else "GIẢM"
+    failed = failed or drop > args.tolerance
+    print(f"{estimator.__class__.__name__:30} float64 {scores['float64']*100:.3f}%  float32 {scores['float32']*100:.3f}%  {status}")
+
+sys.exit(1 if failed else 0)
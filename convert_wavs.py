@@ -1,13 +1,90 @@
 import os
+import subprocess
+import soundfile
+from math import gcd
+from concurrent.futures import ProcessPoolExecutor
 
-def convert_audio(audio_path, target_path, remove=False):
-    v = os.system(f"ffmpeg -i {audio_path} -ac 1 -ar 16000 {target_path}")
-    if remove:
+import instrumentation
+
+# định dạng dùng cho toàn bộ dữ liệu: 16000Hz, kênh đơn âm (mono)
+TARGET_SAMPLE_RATE = 16000
+
+
+def load_audio(audio_path, sample_rate=TARGET_SAMPLE_RATE, dtype="float64"):
+    """
+    Doc tep am thanh bang soundfile, tron ve mono va doi tan so lay mau ve `sample_rate` ngay trong bo nho
+    """
+    X, sr = soundfile.read(audio_path, dtype=dtype, always_2d=True)
+    return to_mono_resampled(X, sr, sample_rate)
+
+
+def to_mono_resampled(X, sr, sample_rate=TARGET_SAMPLE_RATE):
+    "Trộn tín hiệu (số mẫu, số kênh) về mono và đổi tần số lấy mẫu từ `sr` về `sample_rate`"
+    if X.ndim == 2:
+        X = X.mean(axis=1, dtype=X.dtype) if X.shape[1] > 1 else X[:, 0]
+    if sr != sample_rate:
+        from scipy.signal import resample_poly
+        g = gcd(sr, sample_rate)
+        X = resample_poly(X, sample_rate // g, sr // g).astype(X.dtype, copy=False)
+    return X
+
+
+def is_up_to_date(audio_path, target_path):
+    "Tệp đích đã có và mới hơn tệp gốc thì không cần chuyển đổi lại"
+    return os.path.isfile(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(audio_path)
+
+
+def convert_audio_ffmpeg(audio_path, target_path):
+    # truyền danh sách tham số thay vì chuỗi lệnh để đường dẫn có dấu cách không bị tách
+    try:
+        returncode = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", audio_path,
+                                     "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), target_path]).returncode
+    except FileNotFoundError:
+        # không tìm thấy ffmpeg trong PATH
+        return 127
+    # chỉ đếm các lần tiến trình ffmpeg thực sự chạy
+    instrumentation.increment("files_converted_ffmpeg")
+    return returncode
+
+
+def convert_audio(audio_path, target_path, remove=False, ffmpeg=True):
+    """
+    Chuyen doi `audio_path` thanh tep wav 16000Hz mono `target_path`, tra ve 0 neu thanh cong
+    Giai ma va doi tan so ngay trong tien trinh (soundfile + scipy), chi dung ffmpeg khi soundfile khong doc duoc tep
+    """
+    if is_up_to_date(audio_path, target_path):
+        instrumentation.increment("convert_skipped")
+        v = 0
+    else:
+        with instrumentation.span("convert"):
+            try:
+                X = load_audio(audio_path)
+            except RuntimeError:
+                # soundfile không đọc được định dạng này (mp3, m4a...)
+                v = convert_audio_ffmpeg(audio_path, target_path) if ffmpeg else 1
+            else:
+                soundfile.write(target_path, X, TARGET_SAMPLE_RATE, subtype="PCM_16")
+                v = 0
+        instrumentation.increment("files_converted" if not v else "convert_errors")
+    if remove and not v:
         os.remove(audio_path)
     return v
 
 
-def convert_audios(path, target_path, remove=False):
+def _convert_audio_job(job):
+    audio_path, target_path, remove = job
+    return convert_audio(audio_path, target_path, remove=remove)
+
+
+def convert_audios(path, target_path, remove=False, n_jobs=1):
+    """
+    Chuyen doi tat ca tep wav trong thu muc `path` sang `target_path` (giu nguyen cau truc thu muc),
+    bo qua cac tep da chuyen doi va chua thay doi, `n_jobs` tien trinh chay song song (giong sklearn: -1 la tat ca nhan CPU,
+    -2 la tat ca tru mot...)
+    """
+    # utils import module này, chỉ import khi gọi
+    from utils import get_n_jobs
+    n_jobs = get_n_jobs(n_jobs)
     for dirpath, dirnames, filenames in os.walk(path):
         for dirname in dirnames:
             dirname = os.path.join(dirpath, dirname)
@@ -15,13 +92,19 @@ def convert_audios(path, target_path, remove=False):
             if not os.path.isdir(target_dir):
                 os.mkdir(target_dir)
 
+    jobs = []
     for dirpath, _, filenames in os.walk(path):
         for filename in filenames:
             file = os.path.join(dirpath, filename)
             if file.endswith(".wav"):
-                # tạo tệp wav 
+                # tạo tệp wav
                 target_file = file.replace(path, target_path)
-                convert_audio(file, target_file, remove=remove)
+                jobs.append((file, target_file, remove))
+
+    if n_jobs == 1:
+        return [ _convert_audio_job(job) for job in jobs ]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(_convert_audio_job, jobs, chunksize=16))
 
 
 if __name__ == "__main__":
@@ -30,6 +113,7 @@ if __name__ == "__main__":
     parser.add_argument("audio_path", help="Thu muc chua file wav muon chuyen doi")
     parser.add_argument("target_path", help="Thu muc luu file wav moi")
     parser.add_argument("-r", "--remove", type=bool, help="xoa file wav cu sau khi chuyen doi", default=False)
+    parser.add_argument("-j", "--n-jobs", type=int, help="so tien trinh chuyen doi song song, -1 la tat ca nhan CPU", default=-1)
 
     args = parser.parse_args()
     audio_path = args.audio_path
@@ -38,7 +122,7 @@ if __name__ == "__main__":
     if os.path.isdir(audio_path):
         if not os.path.isdir(target_path):
             os.makedirs(target_path)
-            convert_audios(audio_path, target_path, remove=args.remove)
+        convert_audios(audio_path, target_path, remove=args.remove, n_jobs=args.n_jobs)
     elif os.path.isfile(audio_path) and audio_path.endswith(".wav"):
         if not target_path.endswith(".wav"):
             target_path += ".wav"
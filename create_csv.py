@@ -1,9 +1,65 @@
-import glob
 import pandas as pd
+import json
 import os
 
+from manifest import Manifest
+from utils import AVAILABLE_EMOTIONS
 
-def write_emodb_csv(emotions=["sad", "neutral", "happy"], train_name="train_emo.csv", test_name="test_emo.csv", train_size=0.8, verbose=1):
+
+def get_emotion(path):
+    "Cảm xúc ở cuối tên tệp, phân tách bằng '_' (ví dụ: '12345678_123456_happy.wav' -> 'happy')"
+    parts = os.path.splitext(os.path.basename(path))[0].rsplit("_", 1)
+    if len(parts) < 2 or parts[1] not in AVAILABLE_EMOTIONS:
+        return None
+    return parts[1]
+
+
+def _get_state_path(csv_names, manifest_folder="manifests"):
+    # mã băm manifest lúc ghi của từng bộ CSV, ví dụ manifests/csv/train_custom.csv+test_custom.csv.json
+    name = "+".join(os.path.normpath(name).replace(os.sep, "_").replace(":", "") for name in csv_names)
+    return os.path.join(manifest_folder, "csv", f"{name}.json")
+
+
+def _refresh_manifests(roots, csv_names, force):
+    """
+    Quet lai cac thu muc du lieu, tra ve (danh sach Manifest, can ghi lai CSV hay khong)
+    CSV chi can ghi lai khi danh sach tep khac voi luc CSV do duoc ghi (moi bo CSV luu ma bam rieng nen nhieu ten CSV
+    dung chung mot thu muc du lieu van dung), khi tep CSV chua co hoac khi `force`
+    """
+    manifests = [ Manifest(root) for root in roots ]
+    for manifest in manifests:
+        manifest.refresh(save=False)
+    state_path = _get_state_path(csv_names)
+    written = None
+    if os.path.isfile(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            written = json.load(f)
+    current = { manifest.root: manifest.get_digest() for manifest in manifests }
+    return manifests, force or written != current or not all(os.path.isfile(name) for name in csv_names)
+
+
+def _save_manifests(manifests, csv_names):
+    # sau khi ghi CSV: lưu manifest và mã băm mà bộ CSV này được ghi từ đó
+    for manifest in manifests:
+        manifest.save()
+    state_path = _get_state_path(csv_names)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({ manifest.root: manifest.get_digest() for manifest in manifests }, f)
+    os.replace(temp_path, state_path)
+
+
+def write_emodb_csv(emotions=None, train_name="train_emo.csv", test_name="test_emo.csv", train_size=0.8, verbose=1, force=True):
+    """
+    Ghi CSV cho Emodb, `emotions=None` ghi tat ca cam xuc (loc cam xuc khi tai du lieu),
+    `force=False` bo qua neu thu muc du lieu khong thay doi tu lan ghi truoc
+    """
+    manifests, write = _refresh_manifests(["data/emodb"], [train_name, test_name], force)
+    if not write:
+        if verbose:
+            print("[Folder Emodb] Dữ liệu không thay đổi, dùng lại tệp CSV")
+        return
     target = {"path": [], "emotion": []}
     categories = {
         "W": "angry",
@@ -14,15 +70,12 @@ def write_emodb_csv(emotions=["sad", "neutral", "happy"], train_name="train_emo.
         "T": "sad",
         "N": "neutral"
     }
-    # xóa các cảm xúc không có ký tự trên
-    categories_reversed = { v: k for k, v in categories.items() }
-    for emotion, code in categories_reversed.items():
-        if emotion not in emotions:
-            del categories[code]
-    for file in glob.glob("data/emodb/*.wav"):
+    for file in manifests[0].get_paths("*.wav"):
         try:
             emotion = categories[os.path.basename(file)[5]]
-        except KeyError:
+        except (KeyError, IndexError):
+            continue
+        if emotions is not None and emotion not in emotions:
             continue
         target['emotion'].append(emotion)
         target['path'].append(file)
@@ -42,60 +95,62 @@ def write_emodb_csv(emotions=["sad", "neutral", "happy"], train_name="train_emo.
     y_test = target['emotion'][train_size:]
     pd.DataFrame({"path": X_train, "emotion": y_train}).to_csv(train_name)
     pd.DataFrame({"path": X_test, "emotion": y_test}).to_csv(test_name)
+    _save_manifests(manifests, [train_name, test_name])
 
 
-def write_tess_ravdess_csv(emotions=["sad", "neutral", "happy"], train_name="train_tess_ravdess.csv", test_name="test_tess_ravdess.csv", verbose=1):
-    train_target = {"path": [], "emotion": []}
-    test_target = {"path": [], "emotion": []}
-    
-    for category in emotions:
-        # thư mục âm thanh đào tạo
-        total_files = glob.glob(f"data/training/Actor_*/*_{category}.wav")
-        for i, path in enumerate(total_files):
-            train_target["path"].append(path)
-            train_target["emotion"].append(category)
-        if verbose and total_files:
-            print(f" Có {len(total_files)} tệp âm thanh đào tạo cho nhãn:{category}")
-    
-        # thư mục âm thanh xác thực (validation)
-        total_files = glob.glob(f"data/validation/Actor_*/*_{category}.wav")
-        for i, path in enumerate(total_files):
-            test_target["path"].append(path)
-            test_target["emotion"].append(category)
-        if verbose and total_files:
-            print(f" Có {len(total_files)} tệp âm thanh kiểm tra cho nhãn:{category}")
+def _get_targets(manifest, pattern, emotions):
+    # đọc nhãn từ tên tệp trong một lượt duyệt
+    target = {"path": [], "emotion": []}
+    for path in manifest.get_paths(pattern):
+        emotion = get_emotion(path)
+        if emotion is None or (emotions is not None and emotion not in emotions):
+            continue
+        target["path"].append(path)
+        target["emotion"].append(emotion)
+    return target
+
+
+def _print_counts(target, prefix, partition):
+    for emotion, count in pd.Series(target["emotion"], dtype=object).value_counts(sort=False).items():
+        print(f"{prefix}Có {count} tệp âm thanh {partition} cho nhãn:{emotion}")
+
+
+def write_tess_ravdess_csv(emotions=None, train_name="train_tess_ravdess.csv", test_name="test_tess_ravdess.csv", verbose=1, force=True):
+    """
+    Ghi CSV cho TESS va RAVDESS (data/training va data/validation), tham so giong `write_emodb_csv`
+    """
+    manifests, write = _refresh_manifests(["data/training", "data/validation"], [train_name, test_name], force)
+    if not write:
+        if verbose:
+            print("Dữ liệu Tess và Ravdess không thay đổi, dùng lại tệp CSV")
+        return
+    # thư mục âm thanh đào tạo và thư mục âm thanh xác thực (validation)
+    train_target = _get_targets(manifests[0], "Actor_*/*.wav", emotions)
+    test_target = _get_targets(manifests[1], "Actor_*/*.wav", emotions)
+    if verbose:
+        _print_counts(train_target, " ", "đào tạo")
+        _print_counts(test_target, " ", "kiểm tra")
     pd.DataFrame(test_target).to_csv(test_name)
     pd.DataFrame(train_target).to_csv(train_name)
+    _save_manifests(manifests, [train_name, test_name])
 
 
-def write_custom_csv(emotions=['sad', 'neutral', 'happy'], train_name="train_custom.csv", test_name="test_custom.csv", verbose=1):
-    train_target = {"path": [], "emotion": []}
-    test_target = {"path": [], "emotion": []}
-    for category in emotions:
-        # đào tạo dữ liệu
-        for i, file in enumerate(glob.glob(f"data/train-custom/*_{category}.wav")):
-            train_target["path"].append(file)
-            train_target["emotion"].append(category)
+def write_custom_csv(emotions=None, train_name="train_custom.csv", test_name="test_custom.csv", verbose=1, force=True):
+    """
+    Ghi CSV cho du lieu tuy chinh (data/train-custom va data/test-custom), tham so giong `write_emodb_csv`
+    """
+    manifests, write = _refresh_manifests(["data/train-custom", "data/test-custom"], [train_name, test_name], force)
+    if not write:
         if verbose:
-            try:
-                print(f"[DL_Custom] Có {i} tệp âm thanh đào tạo cho nhãn:{category}")
-            except NameError:
-                # trường hợp {i} không tồn tại
-                pass
-        
-        # kiểm tra dữ liệu
-        for i, file in enumerate(glob.glob(f"data/test-custom/*_{category}.wav")):
-            test_target["path"].append(file)
-            test_target["emotion"].append(category)
-        if verbose:
-            try:
-                print(f"[DL_Custom] Có {i} tệp âm thanh kiểm tra cho nhãn:{category}")
-            except NameError:
-                pass
+            print("[DL_Custom] Dữ liệu không thay đổi, dùng lại tệp CSV")
+        return
+    train_target = _get_targets(manifests[0], "*.wav", emotions)
+    test_target = _get_targets(manifests[1], "*.wav", emotions)
+    if verbose:
+        _print_counts(train_target, "[DL_Custom] ", "đào tạo")
+        _print_counts(test_target, "[DL_Custom] ", "kiểm tra")
     
-    # khởi tạo CSV
-    if train_target["path"]:
-        pd.DataFrame(train_target).to_csv(train_name)
-
-    if test_target["path"]:
-        pd.DataFrame(test_target).to_csv(test_name)
\ No newline at end of file
+    # khởi tạo CSV, thư mục rỗng vẫn có CSV chỉ gồm tiêu đề để lần sau không bị coi là chưa ghi
+    pd.DataFrame(train_target).to_csv(train_name)
+    pd.DataFrame(test_target).to_csv(test_name)
+    _save_manifests(manifests, [train_name, test_name])
@@ -1,31 +1,52 @@
 import numpy as np
 import pandas as pd
 import pickle
-import tqdm
 import os
 
-from utils import get_label, extract_feature, get_first_letters
-from collections import defaultdict
+import instrumentation
+from audio_store import AudioStore
+from feature_store import FeatureStore
+from utils import REGRESSION_CATEGORIES, get_dtype
+
+# các chế độ cân bằng: giảm mẫu về lớp ít nhất, tăng mẫu (lặp lại ngẫu nhiên) lên lớp nhiều nhất,
+# hoặc giữ nguyên dữ liệu và trả về trọng số mẫu theo lớp
+BALANCE_MODES = {"undersample", "oversample", "class_weight"}
 
 # Mô tả các đoạn âm thanh và cung cấp cho các thuật toán học máy để đào tạo và kiểm tra
 class AudioExtractor:
-    def __init__(self, audio_config=None, verbose=1, features_folder_name="features", classification=True, emotions=['sad', 'neutral', 'happy'], balance=True):
+    def __init__(self, audio_config=None, verbose=1, features_folder_name="features", classification=True, emotions=['sad', 'neutral', 'happy'], balance=True, n_jobs=1, chunksize=16, mmap_mode=None, random_state=None, dtype=None, audio_cache=None):
         self.audio_config = audio_config if audio_config else {'mfcc': True, 'chroma': True, 'mel': True}
+        # kiểu số thực của đặc trưng (float32 mặc định), `dtype` ghi đè khóa "dtype" của audio_config
+        if dtype is not None:
+            self.audio_config = dict(self.audio_config, dtype=get_dtype({"dtype": dtype}))
         self.verbose = verbose
         self.features_folder_name = features_folder_name
         self.classification = classification
         self.emotions = emotions
-        self.balance = balance
+        # True tương đương "undersample" như trước đây
+        self.balance = "undersample" if balance is True else balance
+        if self.balance and self.balance not in BALANCE_MODES:
+            raise TypeError(f"Chế độ cân bằng không hợp lệ, chỉ chấp nhận {sorted(BALANCE_MODES)}")
+        # bộ sinh số ngẫu nhiên có hạt giống (seed) để xáo trộn / tăng mẫu lặp lại được
+        self.rng = np.random.default_rng(random_state)
+        # số tiến trình trích xuất song song (-1 là tất cả nhân CPU) và số tệp mỗi lần gửi
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+        # mmap_mode='r' mở ma trận đặc trưng trên đĩa thay vì đọc hết vào bộ nhớ
+        self.mmap_mode = mmap_mode
+        # thư mục bộ nhớ đệm âm thanh đã giải mã (16000Hz, mono) hoặc `AudioStore`, None là giải mã từ tệp mỗi lần
+        self.audio_cache = AudioStore(audio_cache) if isinstance(audio_cache, str) else audio_cache
         # Kích thước đầu vào
         self.input_dimension = None
 
     def _load_data(self, desc_files, partition, shuffle):
         self.load_metadata_from_desc_file(desc_files, partition)
-        # cân bằng cơ sở dữ liệu (cả đào tạo và kiểm tra)
+        # cân bằng cơ sở dữ liệu (cả đào tạo và kiểm tra), tăng mẫu và trọng số lớp chỉ áp dụng cho đào tạo
         if partition == "train" and self.balance:
             self.balance_training_data()
         elif partition == "test" and self.balance:
-            self.balance_testing_data()
+            if self.balance == "undersample":
+                self.balance_testing_data()
         else:
             if self.balance:
                 raise TypeError("Không hợp lệ, chỉ có huấn luyện hoặc kiểm tra")
@@ -41,59 +62,63 @@ class AudioExtractor:
         self._load_data(desc_files, "test", shuffle)
 
     def shuffle_data_by_partition(self, partition):
+        # chỉ hoán vị mảng chỉ số, ma trận đặc trưng giữ nguyên
         if partition == "train":
-            self.train_audio_paths, self.train_emotions, self.train_features = shuffle_data(self.train_audio_paths,
-            self.train_emotions, self.train_features)
+            self.train_indices = self.rng.permutation(self.train_indices)
         elif partition == "test":
-            self.test_audio_paths, self.test_emotions, self.test_features = shuffle_data(self.test_audio_paths,
-            self.test_emotions, self.test_features)
+            self.test_indices = self.rng.permutation(self.test_indices)
         else:
             raise TypeError("Không hợp lệ, chỉ có huấn luyện hoặc kiểm tra")
 
+    def get_partition(self, partition):
+        """
+        Tra ve (X, y, audio_paths) cua `partition` sau khi can bang/xao tron,
+        X duoc lay tu ma tran dac trung bang mot lan chi so hoa (fancy indexing) duy nhat
+        """
+        if partition == "train":
+            features, emotions, audio_paths, indices = self.train_features, self.train_emotions, self.train_audio_paths, self.train_indices
+        elif partition == "test":
+            features, emotions, audio_paths, indices = self.test_features, self.test_emotions, self.test_audio_paths, self.test_indices
+        else:
+            raise TypeError("Không hợp lệ, chỉ có huấn luyện hoặc kiểm tra")
+        return features[indices], emotions[indices], audio_paths[indices].tolist()
+
+    def get_sample_weight(self, y):
+        """
+        Trong so moi mau n / (so lop * so mau cua lop), dung cho che do balance="class_weight"
+        """
+        codes, uniques = pd.factorize(y)
+        counts = np.bincount(codes, minlength=len(uniques))
+        return len(y) / (len(uniques) * counts[codes])
+
     def load_metadata_from_desc_file(self, desc_files, partition):
         # khung dữ liệu trống
         df = pd.DataFrame({'path': [], 'emotion': []})
         for desc_file in desc_files:
             # nối khung dữ liệu lại
             df = pd.concat((df, pd.read_csv(desc_file)), sort=False)
+        # CSV chứa tất cả cảm xúc, chỉ giữ các cảm xúc được chọn
+        df = df[df['emotion'].isin(self.emotions)]
         if self.verbose:
             print("Tải đường dẫn dữ liệu âm thanh và nhãn tương ứng")
         # khởi tạo cột (columns)
-        audio_paths, emotions = list(df['path']), list(df['emotion'])
+        audio_paths, emotions = df['path'].to_numpy(dtype=object), df['emotion']
         # không phải phân loại thì chuyển cảm xúc thành số
         if not self.classification:
             if len(self.emotions) == 3:
-                self.categories = {'sad': 1, 'neutral': 2, 'happy': 3}
+                self.categories = REGRESSION_CATEGORIES
             else:
                 raise TypeError("Hồi quy chỉ được dùng cho nhãn ['sad', 'neutral', 'happy']")
-            emotions = [ self.categories[e] for e in emotions ]
+            emotions = emotions.map(self.categories)
+        emotions = emotions.to_numpy()
         # tạo thư mục nếu không có
         if not os.path.isdir(self.features_folder_name):
             os.mkdir(self.features_folder_name)
-        # lấy nhãn cho các đặc trưng (feature)
-        label = get_label(self.audio_config)
-        # tạo tên tệp đặc trưng (feature)
-        n_samples = len(audio_paths)
-        first_letters = get_first_letters(self.emotions)
-        name = os.path.join(self.features_folder_name, f"{partition}_{label}_{first_letters}_{n_samples}.npy")
-        if os.path.isfile(name):
-            # nếu tệp tồn tại, tải 
-            if self.verbose:
-                print("Tệp đã có, đang tải")
-            features = np.load(name)
-        else:
-            # tệp không có thì trích xuất các đặc điểm và đưa vào tệp
-            features = []
-            append = features.append
-            for audio_file in tqdm.tqdm(audio_paths, f"Trích xuất đặc trưng (feature) cho {partition}"):
-                feature = extract_feature(audio_file, **self.audio_config)
-                if self.input_dimension is None:
-                    self.input_dimension = feature.shape[0]
-                append(feature)
-            # đổi sang mảng numpy
-            features = np.array(features)
-            # lưu
-            np.save(name, features)
+        # đặc trưng được lưu theo từng tệp âm thanh, chỉ trích xuất tệp mới hoặc đã thay đổi
+        store = FeatureStore(self.features_folder_name, self.audio_config, verbose=self.verbose, audio_cache=self.audio_cache)
+        features = store.load_features(audio_paths.tolist(), partition, n_jobs=self.n_jobs, chunksize=self.chunksize, mmap_mode=self.mmap_mode)
+        if self.input_dimension is None and features.ndim == 2:
+            self.input_dimension = features.shape[1]
         if partition == "train":
             try:
                 self.train_audio_paths
@@ -101,12 +126,16 @@ class AudioExtractor:
                 self.train_audio_paths = audio_paths
                 self.train_emotions = emotions
                 self.train_features = features
+                self.train_indices = np.arange(len(audio_paths))
             else:
                 if self.verbose:
                     print("Thêm mẫu bổ sung cho đào tạo")
-                self.train_audio_paths += audio_paths
-                self.train_emotions += emotions
+                offset = len(self.train_audio_paths)
+                self.train_audio_paths = np.concatenate((self.train_audio_paths, audio_paths))
+                self.train_emotions = np.concatenate((self.train_emotions, emotions))
+                # ghép hai ma trận sẽ đọc cả hai vào bộ nhớ (kể cả khi dùng mmap_mode)
                 self.train_features = np.vstack((self.train_features, features))
+                self.train_indices = np.concatenate((self.train_indices, offset + np.arange(len(audio_paths))))
         elif partition == "test":
             try:
                 self.test_audio_paths
@@ -114,71 +143,64 @@ class AudioExtractor:
                 self.test_audio_paths = audio_paths
                 self.test_emotions = emotions
                 self.test_features = features
+                self.test_indices = np.arange(len(audio_paths))
             else:
                 if self.verbose:
                     print("Thêm mẫu bổ sung cho kiểm tra")
-                self.test_audio_paths += audio_paths
-                self.test_emotions += emotions
+                offset = len(self.test_audio_paths)
+                self.test_audio_paths = np.concatenate((self.test_audio_paths, audio_paths))
+                self.test_emotions = np.concatenate((self.test_emotions, emotions))
+                # ghép hai ma trận sẽ đọc cả hai vào bộ nhớ (kể cả khi dùng mmap_mode)
                 self.test_features = np.vstack((self.test_features, features))
+                self.test_indices = np.concatenate((self.test_indices, offset + np.arange(len(audio_paths))))
         else:
             raise TypeError("Không hợp lệ, chỉ có huấn luyện hoặc kiểm tra")
 
     def _balance_data(self, partition):
         if partition == "train":
             emotions = self.train_emotions
-            features = self.train_features
-            audio_paths = self.train_audio_paths
+            indices = self.train_indices
         elif partition == "test":
             emotions = self.test_emotions
-            features = self.test_features
-            audio_paths = self.test_audio_paths
+            indices = self.test_indices
         else:
             raise TypeError("Không hợp lệ, chỉ có huấn luyện hoặc kiểm tra")
-        
-        count = []
+        # mã hóa nhãn của các dòng đang được chọn thành số nguyên theo thứ tự xuất hiện (tuyến tính, dùng bảng băm)
+        codes, uniques = pd.factorize(emotions[indices])
+        count = np.bincount(codes, minlength=len(uniques))
         if self.classification:
-            for emotion in self.emotions:
-                count.append(len([ e for e in emotions if e == emotion]))
+            classes = self.emotions
         else:
             # sử dụng hồi quy, dùng số liệu thực, không đánh nhãn cảm xúc
-            for emotion in self.categories.values():
-                count.append(len([ e for e in emotions if e == emotion]))
+            classes = self.categories.values()
         # lấy mẫu dữ liệu tối thiểu để cân bằng
-        minimum = min(count)
+        minimum = count.min() if len(count) and set(classes) <= set(uniques) else 0
         if minimum == 0:
             # nếu không cân bằng, 0 mẫu (sample) được tải lên
             print("1 lớp có 0 mẫu (sample), đặt cân bằng thành False")
             self.balance = False
             return
-        if self.verbose:
-            print("Cân bằng tập dữ liệu về giá trị tối thiểu", minimum)
-        d = defaultdict(list)
-        if self.classification:
-            counter = {e: 0 for e in self.emotions }
+        if self.balance == "class_weight":
+            # giữ nguyên dữ liệu, trọng số được tính trong `get_sample_weight`
+            return
+        # nhóm chỉ số theo lớp, giữ nguyên thứ tự trong mỗi lớp (sắp xếp ổn định trên mã lớp)
+        # (mã lớp nhỏ nên đổi sang int16 để numpy dùng radix sort, thời gian tuyến tính)
+        groups = np.split(indices[np.argsort(codes.astype(np.int16), kind="stable")], np.cumsum(count)[:-1])
+        if self.balance == "oversample":
+            maximum = count.max()
+            if self.verbose:
+                print("Cân bằng tập dữ liệu về giá trị tối đa", maximum)
+            indices = np.concatenate([ np.concatenate((group, self.rng.choice(group, maximum - len(group)))) for group in groups ])
         else:
-            counter = { e: 0 for e in self.categories.values() }
-        for emotion, feature, audio_path in zip(emotions, features, audio_paths):
-            if counter[emotion] >= minimum:
-                # vượt qua giá trị tối thiểu
-                continue
-            counter[emotion] += 1
-            d[emotion].append((feature, audio_path))
-
-        emotions, features, audio_paths = [], [], []
-        for emotion, features_audio_paths in d.items():
-            for feature, audio_path in features_audio_paths:
-                emotions.append(emotion)
-                features.append(feature)
-                audio_paths.append(audio_path)
+            if self.verbose:
+                print("Cân bằng tập dữ liệu về giá trị tối thiểu", minimum)
+            # giữ `minimum` dòng đầu tiên của mỗi lớp, nhóm theo cảm xúc
+            indices = np.concatenate([ group[:minimum] for group in groups ])
         
         if partition == "train":
-            self.train_emotions = emotions
-            self.train_features = features
-            self.train_audio_paths = audio_paths
+            self.train_indices = indices
         elif partition == "test":
-            self.test_emotions = emotions
-            self.test_features = features
-            self.test_audio_paths = audio_paths
+            self.test_indices = indices
         else:
             raise TypeError("Không hợp lệ, chỉ có huấn luyện hoặc kiểm tra")
 
@@ -189,28 +211,32 @@ class AudioExtractor:
         self._balance_data("test")
         
 
-def shuffle_data(audio_paths, emotions, features):
-    p = np.random.permutation(len(audio_paths))
-    audio_paths = [audio_paths[i] for i in p] 
-    emotions = [emotions[i] for i in p]
-    features = [features[i] for i in p]
-    return audio_paths, emotions, features
-
-
-def load_data(train_desc_files, test_desc_files, audio_config=None, classification=True, shuffle=True, balance=True, emotions=['sad', 'neutral', 'happy']):
+def load_data(train_desc_files, test_desc_files, audio_config=None, classification=True, shuffle=True, balance=True, emotions=['sad', 'neutral', 'happy'], n_jobs=1, chunksize=16,
+              mmap_mode=None, random_state=None, dtype=None, audio_cache=None):
     # tạo lớp cảm xúc
-    audion = AudioExtractor(audio_config=audio_config, classification=classification, emotions=emotions, balance=balance, verbose=0)
+    audion = AudioExtractor(audio_config=audio_config, classification=classification, emotions=emotions, balance=balance, verbose=0,
+                            n_jobs=n_jobs, chunksize=chunksize, mmap_mode=mmap_mode, random_state=random_state, dtype=dtype,
+                            audio_cache=audio_cache)
     # tải dữ liệu đào tạo
-    audion.load_train_data(train_desc_files, shuffle=shuffle)
+    with instrumentation.span("load_data.train"):
+        audion.load_train_data(train_desc_files, shuffle=shuffle)
     # tải dữ liệu kiểm tra
-    audion.load_test_data(test_desc_files, shuffle=shuffle)
+    with instrumentation.span("load_data.test"):
+        audion.load_test_data(test_desc_files, shuffle=shuffle)
     # đưa ra X_train, X_test, y_train, y_test
+    with instrumentation.span("load_data.select"):
+        X_train, y_train, train_audio_paths = audion.get_partition("train")
+        X_test, y_test, test_audio_paths = audion.get_partition("test")
     return {
-        "X_train": np.array(audion.train_features),
-        "X_test": np.array(audion.test_features),
-        "y_train": np.array(audion.train_emotions),
-        "y_test": np.array(audion.test_emotions),
-        "train_audio_paths": audion.train_audio_paths,
-        "test_audio_paths": audion.test_audio_paths,
+        "X_train": X_train,
+        "X_test": X_test,
+        "y_train": y_train,
+        "y_test": y_test,
+        "train_audio_paths": train_audio_paths,
+        "test_audio_paths": test_audio_paths,
+        # tất cả tệp đào tạo đã tải, trước khi cân bằng (bớt mẫu / tăng mẫu) và xáo trộn
+        "all_train_audio_paths": audion.train_audio_paths.tolist(),
         "balance": audion.balance,
-    }
\ No newline at end of file
+        # chỉ có khi balance="class_weight"
+        "sample_weight": audion.get_sample_weight(y_train) if audion.balance == "class_weight" else None,
+    }
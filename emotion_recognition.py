@@ -1,18 +1,17 @@
-from sklearn.metrics import accuracy_score, make_scorer, fbeta_score, mean_squared_error, mean_absolute_error
-from sklearn.metrics import confusion_matrix
-from sklearn.model_selection import GridSearchCV
-
 import numpy as np
-import tqdm
+import inspect
+import pickle
 import os
 import random
-import pandas as pd
-import matplotlib.pyplot as pl
-from time import time
-from create_csv import write_emodb_csv, write_tess_ravdess_csv, write_custom_csv
-from data_extractor import load_data
-from utils import extract_feature, AVAILABLE_EMOTIONS
-from utils import get_best_estimators, get_audio_config
+import instrumentation
+import numpy_engine
+from itertools import islice
+from segments import iter_segment_features
+from utils import extract_feature, extract_feature_from_buffer, iter_features, AVAILABLE_EMOTIONS, REGRESSION_CATEGORIES
+from utils import get_best_estimators, get_audio_config, DEFAULT_DTYPE
+
+# sklearn (metrics, GridSearchCV), pandas, matplotlib và các module dùng chúng (create_csv, data_extractor, search)
+# chỉ được import trong phương thức cần đến, tiến trình chỉ tải mô hình và dự đoán không phải chờ import chúng
 
 
 class EmotionRecognizer:
@@ -23,7 +22,8 @@ class EmotionRecognizer:
         self._verify_emotions()
         # trích xuất của âm thanh
         self.features = kwargs.get("features", ["mfcc", "chroma", "mel"])
-        self.audio_config = get_audio_config(self.features)
+        # kiểu số thực khi trích xuất, lưu đặc trưng và đào tạo ("float32" hoặc "float64")
+        self.audio_config = get_audio_config(self.features, kwargs.get("dtype", DEFAULT_DTYPE))
         # tải dữ liệu
         self.tess_ravdess = kwargs.get("tess_ravdess", True)
         self.emodb = kwargs.get("emodb", True)
@@ -33,9 +33,29 @@ class EmotionRecognizer:
             self.tess_ravdess = True
     
         self.classification = kwargs.get("classification", True)
+        # ánh xạ cảm xúc -> nhãn số khi dùng hồi quy
+        self.categories = None if self.classification else REGRESSION_CATEGORIES
+        # True/"undersample", "oversample", "class_weight" hoặc False
         self.balance = kwargs.get("balance", True)
+        # hạt giống (seed) cho xáo trộn và tăng mẫu, đặt một số nguyên để chia dữ liệu lặp lại được
+        self.random_state = kwargs.get("random_state")
         self.override_csv = kwargs.get("override_csv", True)
         self.verbose = kwargs.get("verbose", 1)
+        # trích xuất đặc trưng song song: số tiến trình (-1 là tất cả nhân CPU) và số tệp mỗi lần gửi
+        self.n_jobs = kwargs.get("n_jobs", 1)
+        self.chunksize = kwargs.get("chunksize", 16)
+        # mmap_mode='r' mở ma trận đặc trưng trên đĩa, chỉ các dòng được chọn mới được đọc vào bộ nhớ
+        self.mmap_mode = kwargs.get("mmap_mode")
+        # thư mục bộ nhớ đệm âm thanh đã giải mã (ví dụ "features/audio"), đổi đặc trưng không phải giải mã lại
+        self.audio_cache = kwargs.get("audio_cache")
+        # KNN tìm láng giềng gần đúng bằng chỉ mục của `ann` ("ivf", "lsh", "brute"), None là KNN của sklearn
+        self.knn_index = kwargs.get("knn_index")
+        self.knn_index_params = kwargs.get("knn_index_params")
+        # giảm chiều sau khi trích xuất: "pca", "select" hoặc transformer của sklearn (xem `reduction`), None là không giảm
+        self.reducer = kwargs.get("reducer")
+        self.n_components = kwargs.get("n_components", 40)
+        # khóa (đường dẫn + kích thước + thời gian sửa đổi) của các tệp đã đào tạo, `partial_train` chỉ đào tạo tệp mới
+        self.trained_files = set()
 
         self.tess_ravdess_name = kwargs.get("tess_ravdess_name", "tess_ravdess.csv")
         self.emodb_name = kwargs.get("emodb_name", "emodb.csv")
@@ -57,6 +77,91 @@ class EmotionRecognizer:
             self.determine_best_model()
         else:
             self.model = model
+            self._use_knn_index()
+
+    # các thuộc tính được lưu cùng mô hình trong `save()`
+    _artifact_attributes = ["emotions", "features", "audio_config", "classification", "categories", "balance",
+                            "tess_ravdess", "emodb", "custom_db", "tess_ravdess_name", "emodb_name", "custom_db_name"]
+
+    def save(self, path):
+        """
+        Luu mo hinh da dao tao cung cam xuc, audio_config, che do phan loai/hoi quy va anh xa nhan vao mot tep
+            `rec.save("models/svc.pickle")`
+        """
+        artifact = { attribute: getattr(self, attribute) for attribute in self._artifact_attributes }
+        artifact["model"] = self.model
+        artifact["reducer"] = self.reducer
+        artifact["n_components"] = self.n_components
+        artifact["knn_index"] = self.knn_index
+        artifact["knn_index_params"] = self.knn_index_params
+        artifact["trained_files"] = sorted(self.trained_files)
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        if hasattr(self.model, "save_index"):
+            # chỉ mục KNN (kèm ma trận đào tạo) được lưu thành thư mục cạnh tệp mô hình, mở lại được bằng mmap
+            self.model.save_index(f"{path}.index")
+            artifact["model"] = self.model.without_index()
+        # ghi ra tệp tạm rồi đổi tên, điểm lưu (checkpoint) của `partial_train` không bị hỏng khi bị ngắt giữa chừng
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(artifact, f)
+        os.replace(temp_path, path)
+        if self.verbose:
+            print(f"Đã lưu mô hình vào {path}")
+
+    def export(self, path):
+        """
+        Xuat mo hinh da dao tao sang tep .npz chi gom mang so (xem `numpy_engine`), du doan khong can sklearn
+            `rec.export("models/svc.npz"); numpy_engine.load_recognizer("models/svc.npz").predict("data/test.wav")`
+        """
+        numpy_engine.export(self, path)
+        if self.verbose:
+            print(f"Đã xuất mô hình vào {path}")
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Tai mo hinh da luu bang `save()`, khong doc/ghi CSV, thu muc features hay grid
+        `mmap_mode="r"` mo chi muc KNN gan dung tren dia thay vi doc vao bo nho
+            `rec = EmotionRecognizer.load("models/svc.pickle")`
+        """
+        with open(path, "rb") as f:
+            artifact = pickle.load(f)
+        rec = cls.__new__(cls)
+        for attribute in cls._artifact_attributes:
+            setattr(rec, attribute, artifact[attribute])
+        rec.model = artifact["model"]
+        # mô hình lưu trước khi có bước giảm chiều
+        rec.reducer = artifact.get("reducer")
+        rec.n_components = artifact.get("n_components", 40)
+        rec.knn_index = artifact.get("knn_index")
+        rec.knn_index_params = artifact.get("knn_index_params")
+        rec.trained_files = set(artifact.get("trained_files", []))
+        rec.mmap_mode = kwargs.get("mmap_mode")
+        if hasattr(rec.model, "load_index"):
+            rec.model.load_index(f"{path}.index", mmap_mode=rec.mmap_mode)
+        # mô hình lưu trước khi có khóa "dtype" được đào tạo trên đặc trưng float64
+        rec.audio_config.setdefault("dtype", "float64")
+        rec.override_csv = kwargs.get("override_csv", False)
+        rec.verbose = kwargs.get("verbose", 1)
+        rec.n_jobs = kwargs.get("n_jobs", 1)
+        rec.chunksize = kwargs.get("chunksize", 16)
+        rec.audio_cache = kwargs.get("audio_cache")
+        rec.random_state = kwargs.get("random_state")
+        # chỉ đặt tên tệp CSV, dữ liệu chỉ được tải khi gọi `load_data()`
+        rec._set_metadata_filenames()
+        rec.data_loaded = False
+        rec.model_trained = True
+        return rec
+
+    def _use_knn_index(self):
+        # thay KNeighbors của sklearn bằng bản gần đúng (`ann`) cùng tham số, trả về True nếu đã thay
+        if not getattr(self, "knn_index", None) or self.model.__class__.__name__ not in ("KNeighborsClassifier", "KNeighborsRegressor"):
+            return False
+        import ann
+        self.model = ann.from_kneighbors(self.model, index=self.knn_index, index_params=self.knn_index_params)
+        return True
 
     def _set_metadata_filenames(self):
         train_desc_files, test_desc_files = [], []
@@ -82,6 +187,8 @@ class EmotionRecognizer:
         return get_best_estimators(self.classification)
 
     def write_csv(self):
+        from create_csv import write_emodb_csv, write_tess_ravdess_csv, write_custom_csv
+        # CSV chứa tất cả cảm xúc (lọc theo `emotions` khi tải dữ liệu) và chỉ được ghi lại khi thư mục dữ liệu thay đổi
         for train_csv_file, test_csv_file in zip(self.train_desc_files, self.test_desc_files):
             # tiếp cận không an toàn
             if os.path.isfile(train_csv_file) and os.path.isfile(test_csv_file):
@@ -89,50 +196,173 @@ class EmotionRecognizer:
                 if not self.override_csv:
                     continue
             if self.emodb_name in train_csv_file:
-                write_emodb_csv(self.emotions, train_name=train_csv_file, test_name=test_csv_file, verbose=self.verbose)
-                if self.verbose:
-                    print("Đã tạo tệp CSV Emodb")
+                write_emodb_csv(train_name=train_csv_file, test_name=test_csv_file, verbose=self.verbose, force=False)
             elif self.tess_ravdess_name in train_csv_file:
-                write_tess_ravdess_csv(self.emotions, train_name=train_csv_file, test_name=test_csv_file, verbose=self.verbose)
-                if self.verbose:
-                    print("Đã tạo tệp CSV Tess và Ravdess")
+                write_tess_ravdess_csv(train_name=train_csv_file, test_name=test_csv_file, verbose=self.verbose, force=False)
             elif self.custom_db_name in train_csv_file:
-                write_custom_csv(emotions=self.emotions, train_name=train_csv_file, test_name=test_csv_file, verbose=self.verbose)
-                if self.verbose:
-                    print("Đã tạo tệp CSV CustomDB")
+                write_custom_csv(train_name=train_csv_file, test_name=test_csv_file, verbose=self.verbose, force=False)
 
     def load_data(self):
         if not self.data_loaded:
-            result = load_data(self.train_desc_files, self.test_desc_files, self.audio_config, self.classification,  emotions=self.emotions, balance=self.balance)
+            from data_extractor import load_data
+            result = load_data(self.train_desc_files, self.test_desc_files, self.audio_config, self.classification,  emotions=self.emotions, balance=self.balance,
+                               n_jobs=self.n_jobs, chunksize=self.chunksize, mmap_mode=self.mmap_mode, random_state=self.random_state,
+                               audio_cache=self.audio_cache)
             self.X_train = result['X_train']
             self.X_test = result['X_test']
             self.y_train = result['y_train']
             self.y_test = result['y_test']
             self.train_audio_paths = result['train_audio_paths']
             self.test_audio_paths = result['test_audio_paths']
+            self.all_train_audio_paths = result['all_train_audio_paths']
             self.balance = result["balance"]
+            self.sample_weight = result["sample_weight"]
+            if self.reducer is not None:
+                self._fit_reducer()
             if self.verbose:
                 print("Dữ liệu đã được tải lên")
             self.data_loaded = True
 
+    def _fit_reducer(self):
+        # đào tạo bộ giảm chiều trên dữ liệu đào tạo (nếu chưa, ví dụ mô hình đã tải thì giữ nguyên) rồi giảm chiều cả hai tập,
+        # đặc trưng gốc được giữ trong X_train_raw / X_test_raw cho `reduction_report`
+        from reduction import make_reducer
+        self.X_train_raw, self.X_test_raw = self.X_train, self.X_test
+        if isinstance(self.reducer, str) or not hasattr(self.reducer, "n_features_in_"):
+            self.reducer = make_reducer(self.reducer, self.n_components, self.classification, self.random_state)
+            with instrumentation.span("reducer.fit"):
+                self.reducer.fit(self.X_train, self.y_train)
+        self.X_train = self._reduce(self.X_train)
+        self.X_test = self._reduce(self.X_test)
+
+    def _reduce(self, X):
+        # áp dụng bộ giảm chiều đã đào tạo, giữ kiểu số thực của audio_config
+        if self.reducer is None:
+            return X
+        if getattr(self, "_reducer_steps", (None,))[0] is not self.reducer:
+            # scaler/PCA/SelectKBest tính thẳng bằng NumPy, bỏ qua bước kiểm tra đầu vào của sklearn trên mỗi lần dự đoán
+            try:
+                self._reducer_steps = (self.reducer, numpy_engine.export_reducer(self.reducer))
+            except TypeError:
+                self._reducer_steps = (self.reducer, None)
+        with instrumentation.span("reducer.transform"):
+            if self._reducer_steps[1] is None:
+                X = self.reducer.transform(X)
+            else:
+                X = numpy_engine.apply_reducer(X, *self._reducer_steps[1])
+            return X.astype(self.audio_config.get("dtype", DEFAULT_DTYPE), copy=False)
+
     def train(self, verbose=1):
         if not self.data_loaded:
             # neu du lieu chua duoc tai thi tai no sau
             self.load_data()
         if not self.model_trained:
-            self.model.fit(X=self.X_train, y=self.y_train)
+            sample_weight = getattr(self, "sample_weight", None)
+            with instrumentation.span("model.fit"):
+                if sample_weight is not None and "sample_weight" in inspect.signature(self.model.fit).parameters:
+                    self.model.fit(X=self.X_train, y=self.y_train, sample_weight=sample_weight)
+                else:
+                    if sample_weight is not None and verbose:
+                        print(f"{self.model.__class__.__name__} không hỗ trợ sample_weight, đào tạo không có trọng số lớp")
+                    self.model.fit(X=self.X_train, y=self.y_train)
             self.model_trained = True
+            from incremental import get_file_key
+            # cả các tệp bị bỏ khi cân bằng: chúng đã thuộc tập dữ liệu đào tạo, `partial_train` không coi là tệp mới
+            self.trained_files = { get_file_key(path) for path in self.all_train_audio_paths if os.path.isfile(path) }
             if verbose:
                 print("Mô hình đã được đào tạo")
 
-    def predict(self, audio_path):
-        feature = extract_feature(audio_path, **self.audio_config).reshape(1, -1)
-        return self.model.predict(feature)[0]
-
-    def predict_proba(self, audio_path):
+    def partial_train(self, roots=("data/train-custom",), pattern="*.wav", batch_size=256, checkpoint=None, verbose=1):
+        """
+        Dao tao tang dan (partial_fit) tren cac tep am thanh moi (chua dao tao) trong cac thu muc `roots`, theo lo `batch_size` tep,
+        chi ap dung cho mo hinh co partial_fit (MLPClassifier, SGDClassifier...)
+            `rec = EmotionRecognizer.load("models/sgd.pickle"); rec.partial_train(checkpoint="models/sgd.pickle")`
+        Dac trung duoc chuan hoa bang StandardScaler cap nhat theo tung lo (reducer="scaler" neu mo hinh chua duoc dao tao va
+        chua co bo giam chieu), bo giam chieu khac phai da duoc dao tao va duoc giu nguyen
+        Mo hinh da dao tao (`train()`) tren dac trung goc khong duoc them bo chuan hoa: TypeError, hay dao tao voi reducer="scaler"
+        `checkpoint` luu mo hinh (`save()`) sau moi lo, bi ngat giua chung thi lan goi sau tiep tuc tu cac tep chua dao tao
+        Tra ve so tep da dao tao
+        """
+        import incremental
+        from feature_store import FeatureStore
+        from audio_store import AudioStore
+        incremental.check_partial_fit(self.model)
+        files = incremental.find_new_files(roots, pattern, self.emotions, self.trained_files)
+        if not files:
+            if verbose:
+                print("Không có tệp mới để đào tạo")
+            return 0
+        model_fitted = self.model_trained or hasattr(self.model, "n_features_in_")
+        if model_fitted and not hasattr(self.reducer, "n_features_in_"):
+            # bộ chuẩn hóa mới chỉ thấy các tệp mới, mô hình sẽ nhận đặc trưng khác thang đo đã đào tạo
+            raise TypeError("Mô hình đã được đào tạo trên đặc trưng chưa giảm chiều/chuẩn hóa, không thể thêm bộ chuẩn hóa khi đào tạo tăng dần, "
+                            "hãy đào tạo (`train()`) với reducer=\"scaler\"")
+        if self.reducer is None:
+            self.reducer = "scaler"
+        if isinstance(self.reducer, str):
+            from reduction import make_reducer
+            self.reducer = make_reducer(self.reducer, self.n_components, self.classification, self.random_state)
+        running_reducer = hasattr(self.reducer, "partial_fit")
+        if not running_reducer and not hasattr(self.reducer, "n_features_in_"):
+            raise TypeError(f"Bộ giảm chiều: {self.reducer.__class__.__name__} không có partial_fit, phải được đào tạo trước (`train()`)")
+        # xáo trộn để mỗi lô có đủ các cảm xúc
+        rng = np.random.default_rng(self.random_state)
+        files = [ files[i] for i in rng.permutation(len(files)) ]
+        audio_cache = AudioStore(self.audio_cache) if isinstance(self.audio_cache, str) else self.audio_cache
+        store = FeatureStore(audio_config=self.audio_config, verbose=0, audio_cache=audio_cache)
+        classes = self.emotions if self.classification else None
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            with instrumentation.span("partial_train.features"):
+                X = store.load_features([ path for path, emotion, key in batch ], "incremental", n_jobs=self.n_jobs,
+                                        chunksize=self.chunksize, save_matrix=False)
+            y = np.array([ emotion if self.classification else self.categories[emotion] for path, emotion, key in batch ])
+            if running_reducer:
+                with instrumentation.span("reducer.partial_fit"):
+                    self.reducer.partial_fit(X)
+                # thông số chuẩn hóa đã đổi, `_reduce` phải chuyển lại sang NumPy
+                self._reducer_steps = (None, None)
+            with instrumentation.span("model.partial_fit"):
+                incremental.partial_fit(self.model, self._reduce(X), y, classes=classes)
+            self.trained_files.update(key for path, emotion, key in batch)
+            self.model_trained = True
+            if checkpoint:
+                self.save(checkpoint)
+            if verbose:
+                print(f"Đã đào tạo tăng dần {min(start + batch_size, len(files))}/{len(files)} tệp mới")
+        if running_reducer and self.data_loaded:
+            # dữ liệu đã tải được chuẩn hóa lại bằng thông số mới cho `test_score()`...
+            if not hasattr(self, "X_train_raw"):
+                self.X_train_raw, self.X_test_raw = self.X_train, self.X_test
+            self.X_train, self.X_test = self._reduce(self.X_train_raw), self._reduce(self.X_test_raw)
+        return len(files)
+
+    def _extract_feature(self, audio, sample_rate=None):
+        # đường dẫn thì đọc tệp, bytes / mảng numpy thì trích xuất ngay trong bộ nhớ
+        if isinstance(audio, (str, os.PathLike)):
+            feature = extract_feature(audio, **self.audio_config)
+        else:
+            feature = extract_feature_from_buffer(audio, sample_rate, **self.audio_config)
+        return self._reduce(feature.reshape(1, -1))
+
+    def predict(self, audio, sample_rate=None):
+        """
+        Du doan cam xuc cho `audio`: duong dan tep, bytes (noi dung tep, hoac PCM 16 bit neu co `sample_rate`)
+        hoac mang numpy (PCM int16 / so thuc) voi tan so lay mau `sample_rate`
+            `rec.predict(pcm, sample_rate=16000)`
+        """
+        feature = self._extract_feature(audio, sample_rate)
+        with instrumentation.span("model.predict"):
+            return self.model.predict(feature)[0]
+
+    def predict_proba(self, audio, sample_rate=None):
+        """
+        Giong `predict` nhung tra ve tu dien {cam xuc: xac suat}
+        """
         if self.classification:
-            feature = extract_feature(audio_path, **self.audio_config).reshape(1, -1)
-            proba = self.model.predict_proba(feature)[0]
+            feature = self._extract_feature(audio, sample_rate)
+            with instrumentation.span("model.predict_proba"):
+                proba = self.model.predict_proba(feature)[0]
             result = {}
             for emotion, prob in zip(self.model.classes_, proba):
                 result[emotion] = prob
@@ -140,41 +370,159 @@ class EmotionRecognizer:
         else:
             raise NotImplementedError("Dự đoán xác suất không liên quan đến hồi quy")
 
-    def grid_search(self, params, n_jobs=2, verbose=1):
+    def _iter_feature_batches(self, audio_paths, batch_size, n_jobs):
+        # trích xuất song song rồi gom thành từng lô `batch_size` dòng cho mô hình
+        n_jobs = self.n_jobs if n_jobs is None else n_jobs
+        features = iter_features(audio_paths, self.audio_config, n_jobs=n_jobs, chunksize=self.chunksize)
+        while True:
+            batch = list(islice(features, batch_size))
+            if not batch:
+                return
+            yield self._reduce(np.array(batch))
+
+    def iter_predict(self, audio_paths, batch_size=256, n_jobs=None):
+        """
+        Du doan lan luot cho tung tep trong `audio_paths` (theo dung thu tu), mo hinh duoc goi theo lo `batch_size` tep
+        """
+        for batch in self._iter_feature_batches(audio_paths, batch_size, n_jobs):
+            with instrumentation.span("model.predict"):
+                labels = self.model.predict(batch)
+            yield from labels
+
+    def iter_predict_proba(self, audio_paths, batch_size=256, n_jobs=None):
+        """
+        Giong `iter_predict` nhung tra ve tu dien {cam xuc: xac suat} cho tung tep
+        """
+        if not self.classification:
+            raise NotImplementedError("Dự đoán xác suất không liên quan đến hồi quy")
+        for batch in self._iter_feature_batches(audio_paths, batch_size, n_jobs):
+            with instrumentation.span("model.predict_proba"):
+                probas = self.model.predict_proba(batch)
+            for proba in probas:
+                yield dict(zip(self.model.classes_, proba))
+
+    def predict_many(self, audio_paths, batch_size=256, n_jobs=None):
+        """
+        Du doan cho nhieu tep, tra ve mang numpy theo dung thu tu `audio_paths`
+        """
+        return np.array(list(self.iter_predict(audio_paths, batch_size=batch_size, n_jobs=n_jobs)))
+
+    def predict_proba_many(self, audio_paths, batch_size=256, n_jobs=None):
+        """
+        Du doan xac suat cho nhieu tep, tra ve DataFrame voi moi dong la mot tep, moi cot la mot cam xuc
+        """
+        if not self.classification:
+            raise NotImplementedError("Dự đoán xác suất không liên quan đến hồi quy")
+        import pandas as pd
+        audio_paths = list(audio_paths)
+        probas = []
+        for batch in self._iter_feature_batches(audio_paths, batch_size, n_jobs):
+            with instrumentation.span("model.predict_proba"):
+                probas.extend(self.model.predict_proba(batch))
+        return pd.DataFrame(np.array(probas).reshape(len(audio_paths), len(self.model.classes_)), index=audio_paths, columns=self.model.classes_)
+
+    def predict_timeline(self, audio_path, window=3.0, hop=1.5, batch_size=256, n_jobs=None):
+        """
+        Du doan theo tung doan cho tep am thanh dai, tra ve danh sach (bat dau, ket thuc, cam xuc, {cam xuc: xac suat} hoac None)
+        Tep duoc doc theo tung cua so `window` giay cach nhau `hop` giay (xem `segments.iter_segments`) nen bo nho khong phu thuoc
+        do dai tep, cac cua so duoc cham diem theo lo `batch_size`, `n_jobs` tien trinh doc va trich xuat cac doan cua tep song song
+        """
+        n_jobs = self.n_jobs if n_jobs is None else n_jobs
+        with_proba = self.classification and hasattr(self.model, "predict_proba")
+        segments = iter_segment_features(audio_path, self.audio_config, window=window, hop=hop, n_jobs=n_jobs)
+        timeline = []
+        while True:
+            batch = list(islice(segments, batch_size))
+            if not batch:
+                return timeline
+            features = self._reduce(np.array([ feature for start, end, feature in batch ]))
+            # nhãn lấy từ predict() để trùng với `predict()` trên từng tệp (SVC có thể khác argmax của predict_proba)
+            with instrumentation.span("model.predict"):
+                labels = self.model.predict(features)
+            if with_proba:
+                with instrumentation.span("model.predict_proba"):
+                    probas = self.model.predict_proba(features)
+                probas = [ dict(zip(self.model.classes_, proba)) for proba in probas ]
+            else:
+                probas = [ None ] * len(batch)
+            timeline.extend((start, end, label, proba) for (start, end, feature), label, proba in zip(batch, labels, probas))
+
+    def grid_search(self, params, n_jobs=2, verbose=1, search="grid", n_candidates=None, factor=3, checkpoint=None):
+        """
+        Tim sieu tham so tot nhat cho mo hinh, tra ve (best_estimator, best_params, best_score)
+            search="grid": GridSearchCV thu tat ca cau hinh
+            search="halving" / "random": tim kiem co gioi han ngan sach trong `search.budgeted_search`,
+                ket qua tung cau hinh duoc luu vao tep `checkpoint` de chay lai tiep tuc tu cho bi dung
+        """
+        from sklearn.metrics import accuracy_score, mean_absolute_error
+        from search import budgeted_search
         score = accuracy_score if self.classification else mean_absolute_error
-        grid = GridSearchCV(estimator=self.model, param_grid=params, scoring=make_scorer(score), n_jobs=n_jobs, verbose=verbose, cv=3)
-        grid_result = grid.fit(self.X_train, self.y_train)
-        return grid_result.best_estimator_, grid_result.best_params_, grid_result.best_score_
+        estimator, X = self.model, self.X_train
+        if self.reducer is not None:
+            # bộ giảm chiều được đào tạo lại trong từng fold trên đặc trưng gốc, không thấy nhãn/dữ liệu của fold kiểm tra
+            from sklearn.base import clone
+            from sklearn.pipeline import Pipeline
+            from reduction import make_reducer
+            reducer = make_reducer(self.reducer, self.n_components, self.classification, self.random_state)
+            estimator = Pipeline([ ("reducer", clone(reducer)), ("model", self.model) ])
+            X = getattr(self, "X_train_raw", self.X_train)
+            params = [ { f"model__{name}": values for name, values in grid.items() } for grid in (params if isinstance(params, list) else [params]) ]
+        with instrumentation.span("grid_search"):
+            if search == "grid":
+                from sklearn.metrics import make_scorer
+                from sklearn.model_selection import GridSearchCV
+                grid = GridSearchCV(estimator=estimator, param_grid=params, scoring=make_scorer(score), n_jobs=n_jobs, verbose=verbose, cv=3)
+                grid_result = grid.fit(X, self.y_train)
+                best_estimator, best_params, best_score = grid_result.best_estimator_, grid_result.best_params_, grid_result.best_score_
+            else:
+                random_state = 0 if self.random_state is None else self.random_state
+                best_estimator, best_params, best_score = budgeted_search(estimator, params, X, self.y_train, score, greater_is_better=self.classification,
+                                                                          search=search, n_candidates=n_candidates, factor=factor, cv=3,
+                                                                          n_jobs=n_jobs, checkpoint=checkpoint, random_state=random_state, verbose=verbose)
+            if self.reducer is not None:
+                # mô hình cuối cùng dùng bộ giảm chiều đào tạo trên toàn bộ X_train (`self.reducer`) như khi dự đoán
+                best_params = { name[len("model__"):]: value for name, value in best_params.items() }
+                best_estimator = clone(self.model).set_params(**best_params).fit(self.X_train, self.y_train)
+        return best_estimator, best_params, best_score
+
+    def reduction_report(self, dimensions=(10, 20, 40, 60, 90, 120), method="pca", estimator=None, repeat=3):
+        """
+        Bang do chinh xac / thoi gian dao tao / do tre du doan theo so chieu sau khi giam (PCA hoac "select") cua `estimator`
+        (mac dinh la mo hinh hien tai), dong dau tien la dac trung goc, de chon `reducer` va `n_components`
+        """
+        import pandas as pd
+        from reduction import reduction_report
+        if not self.data_loaded:
+            self.load_data()
+        estimator = self.model if estimator is None else estimator
+        rows = reduction_report(estimator, getattr(self, "X_train_raw", self.X_train), self.y_train, getattr(self, "X_test_raw", self.X_test),
+                                self.y_test, dimensions=dimensions, method=method, classification=self.classification, repeat=repeat,
+                                random_state=self.random_state, verbose=self.verbose)
+        return pd.DataFrame(rows).set_index("dimension")
+
+    def _get_data_fingerprint(self):
+        from search import get_fingerprint
+        # mã băm dữ liệu theo thứ tự đường dẫn để cùng tập dữ liệu nhưng xáo trộn khác nhau vẫn cho cùng kết quả
+        train_order = np.argsort(self.train_audio_paths, kind="stable")
+        test_order = np.argsort(self.test_audio_paths, kind="stable")
+        sample_weight = [] if self.sample_weight is None else self.sample_weight[train_order]
+        return get_fingerprint(self.X_train[train_order], self.y_train[train_order], self.X_test[test_order], self.y_test[test_order], sample_weight)
 
     def determine_best_model(self):
         if not self.data_loaded:
             self.load_data()
         
         # tải các công cụ (mfcc - chroma - mel)
-        estimators = self.get_best_estimators()
+        estimators = [ estimator for estimator, params, cv_score in self.get_best_estimators() ]
 
-        result = []
-
-        if self.verbose:
-            estimators = tqdm.tqdm(estimators)
-
-        for estimator, params, cv_score in estimators:
-            if self.verbose:
-                estimators.set_description(f"Đánh giá {estimator.__class__.__name__}")
-            detector = EmotionRecognizer(estimator, emotions=self.emotions, tess_ravdess=self.tess_ravdess,
-            emodb=self.emodb, custom_db=self.custom_db, classification=self.classification, features=self.features, balance=self.balance, override_csv=False)
-            # dữ liệu đã được tải
-            detector.X_train = self.X_train
-            detector.X_test  = self.X_test
-            detector.y_train = self.y_train
-            detector.y_test  = self.y_test
-            detector.data_loaded = True
-            # đào tạo mô hình
-            detector.train(verbose=0)
-            # đưa ra độ chính xác khi kiểm tra
-            accuracy = detector.test_score()
-            # đưa ra kết quả
-            result.append((detector.model, accuracy))
+        # đào tạo song song (n_jobs) trên dữ liệu đã tải, không tạo lại EmotionRecognizer nên không ghi lại CSV;
+        # mô hình đã đào tạo được lưu trong grid/cache nên lần gọi sau với cùng dữ liệu sẽ không phải đào tạo lại
+        from sklearn.metrics import accuracy_score, mean_squared_error
+        from search import evaluate_estimators
+        metric = accuracy_score if self.classification else mean_squared_error
+        result = evaluate_estimators(estimators, self.X_train, self.y_train, self.X_test, self.y_test, metric,
+                                     sample_weight=self.sample_weight, n_jobs=self.n_jobs, fingerprint=self._get_data_fingerprint(),
+                                     verbose=self.verbose)
 
         # sắp xếp kết quả
         # hồi quy: tốt nhất ở dưới thấp; phân loại: tốt nhất ở phía trên
@@ -182,6 +530,10 @@ class EmotionRecognizer:
         best_estimator = result[0][0]
         accuracy = result[0][1]
         self.model = best_estimator
+        if self._use_knn_index():
+            # xây chỉ mục trên dữ liệu đào tạo
+            with instrumentation.span("model.fit"):
+                self.model.fit(self.X_train, self.y_train)
         self.model_trained = True
         if self.verbose:
             if self.classification:
@@ -190,6 +542,7 @@ class EmotionRecognizer:
                 print(f"Mô hình hồi quy tốt nhất xác định: {self.model.__class__.__name__} với {accuracy:.5f} sai số tuyệt đối")
 
     def test_score(self):
+        from sklearn.metrics import accuracy_score, mean_squared_error
         y_pred = self.model.predict(self.X_test)
         if self.classification:
             return accuracy_score(y_true=self.y_test, y_pred=y_pred)
@@ -197,6 +550,7 @@ class EmotionRecognizer:
             return mean_squared_error(y_true=self.y_test, y_pred=y_pred)
 
     def train_score(self):
+        from sklearn.metrics import accuracy_score, mean_squared_error
         y_pred = self.model.predict(self.X_train)
         if self.classification:
             return accuracy_score(y_true=self.y_train, y_pred=y_pred)
@@ -204,16 +558,20 @@ class EmotionRecognizer:
             return mean_squared_error(y_true=self.y_train, y_pred=y_pred)
 
     def train_fbeta_score(self, beta):
+        from sklearn.metrics import fbeta_score
         y_pred = self.model.predict(self.X_train)
         return fbeta_score(self.y_train, y_pred, beta, average='micro')
 
     def test_fbeta_score(self, beta):
+        from sklearn.metrics import fbeta_score
         y_pred = self.model.predict(self.X_test)
         return fbeta_score(self.y_test, y_pred, beta, average='micro')
 
     def confusion_matrix(self, percentage=True, labeled=True):
         if not self.classification:
             raise NotImplementedError("Ma trận nhầm lẫn chỉ hoạt động với phân loại")
+        import pandas as pd
+        from sklearn.metrics import confusion_matrix
         y_pred = self.model.predict(self.X_test)
         matrix = confusion_matrix(self.y_test, y_pred, labels=self.emotions).astype(np.float64)
         if percentage:
@@ -230,6 +588,7 @@ class EmotionRecognizer:
         return matrix
 
     def draw_confusion_matrix(self):
+        import matplotlib.pyplot as pl
     # Lấy danh sách các mô hình tốt nhất
         estimators = self.get_best_estimators()
 
@@ -270,6 +629,7 @@ class EmotionRecognizer:
             return len([y for y in self.y_train if y == emotion])
 
     def get_samples_by_class(self):
+        import pandas as pd
         if not self.data_loaded:
             self.load_data()
         train_samples = []
@@ -300,115 +660,3 @@ class EmotionRecognizer:
         else:
             raise TypeError("Không hợp lệ, phải là huấn luyện hoặc kiểm tra")
         return index
-
-# def bieu_do_cot(classifiers=True, beta=0.5, n_classes=3, verbose=1):
-#     # lấy các công cụ ước tính từ kết quả tìm kiếm lưới được thực hiện
-#     estimators = get_best_estimators(classifiers)
-
-#     final_result = {}
-#     for estimator, params, cv_score in estimators:
-#         final_result[estimator.__class__.__name__] = []
-#         for i in range(3):
-#             result = {}
-#             # khởi tạo lớp
-#             detector = EmotionRecognizer(estimator, verbose=0)
-#             # tải dữ liệu
-#             detector.load_data()
-#             if i == 0:
-#                 # bước đầu đưa 1% dữ liệu mẫu
-#                 sample_size = 0.01
-#             elif i == 1:
-#                 # bước hai đưa 10% dữ liệu mẫu
-#                 sample_size = 0.1
-#             elif i == 2:
-#                 # đưa tất cả dữ liệu
-#                 sample_size = 1
-#             # tính toán số mẫu huấn luyện và mẫu kiểm tra
-#             n_train_samples = int(len(detector.X_train) * sample_size)
-#             n_test_samples = int(len(detector.X_test) * sample_size)
-#             # thiết lập dữ liệu
-#             detector.X_train = detector.X_train[:n_train_samples]
-#             detector.X_test = detector.X_test[:n_test_samples]
-#             detector.y_train = detector.y_train[:n_train_samples]
-#             detector.y_test = detector.y_test[:n_test_samples]
-#             # tính toán thời gian đào tạo
-#             t_train = time()
-#             detector.train()
-#             t_train = time() - t_train
-#             # tính toán thời gian kiểm tra
-#             t_test = time()
-#             test_accuracy = detector.test_score()
-#             t_test = time() - t_test
-#             # đặt kết quả từ tên tương ứng
-#             result['train_time'] = t_train
-#             result['pred_time'] = t_test
-#             result['acc_train'] = cv_score
-#             result['acc_test'] = test_accuracy
-#             result['f_train'] = detector.train_fbeta_score(beta)
-#             result['f_test'] = detector.test_fbeta_score(beta)
-#             if verbose:
-#                 print(f" {estimator.__class__.__name__} voi {sample_size*100}% ({n_train_samples}) mẫu dữ liệu đạt được {cv_score*100:.3f}% độ Xác thực trong {t_train:.3f} giây và {test_accuracy*100:.3f}% độ Kiểm tra trong {t_test:.3f} giây")
-#             # nối tên với danh sách kết quả
-#             final_result[estimator.__class__.__name__].append(result)
-#         if verbose:
-#             print()
-#     visualize(final_result, n_classes=n_classes)
-    
-# def visualize(results, n_classes):
-#     n_estimators = len(results)
-
-#     # dự đoán thực
-#     accuracy = 1 / n_classes
-#     f1 = 1 / n_classes
-#     # khởi tạo khung hình
-#     fig, ax = pl.subplots(2, 4, figsize = (11,7))
-#     # khởi tạo hằng số
-#     bar_width = 0.4
-#     colors = [ (random.random(), random.random(), random.random()) for _ in range(n_estimators) ]
-#     # vòng lặp vẽ 4 bảng dữ liệu
-#     for k, learner in enumerate(results.keys()):
-#         for j, metric in enumerate(['train_time', 'acc_train', 'f_train', 'pred_time', 'acc_test', 'f_test']):
-#             for i in np.arange(3):
-#                 x = bar_width * n_estimators
-#                 # tạo biểu đồ
-#                 ax[j//3, j%3].bar(i*x+k*(bar_width), results[learner][i][metric], width = bar_width, color = colors[k])
-#                 ax[j//3, j%3].set_xticks([x-0.2, x*2-0.2, x*3-0.2])
-#                 ax[j//3, j%3].set_xticklabels(["1%", "10%", "100%"])
-#                 ax[j//3, j%3].set_xlabel("Kích thước tập HL")
-#                 ax[j//3, j%3].set_xlim((-0.2, x*3))
-#     # thêm trục tung nhãn y
-#     ax[0, 0].set_ylabel("Thời gian (giây)")
-#     ax[0, 1].set_ylabel("Tỷ lệ chính xác")
-#     ax[0, 2].set_ylabel("F-score")
-#     ax[1, 0].set_ylabel("Thời gian (giây)")
-#     ax[1, 1].set_ylabel("Tỷ lệ chính xác")
-#     ax[1, 2].set_ylabel("F-score")
-#     # thêm tên gọi
-#     ax[0, 0].set_title("Đào tạo mô hình")
-#     ax[0, 1].set_title("Độ chính xác trên tập con DL đào tạo ")
-#     ax[0, 2].set_title("F-score trên tập con DL đào tạo")
-#     ax[1, 0].set_title("Dự đoán mô hình")
-#     ax[1, 1].set_title("Độ chính xác trên tập kiểm tra")
-#     ax[1, 2].set_title("F-score trên tập kiểm tra")
-#     # thêm trục hoành trong biểu đồ
-#     ax[0, 1].axhline(y = accuracy, xmin = -0.1, xmax = 3.0, linewidth = 1, color = 'k', linestyle = 'dashed')
-#     ax[1, 1].axhline(y = accuracy, xmin = -0.1, xmax = 3.0, linewidth = 1, color = 'k', linestyle = 'dashed')
-#     ax[0, 2].axhline(y = f1, xmin = -0.1, xmax = 3.0, linewidth = 1, color = 'k', linestyle = 'dashed')
-#     ax[1, 2].axhline(y = f1, xmin = -0.1, xmax = 3.0, linewidth = 1, color = 'k', linestyle = 'dashed')
-#     # đặt giới hạn của y trong bảng
-#     ax[0, 1].set_ylim((0, 1))
-#     ax[0, 2].set_ylim((0, 1))
-#     ax[1, 1].set_ylim((0, 1))
-#     ax[1, 2].set_ylim((0, 1))
-#     # đặt các ô bổ sung trống
-#     ax[0, 3].set_visible(False)
-#     ax[1, 3].axis('off')
-#     # tạo chú thích
-#     for i, learner in enumerate(results.keys()):
-#         pl.bar(0, 0, color=colors[i], label=learner)
-#     pl.legend()
-#     # Tiêu đề
-#     pl.suptitle("Số liệu hiệu suất cho 3 mô hình học giám sát", fontsize = 16, y = 1.10)
-#     pl.tight_layout()
-#     pl.show()
-    
@@ -0,0 +1,117 @@
+import numpy as np
+import hashlib
+import tqdm
+import os
+
+import instrumentation
+from utils import get_label, get_dtype, iter_features
+
+
+class FeatureStore:
+    """
+    Bo nho dem dac trung theo tung tep am thanh
+        `features = FeatureStore("features", audio_config).load_features(paths, "train")`
+    Moi tep duoc luu thanh mot dong rieng, khoa la duong dan + kich thuoc + thoi gian sua doi + audio_config (ca kieu so thuc),
+    nen them/xoa tep hoac doi tap cam xuc chi can trich xuat cac tep moi hoac da thay doi
+    `audio_cache` (`audio_store.AudioStore`) trich xuat tu am thanh da giai ma va chuan hoa 16000Hz mono,
+    dac trung nay duoc luu rieng (nhan "-16k") vi tep khac 16000Hz se cho dac trung khac khi doc truc tiep
+    """
+    def __init__(self, features_folder_name="features", audio_config=None, verbose=1, audio_cache=None):
+        self.audio_config = audio_config if audio_config else {'mfcc': True, 'chroma': True, 'mel': True}
+        self.verbose = verbose
+        self.audio_cache = audio_cache
+        self.dtype = get_dtype(self.audio_config)
+        self.label = f"{get_label(self.audio_config)}-{self.dtype}" + ("-16k" if audio_cache is not None else "")
+        # features/store/<nhãn đặc trưng>-<kiểu số thực>/rows/<2 ký tự đầu của khóa>/<khóa>.npy
+        self.folder = os.path.join(features_folder_name, "store", self.label)
+        self.rows_folder = os.path.join(self.folder, "rows")
+
+    def get_key(self, audio_path):
+        stat = os.stat(audio_path)
+        key = f"{os.path.abspath(audio_path)}|{stat.st_size}|{stat.st_mtime_ns}|{self.label}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _row_path(self, key):
+        return os.path.join(self.rows_folder, key[:2], f"{key}.npy")
+
+    def _matrix_path(self, partition, keys):
+        # ma trận của một phân vùng được đặt tên theo danh sách khóa, đổi một tệp là đổi tên
+        digest = hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.folder, f"{partition}_{self.label}_{len(keys)}_{digest}.npy")
+
+    def get(self, key):
+        path = self._row_path(key)
+        if os.path.isfile(path):
+            return np.load(path)
+        return None
+
+    def put(self, key, feature):
+        path = self._row_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # ghi ra tệp tạm rồi đổi tên để tiến trình khác không đọc phải tệp ghi dở
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, feature)
+        os.replace(temp_path, path)
+
+    def _remove_old_matrices(self, partition, keep):
+        # mỗi lần danh sách tệp thay đổi lại có một ma trận mới, xóa các ma trận cũ của phân vùng để thư mục không lớn dần
+        # (các dòng vẫn còn nên ghép lại ma trận cũ không phải trích xuất lại)
+        prefix = f"{partition}_{self.label}_"
+        for entry in os.scandir(self.folder):
+            if entry.name.startswith(prefix) and entry.name.endswith(".npy") and entry.path != keep:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    # Windows không xóa được tệp đang được mở bằng mmap, lần ghi sau sẽ thử lại
+                    pass
+
+    def load_features(self, audio_paths, partition, n_jobs=1, chunksize=16, mmap_mode=None, save_matrix=True):
+        """
+        Tra ve ma tran dac trung theo dung thu tu `audio_paths`, chi trich xuat cac tep chua co trong bo nho dem
+        Voi `mmap_mode` (vi du 'r') ma tran duoc mo tu dia bang np.load(mmap_mode=...) thay vi doc het vao bo nho
+        `save_matrix=False` chi luu tung dong (cac lo nho cua dao tao tang dan khong can ma tran rieng)
+        """
+        keys = [ self.get_key(audio_path) for audio_path in audio_paths ]
+        name = self._matrix_path(partition, keys)
+        if os.path.isfile(name):
+            try:
+                features = np.load(name, mmap_mode=mmap_mode)
+            except FileNotFoundError:
+                # tiến trình khác vừa thay ma trận này bằng ma trận mới, ghép lại từ các dòng
+                pass
+            else:
+                if self.verbose:
+                    print("Tệp đã có, đang tải")
+                instrumentation.increment("feature_matrix_hits")
+                instrumentation.increment("feature_cache_hits", len(keys))
+                return features
+        rows = [ self.get(key) for key in keys ]
+        missing = [ i for i, row in enumerate(rows) if row is None ]
+        instrumentation.increment("feature_cache_hits", len(keys) - len(missing))
+        instrumentation.increment("feature_cache_misses", len(missing))
+        if self.verbose:
+            print(f"Có {len(keys) - len(missing)} tệp đã có đặc trưng, cần trích xuất {len(missing)} tệp")
+        if missing:
+            if self.audio_cache is not None:
+                # giải mã một lần vào bộ nhớ đệm âm thanh, các lần đổi đặc trưng sau chỉ đọc lại từ đó
+                self.audio_cache.add_many([ audio_paths[i] for i in missing ], n_jobs=n_jobs, chunksize=chunksize)
+            feature_iterator = iter_features((audio_paths[i] for i in missing), self.audio_config, n_jobs=n_jobs, chunksize=chunksize,
+                                             audio_cache=self.audio_cache)
+            for i, feature in zip(missing, tqdm.tqdm(feature_iterator, f"Trích xuất đặc trưng (feature) cho {partition}", total=len(missing))):
+                self.put(keys[i], feature)
+                rows[i] = feature
+        features = np.array(rows, dtype=self.dtype)
+        if not save_matrix:
+            return features
+        os.makedirs(self.folder, exist_ok=True)
+        # ghi ra tệp tạm rồi đổi tên như `put()`
+        temp_path = f"{name}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, features)
+        os.replace(temp_path, name)
+        self._remove_old_matrices(partition, name)
+        if mmap_mode:
+            # giải phóng bản trong bộ nhớ, các lần đọc sau đi qua bộ nhớ đệm của hệ điều hành
+            return np.load(name, mmap_mode=mmap_mode)
+        return features
@@ -1,4 +1,5 @@
 import pickle
+import os
 
 from emotion_recognition import EmotionRecognizer
 from parameters import classification_grid_parameters, regression_grid_parameters
@@ -7,6 +8,11 @@ from parameters import classification_grid_parameters, regression_grid_parameter
 emotions = ['sad', 'neutral', 'happy']
 # số lượng việc tìm song song khi tìm kiếm lưới
 n_jobs = 4
+# "grid": GridSearchCV thử tất cả cấu hình (mất vài giờ), "halving": loại dần theo số mẫu,
+# "random": thử ngẫu nhiên 60 cấu hình
+search = "halving"
+# kết quả từng cấu hình được lưu ở đây, chạy lại sau khi bị dừng sẽ tiếp tục từ chỗ cũ
+checkpoint_folder = "grid/checkpoints"
 
 best_estimators = []
 
@@ -17,7 +23,8 @@ for model, params in classification_grid_parameters.items():
         params['n_neighbors'] = [len(emotions)]
     d = EmotionRecognizer(model, emotions=emotions)
     d.load_data()
-    best_estimator, best_params, cv_best_score = d.grid_search(params=params, n_jobs=n_jobs)
+    checkpoint = os.path.join(checkpoint_folder, f"{model.__class__.__name__}.jsonl")
+    best_estimator, best_params, cv_best_score = d.grid_search(params=params, n_jobs=n_jobs, search=search, checkpoint=checkpoint)
     best_estimators.append((best_estimator, best_params, cv_best_score))
     print(f"{emotions} {best_estimator.__class__.__name__} đạt {cv_best_score:.3f} độ xác nhận (validation)")
 
@@ -33,7 +40,8 @@ for model, params in regression_grid_parameters.items():
         params['n_neighbors'] = [len(emotions)]
     d = EmotionRecognizer(model, emotions=emotions, classification=False)
     d.load_data()
-    best_estimator, best_params, cv_best_score = d.grid_search(params=params, n_jobs=n_jobs)
+    checkpoint = os.path.join(checkpoint_folder, f"{model.__class__.__name__}.jsonl")
+    best_estimator, best_params, cv_best_score = d.grid_search(params=params, n_jobs=n_jobs, search=search, checkpoint=checkpoint)
     best_estimators.append((best_estimator, best_params, cv_best_score))
     print(f"{emotions} {best_estimator.__class__.__name__} đạt {cv_best_score:.3f} tổng điểm sai số tuyệt đối trung bình!")
 
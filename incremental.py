@@ -0,0 +1,55 @@
+import numpy as np
+import inspect
+import os
+
+from manifest import Manifest
+
+# đào tạo tăng dần (partial_fit) trên các tệp âm thanh mới của thư mục dữ liệu, không trích xuất/đào tạo lại từ đầu
+#     rec = EmotionRecognizer(SGDClassifier(), custom_db=True); rec.partial_train(checkpoint="models/sgd.pickle")
+# tệp đã đào tạo được nhận diện bằng đường dẫn + kích thước + thời gian sửa đổi và được lưu cùng mô hình trong `save()`
+
+
+def get_file_key(path, size=None, mtime=None):
+    "Khóa của một tệp âm thanh: đường dẫn tuyệt đối + kích thước + thời gian sửa đổi, tệp bị sửa được coi là tệp mới"
+    if size is None or mtime is None:
+        stat = os.stat(path)
+        size, mtime = stat.st_size, stat.st_mtime_ns
+    return f"{os.path.abspath(path)}|{size}|{mtime}"
+
+
+def find_new_files(roots, pattern="*.wav", emotions=None, seen=()):
+    """
+    Quet lai cac thu muc du lieu `roots` bang `Manifest` (chi doc lai thu muc co thay doi) va tra ve danh sach
+    (duong dan, cam xuc, khoa) cua cac tep co nhan thuoc `emotions` ma khoa chua co trong `seen`
+    Tep manifest khong duoc ghi lai de `create_csv` van thay cac tep moi khi ghi CSV
+    """
+    # create_csv import pandas, chỉ cần khi đào tạo
+    from create_csv import get_emotion
+    files = []
+    for root in roots:
+        manifest = Manifest(root)
+        manifest.refresh(save=False)
+        for path, size, mtime in manifest.get_files(pattern):
+            emotion = get_emotion(path)
+            if emotion is None or (emotions is not None and emotion not in emotions):
+                continue
+            key = get_file_key(path, size, mtime)
+            if key not in seen:
+                files.append((path, emotion, key))
+    return files
+
+
+def check_partial_fit(model):
+    "TypeError neu mo hinh khong dao tao tang dan duoc"
+    if not hasattr(model, "partial_fit"):
+        raise TypeError(f"Mô hình: {model.__class__.__name__} không hỗ trợ partial_fit, "
+                        "chỉ chấp nhận mô hình đào tạo tăng dần (MLPClassifier, MLPRegressor, SGDClassifier, SGDRegressor...)")
+
+
+def partial_fit(model, X, y, classes=None):
+    "Mot buoc partial_fit, `classes` (tat ca cam xuc) chi can cho lan goi dau tien cua mo hinh phan loai"
+    if classes is not None and "classes" in inspect.signature(model.partial_fit).parameters:
+        model.partial_fit(X, y, classes=np.asarray(classes))
+    else:
+        model.partial_fit(X, y)
+    return model
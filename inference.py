@@ -0,0 +1,51 @@
+import json
+import os
+
+# điểm vào chỉ để dự đoán: không ghi CSV, không quét thư mục dữ liệu, không import pandas/matplotlib,
+# mô hình .npz (xem `numpy_engine`) cũng không cần import sklearn
+#     python inference.py models/svc.pickle ACuoi.wav
+#     python inference.py models/svc.npz data/*.wav --proba
+
+
+def load_predictor(model_path):
+    """
+    Tai mo hinh de du doan: tep .npz cua `EmotionRecognizer.export()` hoac tep .pickle cua `EmotionRecognizer.save()`,
+    ca hai deu co `predict`/`predict_proba` nhan duong dan, bytes hoac mang numpy
+    """
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(f"Không tìm thấy tệp mô hình: {model_path}")
+    if model_path.endswith(".npz"):
+        import numpy_engine
+        return numpy_engine.load_recognizer(model_path)
+    from emotion_recognition import EmotionRecognizer
+    return EmotionRecognizer.load(model_path, verbose=0)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Du doan cam xuc cho cac tep am thanh tu mo hinh da luu, khong khoi tao tap du lieu")
+    parser.add_argument("model_path", help="tep mo hinh da luu (.pickle) hoac da xuat (.npz)")
+    parser.add_argument("audio_paths", nargs="+", help="cac tep am thanh")
+    parser.add_argument("--proba", action="store_true", help="in xac suat tung cam xuc")
+    parser.add_argument("--json", action="store_true", help="in moi tep mot dong JSON")
+    args = parser.parse_args()
+
+    predictor = load_predictor(args.model_path)
+    for audio_path in args.audio_paths:
+        emotion, proba = predictor.predict(audio_path), None
+        # mô hình không có xác suất (SVC không có probability=True, hồi quy) thì chỉ in nhãn
+        if args.proba and predictor.classification and hasattr(predictor.model, "predict_proba"):
+            try:
+                proba = predictor.predict_proba(audio_path)
+            except NotImplementedError:
+                # tệp .npz xuất từ SVC không có probability=True
+                pass
+        if args.json:
+            result = {"path": audio_path, "emotion": str(emotion)}
+            if proba is not None:
+                result["probabilities"] = { str(e): float(p) for e, p in proba.items() }
+            print(json.dumps(result, ensure_ascii=False))
+        elif proba is not None:
+            print(f"{audio_path}: {emotion} (" + ", ".join(f"{e}: {p:.3f}" for e, p in proba.items()) + ")")
+        else:
+            print(f"{audio_path}: {emotion}")
@@ -0,0 +1,217 @@
+import json
+import os
+import sys
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from time import perf_counter, time
+
+try:
+    import resource
+except ImportError:
+    # Windows không có module resource, bỏ qua bộ nhớ cao nhất
+    resource = None
+
+# đo thời gian từng bước (span), bộ đếm và bộ nhớ cao nhất của tiến trình, mặc định tắt
+#     instrumentation.enable(log_path="logs/spans.jsonl")
+#     ... chạy pipeline ...
+#     instrumentation.write_prometheus("metrics.prom")
+# khi tắt, `span()` trả về một context rỗng dùng chung và `increment()` chỉ kiểm tra một biến nên gần như không tốn chi phí
+
+# ngưỡng (giây) của histogram thời gian
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "ser"
+
+_enabled = False
+_log = None
+_lock = threading.Lock()
+# {tên span: {"count": ..., "sum": ..., "max": ..., "buckets": [...]}}
+_spans = {}
+_counters = {}
+# giá trị lớn nhất, ví dụ bộ nhớ cao nhất của các tiến trình con
+_gauges = {}
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, perf_counter() - self.start)
+        return False
+
+
+def _record(name, duration):
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+        stats["count"] += 1
+        stats["sum"] += duration
+        stats["max"] = max(stats["max"], duration)
+        stats["buckets"][bisect_left(BUCKETS, duration)] += 1
+        if _log is not None:
+            _log.write(json.dumps({"time": time(), "pid": os.getpid(), "span": name, "duration_s": duration}) + "\n")
+
+
+def enable(log_path=None):
+    """
+    Bat do dac, `log_path` ghi moi span thanh mot dong JSON (thoi gian, pid, ten, do dai) vao tep
+    """
+    global _enabled, _log
+    disable()
+    if log_path:
+        dirname = os.path.dirname(log_path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # ghi theo dòng để tiến trình bị dừng vẫn giữ được các span đã ghi
+        _log = open(log_path, "a", buffering=1, encoding="utf-8")
+    _enabled = True
+
+
+def disable():
+    global _enabled, _log
+    _enabled = False
+    if _log is not None:
+        _log.close()
+        _log = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name):
+    """
+    Do thoi gian mot buoc: `with instrumentation.span("stft"): ...`
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def increment(name, value=1):
+    "Tăng bộ đếm `name` (ví dụ số tệp có trong bộ nhớ đệm)"
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get_memory_peak():
+    "Bộ nhớ cao nhất (bytes) mà tiến trình đã dùng, None nếu hệ điều hành không hỗ trợ"
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def get_metrics():
+    """
+    Anh chup cac span, bo dem va bo nho cao nhat dang tu dien (co the ghi JSON)
+    """
+    with _lock:
+        spans = { name: dict(stats, buckets=list(stats["buckets"])) for name, stats in _spans.items() }
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    return {"time": time(), "pid": os.getpid(), "spans": spans, "counters": counters, "gauges": gauges,
+            "memory_peak_bytes": get_memory_peak()}
+
+
+def collect():
+    """
+    Lay va xoa so lieu cua tien trinh hien tai, dung trong tien trinh con de gui ve cho tien trinh chinh (`merge`)
+    """
+    metrics = get_metrics()
+    reset()
+    return metrics
+
+
+def merge(metrics):
+    "Cộng số liệu `collect()` từ tiến trình con vào tiến trình hiện tại"
+    if not _enabled or not metrics:
+        return
+    with _lock:
+        for name, other in metrics["spans"].items():
+            stats = _spans.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)})
+            stats["count"] += other["count"]
+            stats["sum"] += other["sum"]
+            stats["max"] = max(stats["max"], other["max"])
+            stats["buckets"] = [ a + b for a, b in zip(stats["buckets"], other["buckets"]) ]
+        for name, value in metrics["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+        for name, value in metrics["gauges"].items():
+            _gauges[name] = max(_gauges.get(name, value), value)
+        if metrics["memory_peak_bytes"]:
+            _gauges["worker_memory_peak_bytes"] = max(_gauges.get("worker_memory_peak_bytes", 0), metrics["memory_peak_bytes"])
+
+
+def _write(path, text):
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    # ghi tệp tạm rồi đổi tên để công cụ thu thập (node_exporter textfile...) không đọc phải tệp ghi dở
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def write_json(path):
+    _write(path, json.dumps(get_metrics(), indent=2))
+
+
+def _escape(name):
+    return name.replace("\\", "\\\\").replace("\"", "\\\"")
+
+
+def to_prometheus():
+    """
+    So lieu dang van ban cua Prometheus: histogram thoi gian theo span, bo dem va bo nho cao nhat
+    """
+    metrics = get_metrics()
+    lines = []
+    if metrics["spans"]:
+        lines += [ f"# HELP {PREFIX}_span_seconds Thời gian từng bước của pipeline", f"# TYPE {PREFIX}_span_seconds histogram" ]
+        for name, stats in sorted(metrics["spans"].items()):
+            label = f'span="{_escape(name)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), stats["buckets"]):
+                cumulative += count
+                lines.append(f'{PREFIX}_span_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{PREFIX}_span_seconds_sum{{{label}}} {stats['sum']}")
+            lines.append(f"{PREFIX}_span_seconds_count{{{label}}} {stats['count']}")
+        lines += [ f"# HELP {PREFIX}_span_seconds_max Thời gian lâu nhất của từng bước", f"# TYPE {PREFIX}_span_seconds_max gauge" ]
+        for name, stats in sorted(metrics["spans"].items()):
+            lines.append(f'{PREFIX}_span_seconds_max{{span="{_escape(name)}"}} {stats["max"]}')
+    for name, value in sorted(metrics["counters"].items()):
+        lines += [ f"# TYPE {PREFIX}_{name}_total counter", f"{PREFIX}_{name}_total {value}" ]
+    for name, value in sorted(metrics["gauges"].items()):
+        lines += [ f"# TYPE {PREFIX}_{name} gauge", f"{PREFIX}_{name} {value}" ]
+    if metrics["memory_peak_bytes"] is not None:
+        lines += [ f"# TYPE {PREFIX}_memory_peak_bytes gauge", f"{PREFIX}_memory_peak_bytes {metrics['memory_peak_bytes']}" ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    _write(path, to_prometheus())
+
+
+if os.environ.get("SER_INSTRUMENTATION"):
+    # bật từ biến môi trường mà không cần sửa mã, SER_INSTRUMENTATION_LOG là tệp ghi span
+    enable(log_path=os.environ.get("SER_INSTRUMENTATION_LOG"))
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import json
+import numpy as np
+import soundfile
+
+from time import perf_counter
+from urllib.parse import urlsplit
+
+# kiểm tra tải cho server.py: gửi đồng thời nhiều yêu cầu /predict qua các kết nối giữ lại (keep-alive),
+# đo thông lượng và độ trễ p50/p90/p99
+#     python server.py models/svc.pickle &
+#     python load_test.py -c 32 -n 2000
+
+
+def make_tone(duration=3.0, rate=16000, pitch=220.0, seed=0):
+    "Tín hiệu PCM int16 tổng hợp (các họa âm của `pitch` và nhiễu) để kiểm tra khi không có tệp âm thanh"
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * rate)) / rate
+    X = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    X = 0.3 * X / np.max(np.abs(X)) + 0.01 * rng.standard_normal(len(t))
+    return (X * 32767).astype(np.int16)
+
+
+async def request(reader, writer, host, path, body):
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/octet-stream\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = next(int(line.split(":", 1)[1]) for line in lines[1:] if line.lower().startswith("content-length:"))
+    return status, await reader.readexactly(length)
+
+
+async def worker(host, port, path, body, counter, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] > 0:
+            counter[0] -= 1
+            start = perf_counter()
+            try:
+                status, content = await request(reader, writer, host, path, body)
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                errors.append(str(e))
+                # mở lại kết nối và tiếp tục
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            if status == 200:
+                latencies.append(perf_counter() - start)
+            else:
+                errors.append(f"{status}: {content.decode('utf-8', 'replace')}")
+    finally:
+        writer.close()
+
+
+async def run(url, body, concurrency, n_requests, audio_format="file", rate=16000):
+    """
+    Gui `n_requests` yeu cau qua `concurrency` ket noi dong thoi, tra ve tu dien ket qua (giay)
+    """
+    url = urlsplit(url)
+    path = "/predict" if audio_format == "file" else f"/predict?format=pcm&rate={rate}"
+    counter, latencies, errors = [ n_requests ], [], []
+    start = perf_counter()
+    await asyncio.gather(*[ worker(url.hostname, url.port or 80, path, body, counter, latencies, errors) for _ in range(concurrency) ])
+    elapsed = perf_counter() - start
+    latencies = np.array(latencies)
+    result = {"concurrency": concurrency, "requests": n_requests, "ok": len(latencies), "errors": len(errors),
+              "elapsed_s": elapsed, "throughput": len(latencies) / elapsed}
+    if len(latencies):
+        for name, q in (("p50", 50), ("p90", 90), ("p99", 99)):
+            result[f"{name}_ms"] = float(np.percentile(latencies, q) * 1000)
+        result["max_ms"] = float(latencies.max() * 1000)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Kiem tra tai cho server.py tren localhost")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("-c", "--concurrency", type=int, help="so ket noi dong thoi", default=16)
+    parser.add_argument("-n", "--requests", type=int, help="tong so yeu cau", default=500)
+    parser.add_argument("-f", "--file", help="tep am thanh gui di, mac dinh la tin hieu tong hop")
+    parser.add_argument("-d", "--duration", type=float, help="do dai tin hieu tong hop (giay)", default=3.0)
+    parser.add_argument("--pcm", action="store_true", help="gui PCM 16 bit thay vi tep wav")
+    parser.add_argument("-o", "--output", help="ghi ket qua ra tep JSON")
+    args = parser.parse_args()
+
+    if args.file:
+        if args.pcm:
+            X, rate = soundfile.read(args.file, dtype="int16", always_2d=True)
+            body = X[:, 0].astype("<i2").tobytes()
+        else:
+            with open(args.file, "rb") as f:
+                body = f.read()
+            rate = 16000
+    else:
+        X, rate = make_tone(args.duration), 16000
+        if args.pcm:
+            body = X.astype("<i2").tobytes()
+        else:
+            buffer = io.BytesIO()
+            soundfile.write(buffer, X, rate, format="WAV", subtype="PCM_16")
+            body = buffer.getvalue()
+
+    result = asyncio.run(run(args.url, body, args.concurrency, args.requests, "pcm" if args.pcm else "file", rate))
+    print(f"{result['ok']}/{result['requests']} yêu cầu thành công trong {result['elapsed_s']:.2f}s ({result['throughput']:.1f} yêu cầu/giây), "
+          f"{result['errors']} lỗi")
+    if result["ok"]:
+        print(f"Độ trễ: p50 {result['p50_ms']:.1f}ms, p90 {result['p90_ms']:.1f}ms, p99 {result['p99_ms']:.1f}ms, lớn nhất {result['max_ms']:.1f}ms")
+    if "first_error" in result:
+        print("Lỗi đầu tiên:", result["first_error"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
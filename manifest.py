@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+from fnmatch import fnmatch
+
+
+class Manifest:
+    """
+    Danh sach tep am thanh trong thu muc du lieu `root`, luu kem kich thuoc va thoi gian sua doi vao `manifest_folder`
+        `manifest = Manifest("data/train-custom"); manifest.refresh(); paths = manifest.get_paths("*.wav")`
+    Moi thu muc duoc doc mot lan bang os.scandir, nhung lan sau chi doc lai cac thu muc co thoi gian sua doi thay doi
+    (them/xoa/doi ten tep), cac thu muc khac chi can mot lan os.stat
+    """
+    def __init__(self, root, manifest_folder="manifests"):
+        self.root = os.path.normpath(root)
+        name = self.root.replace(os.sep, "_").replace(":", "").strip("._") or "root"
+        self.path = os.path.join(manifest_folder, f"{name}.json")
+        # {thư mục: {"mtime": ..., "subdirs": [...], "files": {tên tệp: [kích thước, thời gian sửa đổi]}}}
+        self.directories = {}
+        if os.path.isfile(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.directories = json.load(f)
+
+    def _scan(self, directory, mtime):
+        subdirs, files = [], {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+        return {"mtime": mtime, "subdirs": sorted(subdirs), "files": files}
+
+    def refresh(self, save=True):
+        """
+        Cap nhat danh sach tep, tra ve True neu co tep duoc them/xoa/thay doi so voi lan truoc
+        `save=False` de chi luu (`save()`) sau khi da xu ly xong cac thay doi
+        """
+        directories = {}
+        changed = False
+        stack = [ self.root ] if os.path.isdir(self.root) else []
+        while stack:
+            directory = stack.pop()
+            mtime = os.stat(directory).st_mtime_ns
+            old = self.directories.get(directory)
+            if old is not None and old["mtime"] == mtime:
+                # thư mục không đổi, dùng lại danh sách cũ
+                current = old
+            else:
+                current = self._scan(directory, mtime)
+                changed = changed or old is None or old["files"] != current["files"] or old["subdirs"] != current["subdirs"]
+            directories[directory] = current
+            stack.extend(os.path.join(directory, subdir) for subdir in current["subdirs"])
+        # thư mục bị xóa
+        changed = changed or set(directories) != set(self.directories)
+        self.directories = directories
+        if save and (changed or not os.path.isfile(self.path)):
+            self.save()
+        return changed
+
+    def get_digest(self):
+        "Ma bam cua danh sach tep (duong dan, kich thuoc, thoi gian sua doi), doi khi co tep duoc them/xoa/thay doi"
+        files = { directory: entry["files"] for directory, entry in self.directories.items() }
+        return hashlib.sha1(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def save(self):
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.directories, f)
+        os.replace(temp_path, self.path)
+
+    def get_files(self, pattern="*.wav"):
+        """
+        Tra ve danh sach (duong dan, kich thuoc, thoi gian sua doi) da sap xep cua cac tep khop `pattern`,
+        `pattern` tinh tu `root` va moi phan cach nhau boi '/' chi khop mot cap thu muc (vi du "Actor_*/*.wav")
+        """
+        parts = pattern.split("/")
+        result = []
+        for directory, entry in self.directories.items():
+            relative = os.path.relpath(directory, self.root)
+            relative = [] if relative == os.curdir else relative.split(os.sep)
+            if len(relative) != len(parts) - 1 or not all(fnmatch(name, part) for name, part in zip(relative, parts)):
+                continue
+            for name, (size, mtime) in entry["files"].items():
+                if fnmatch(name, parts[-1]):
+                    result.append((os.path.join(directory, name), size, mtime))
+        return sorted(result)
+
+    def get_paths(self, pattern="*.wav"):
+        return [ path for path, size, mtime in self.get_files(pattern) ]
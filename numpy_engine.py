@@ -0,0 +1,486 @@
+import json
+import os
+import numpy as np
+
+# bộ dự đoán chỉ dùng NumPy cho mô hình sklearn đã đào tạo (SVC/SVR, KNeighbors, MLP), không cần import sklearn
+#     numpy_engine.export(rec, "models/svc.npz")
+#     model = numpy_engine.load("models/svc.npz")
+#     model.predict(features), model.predict_proba(features)
+# tệp .npz chỉ chứa mảng số và chuỗi JSON nên được đọc với allow_pickle=False
+
+FORMAT_VERSION = 1
+# số dòng khoảng cách tính một lần cho KNN (giới hạn bộ nhớ của ma trận trung gian)
+KNN_BLOCK_SIZE = 2 ** 22
+
+
+def _to_array(X, dtype=None):
+    X = np.asarray(X, dtype=dtype)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    return X
+
+
+class NumpyModel:
+    """
+    Lop co so: `arrays` la cac mang da xuat, `params` la cac tham so dang JSON
+    """
+    kind = None
+
+    def __init__(self, arrays, params):
+        self.arrays = arrays
+        self.params = params
+        self.classes_ = arrays.get("classes")
+
+    @classmethod
+    def from_estimator(cls, model):
+        raise NotImplementedError
+
+    def predict(self, X):
+        raise NotImplementedError
+
+    def predict_proba(self, X):
+        raise NotImplementedError("Mô hình này không dự đoán xác suất")
+
+
+def _kernel(X, support_vectors, kernel, gamma, coef0, degree):
+    if kernel == "rbf":
+        # ||x - sv||^2 = ||x||^2 + ||sv||^2 - 2 x.sv
+        distances = (X ** 2).sum(axis=1)[:, None] + (support_vectors ** 2).sum(axis=1)[None, :] - 2 * X @ support_vectors.T
+        return np.exp(-gamma * np.maximum(distances, 0))
+    K = X @ support_vectors.T
+    if kernel == "linear":
+        return K
+    if kernel == "poly":
+        return (gamma * K + coef0) ** degree
+    if kernel == "sigmoid":
+        return np.tanh(gamma * K + coef0)
+    raise TypeError(f"Kernel: {kernel} không được hỗ trợ")
+
+
+def _sigmoid_predict(decision, A, B):
+    # như sigmoid_predict của libsvm, tránh tràn số của exp
+    fApB = decision * A + B
+    positive = fApB >= 0
+    result = np.empty_like(fApB)
+    result[positive] = np.exp(-fApB[positive]) / (1 + np.exp(-fApB[positive]))
+    result[~positive] = 1 / (1 + np.exp(fApB[~positive]))
+    return result
+
+
+def _multiclass_probability(r):
+    """
+    Ghep xac suat tung cap `r` (n_mau, k, k) thanh xac suat k lop, giong multiclass_probability cua libsvm
+    (Wu, Lin, Weng 2004), lap Gauss-Seidel cho tat ca mau cung luc, mau nao hoi tu thi dung cap nhat
+    """
+    n_samples, k = r.shape[:2]
+    # Q[t][t] = sum_{j != t} r[j][t]^2, Q[t][j] = -r[j][t] * r[t][j]
+    rT = r.transpose(0, 2, 1)
+    Q = -rT * r
+    diagonal = (rT ** 2).sum(axis=2) - (np.diagonal(rT, axis1=1, axis2=2) ** 2)
+    index = np.arange(k)
+    Q[:, index, index] = diagonal
+    p = np.full((n_samples, k), 1.0 / k)
+    eps = 0.005 / k
+    active = np.ones(n_samples, dtype=bool)
+    for _ in range(max(100, k)):
+        Qp = np.einsum("ntj,nj->nt", Q, p)
+        pQp = (p * Qp).sum(axis=1)
+        converged = np.abs(Qp - pQp[:, None]).max(axis=1) < eps
+        active &= ~converged
+        if not active.any():
+            break
+        for t in range(k):
+            Qtt = Q[active, t, t]
+            diff = (-Qp[active, t] + pQp[active]) / Qtt
+            p[active, t] += diff
+            pQp[active] = (pQp[active] + diff * (diff * Qtt + 2 * Qp[active, t])) / (1 + diff) / (1 + diff)
+            Qp[active] = (Qp[active] + diff[:, None] * Q[active, t, :]) / (1 + diff)[:, None]
+            p[active] /= (1 + diff)[:, None]
+    return p
+
+
+class SVCModel(NumpyModel):
+    """
+    SVC/SVR: vector ho tro, he so doi ngau, intercept va tham so kernel, cung cach tinh voi libsvm
+    (bo phieu mot-mot cho `predict`, ghep xac suat tung cap cho `predict_proba`)
+    """
+    kind = "svm"
+
+    @classmethod
+    def from_estimator(cls, model):
+        if getattr(model, "break_ties", False):
+            raise TypeError("SVC(break_ties=True) không được hỗ trợ")
+        if model.kernel not in ("rbf", "linear", "poly", "sigmoid"):
+            raise TypeError(f"Kernel: {model.kernel} không được hỗ trợ")
+        arrays = {
+            "support_vectors": model.support_vectors_,
+            # hệ số và intercept gốc của libsvm (sklearn đổi dấu cho phân loại hai lớp)
+            "dual_coef": model._dual_coef_,
+            "intercept": model._intercept_,
+            "n_support": model.n_support_.astype(np.int64),
+        }
+        classification = hasattr(model, "classes_")
+        if classification:
+            arrays["classes"] = model.classes_
+            if len(getattr(model, "probA_", [])):
+                arrays["probA"], arrays["probB"] = model.probA_, model.probB_
+        params = {"kernel": model.kernel, "gamma": float(model._gamma), "coef0": float(model.coef0), "degree": int(model.degree),
+                  "classification": classification}
+        return cls(arrays, params)
+
+    def _decision(self, X):
+        params = self.params
+        K = _kernel(_to_array(X, np.float64), self.arrays["support_vectors"], params["kernel"], params["gamma"], params["coef0"], params["degree"])
+        dual_coef, intercept = self.arrays["dual_coef"], self.arrays["intercept"]
+        if not params["classification"]:
+            return K @ dual_coef[0] + intercept[0]
+        n_support = self.arrays["n_support"]
+        start = np.concatenate([ [0], np.cumsum(n_support) ])
+        k = len(n_support)
+        decision = np.empty((len(K), k * (k - 1) // 2))
+        pair = 0
+        for i in range(k):
+            for j in range(i + 1, k):
+                si, sj = slice(start[i], start[i + 1]), slice(start[j], start[j + 1])
+                decision[:, pair] = K[:, si] @ dual_coef[j - 1, si] + K[:, sj] @ dual_coef[i, sj] + intercept[pair]
+                pair += 1
+        return decision
+
+    def predict(self, X):
+        decision = self._decision(X)
+        if not self.params["classification"]:
+            return decision
+        k = len(self.classes_)
+        votes = np.zeros((len(decision), k), dtype=np.int64)
+        pair = 0
+        for i in range(k):
+            for j in range(i + 1, k):
+                positive = decision[:, pair] > 0
+                votes[:, i] += positive
+                votes[:, j] += ~positive
+                pair += 1
+        # hòa phiếu thì chọn lớp đứng trước như libsvm
+        return self.classes_[votes.argmax(axis=1)]
+
+    def predict_proba(self, X):
+        if "probA" not in self.arrays:
+            raise NotImplementedError("Mô hình được đào tạo không có probability=True, không dự đoán được xác suất")
+        decision = self._decision(X)
+        k = len(self.classes_)
+        min_prob = 1e-7
+        pairwise = np.clip(_sigmoid_predict(decision, self.arrays["probA"], self.arrays["probB"]), min_prob, 1 - min_prob)
+        r = np.zeros((len(decision), k, k))
+        pair = 0
+        for i in range(k):
+            for j in range(i + 1, k):
+                r[:, i, j] = pairwise[:, pair]
+                r[:, j, i] = 1 - pairwise[:, pair]
+                pair += 1
+        return _multiclass_probability(r)
+
+
+class KNeighborsModel(NumpyModel):
+    """
+    KNeighborsClassifier/Regressor: ma tran dao tao, nhan va khoang cach (euclidean, manhattan, minkowski)
+    """
+    kind = "knn"
+
+    @classmethod
+    def from_estimator(cls, model):
+        metric = model.effective_metric_
+        if metric not in ("euclidean", "manhattan", "minkowski"):
+            raise TypeError(f"Khoảng cách: {metric} không được hỗ trợ")
+        if callable(model.weights):
+            raise TypeError("Hàm trọng số tự định nghĩa không được hỗ trợ")
+        arrays = {"fit_X": model._fit_X, "y": model._y}
+        classification = hasattr(model, "classes_")
+        if classification:
+            arrays["classes"] = model.classes_
+        params = {"n_neighbors": int(model.n_neighbors), "weights": model.weights, "metric": metric,
+                  "p": float(model.effective_metric_params_.get("p", 2)), "classification": classification}
+        return cls(arrays, params)
+
+    def _distances(self, X, fit_X):
+        metric = self.params["metric"]
+        if metric == "euclidean":
+            distances = (X ** 2).sum(axis=1)[:, None] + (fit_X ** 2).sum(axis=1)[None, :] - 2 * X @ fit_X.T
+            return np.sqrt(np.maximum(distances, 0))
+        difference = np.abs(X[:, None, :] - fit_X[None, :, :])
+        if metric == "manhattan":
+            return difference.sum(axis=2)
+        p = self.params["p"]
+        return (difference ** p).sum(axis=2) ** (1 / p)
+
+    def kneighbors(self, X):
+        "Trả về (khoảng cách, chỉ số) của `n_neighbors` điểm gần nhất, sắp xếp tăng dần"
+        X = _to_array(X, np.float64)
+        fit_X = np.asarray(self.arrays["fit_X"], dtype=np.float64)
+        k = self.params["n_neighbors"]
+        # manhattan/minkowski tạo mảng (dòng, n_đào_tạo, n_đặc_trưng), chia dòng để giới hạn bộ nhớ
+        block = max(1, KNN_BLOCK_SIZE // (fit_X.shape[0] * (1 if self.params["metric"] == "euclidean" else fit_X.shape[1])))
+        distances, indices = [], []
+        for start in range(0, len(X), block):
+            D = self._distances(X[start:start + block], fit_X)
+            index = np.argpartition(D, k - 1, axis=1)[:, :k] if k < D.shape[1] else np.tile(np.arange(D.shape[1]), (len(D), 1))
+            d = np.take_along_axis(D, index, axis=1)
+            order = np.argsort(d, axis=1, kind="stable")
+            distances.append(np.take_along_axis(d, order, axis=1))
+            indices.append(np.take_along_axis(index, order, axis=1))
+        return np.concatenate(distances), np.concatenate(indices)
+
+    def _weights(self, distances):
+        if self.params["weights"] == "uniform":
+            return np.ones_like(distances)
+        # như sklearn: dòng có khoảng cách 0 chỉ tính các điểm trùng
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / distances
+        inf_mask = np.isinf(weights)
+        inf_row = inf_mask.any(axis=1)
+        weights[inf_row] = inf_mask[inf_row]
+        return weights
+
+    def predict_proba(self, X):
+        if not self.params["classification"]:
+            raise NotImplementedError("Dự đoán xác suất không liên quan đến hồi quy")
+        distances, indices = self.kneighbors(X)
+        weights = self._weights(distances)
+        labels = self.arrays["y"][indices]
+        proba = np.zeros((len(indices), len(self.classes_)))
+        for c in range(len(self.classes_)):
+            proba[:, c] = (weights * (labels == c)).sum(axis=1)
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0] = 1
+        return proba / normalizer
+
+    def predict(self, X):
+        if self.params["classification"]:
+            return self.classes_[self.predict_proba(X).argmax(axis=1)]
+        distances, indices = self.kneighbors(X)
+        weights = self._weights(distances)
+        y = self.arrays["y"][indices]
+        if self.params["weights"] == "uniform":
+            return y.mean(axis=1)
+        return (weights * y).sum(axis=1) / weights.sum(axis=1)
+
+
+ACTIVATIONS = {
+    "identity": lambda X: X,
+    "relu": lambda X: np.maximum(X, 0),
+    "tanh": np.tanh,
+    "logistic": lambda X: 1 / (1 + np.exp(-X)),
+    # đầu ra của MLPRegressor(loss="poisson")
+    "exp": np.exp,
+}
+
+
+def _softmax(X):
+    X = np.exp(X - X.max(axis=1, keepdims=True))
+    return X / X.sum(axis=1, keepdims=True)
+
+
+class MLPModel(NumpyModel):
+    """
+    MLPClassifier/Regressor: ma tran trong so va bias cua tung lop
+    """
+    kind = "mlp"
+
+    @classmethod
+    def from_estimator(cls, model):
+        arrays = {}
+        for i, (coef, intercept) in enumerate(zip(model.coefs_, model.intercepts_)):
+            arrays[f"coef_{i}"], arrays[f"intercept_{i}"] = coef, intercept
+        classification = hasattr(model, "classes_")
+        if classification:
+            arrays["classes"] = model.classes_
+        params = {"n_layers": len(model.coefs_), "activation": model.activation, "out_activation": model.out_activation_,
+                  "classification": classification}
+        return cls(arrays, params)
+
+    def _forward(self, X):
+        X = _to_array(X)
+        n_layers = self.params["n_layers"]
+        activation = ACTIVATIONS[self.params["activation"]]
+        for i in range(n_layers):
+            X = X @ self.arrays[f"coef_{i}"] + self.arrays[f"intercept_{i}"]
+            if i < n_layers - 1:
+                X = activation(X)
+        if self.params["out_activation"] == "softmax":
+            return _softmax(X)
+        return ACTIVATIONS[self.params["out_activation"]](X)
+
+    def predict_proba(self, X):
+        if not self.params["classification"]:
+            raise NotImplementedError("Dự đoán xác suất không liên quan đến hồi quy")
+        y = self._forward(X)
+        if y.shape[1] == 1:
+            # hai lớp: một đầu ra logistic là xác suất của lớp thứ hai
+            return np.column_stack([ 1 - y[:, 0], y[:, 0] ])
+        return y
+
+    def predict(self, X):
+        y = self._forward(X)
+        if not self.params["classification"]:
+            return y[:, 0] if y.shape[1] == 1 else y
+        if y.shape[1] == 1:
+            return self.classes_[(y[:, 0] > 0.5).astype(int)]
+        return self.classes_[y.argmax(axis=1)]
+
+
+# tên lớp sklearn -> lớp dự đoán NumPy
+ESTIMATORS = {
+    "SVC": SVCModel,
+    "SVR": SVCModel,
+    "KNeighborsClassifier": KNeighborsModel,
+    "KNeighborsRegressor": KNeighborsModel,
+    "MLPClassifier": MLPModel,
+    "MLPRegressor": MLPModel,
+}
+MODELS = { model.kind: model for model in ESTIMATORS.values() }
+
+
+def from_estimator(model):
+    "Chuyển mô hình sklearn đã đào tạo thành `NumpyModel`"
+    name = model.__class__.__name__
+    if name not in ESTIMATORS:
+        raise TypeError(f"Mô hình: {name} không được hỗ trợ, chỉ hỗ trợ {', '.join(ESTIMATORS)}")
+    return ESTIMATORS[name].from_estimator(model)
+
+
+def export_reducer(reducer):
+    """
+    Chuyen bo giam chieu cua `reduction` (Pipeline gom StandardScaler, PCA, SelectKBest) thanh (danh sach buoc, mang)
+    """
+    steps = reducer.steps if hasattr(reducer, "steps") else [ (reducer.__class__.__name__, reducer) ]
+    description, arrays = [], {}
+    for i, (name, step) in enumerate(steps):
+        kind = step.__class__.__name__
+        prefix = f"reducer_{i}_"
+        if kind == "StandardScaler":
+            n_features = step.n_features_in_
+            # sklearn vẫn tính mean_ khi with_mean=False nhưng transform không trừ nó
+            arrays[prefix + "mean"] = step.mean_ if step.with_mean and step.mean_ is not None else np.zeros(n_features)
+            arrays[prefix + "scale"] = step.scale_ if step.with_std and step.scale_ is not None else np.ones(n_features)
+            description.append({"kind": "scaler"})
+        elif kind == "PCA":
+            arrays[prefix + "mean"], arrays[prefix + "components"] = step.mean_, step.components_
+            if step.whiten:
+                arrays[prefix + "scale"] = np.sqrt(step.explained_variance_)
+            description.append({"kind": "pca", "whiten": bool(step.whiten)})
+        elif kind == "SelectKBest":
+            arrays[prefix + "support"] = np.flatnonzero(step.get_support()).astype(np.int64)
+            description.append({"kind": "select"})
+        else:
+            raise TypeError(f"Bước giảm chiều: {kind} không được hỗ trợ, chỉ hỗ trợ StandardScaler, PCA, SelectKBest")
+    return description, arrays
+
+
+def apply_reducer(X, steps, arrays):
+    "Giảm chiều `X` theo các bước của `export_reducer`"
+    for i, step in enumerate(steps):
+        prefix = f"reducer_{i}_"
+        if step["kind"] == "scaler":
+            X = (X - arrays[prefix + "mean"]) / arrays[prefix + "scale"]
+        elif step["kind"] == "pca":
+            X = (X - arrays[prefix + "mean"]) @ arrays[prefix + "components"].T
+            if step["whiten"]:
+                X = X / arrays[prefix + "scale"]
+        else:
+            X = X[:, arrays[prefix + "support"]]
+    return X
+
+
+def export(model, path):
+    """
+    Ghi mo hinh ra tep .npz, `model` la mo hinh sklearn da dao tao hoac `EmotionRecognizer`
+    (khi do luu ca cam xuc, audio_config va che do phan loai/hoi quy de `load_recognizer` du doan tu tep am thanh)
+    """
+    metadata, reducer_arrays = {}, {}
+    if hasattr(model, "audio_config"):
+        metadata = {"emotions": list(model.emotions), "audio_config": model.audio_config, "classification": model.classification,
+                    "categories": model.categories, "reducer": None}
+        if getattr(model, "reducer", None) is not None:
+            metadata["reducer"], reducer_arrays = export_reducer(model.reducer)
+        model = model.model
+    numpy_model = from_estimator(model)
+    header = {"format_version": FORMAT_VERSION, "kind": numpy_model.kind, "estimator": model.__class__.__name__,
+              "params": numpy_model.params, "metadata": metadata}
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    arrays = { name: np.asarray(array) for name, array in { **numpy_model.arrays, **reducer_arrays }.items() }
+    if "classes" in arrays and arrays["classes"].dtype == object:
+        # nhãn chuỗi kiểu object cần pickle, đổi sang chuỗi unicode
+        arrays["classes"] = arrays["classes"].astype(str)
+    with open(path, "wb") as f:
+        np.savez(f, header=np.array(json.dumps(header)), **arrays)
+    return numpy_model
+
+
+def _read(path):
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data["header"]))
+        arrays = { name: data[name] for name in data.files if name != "header" }
+    if header["format_version"] > FORMAT_VERSION:
+        raise TypeError(f"Phiên bản tệp: {header['format_version']} mới hơn phiên bản được hỗ trợ ({FORMAT_VERSION})")
+    return header, arrays
+
+
+def load(path):
+    """
+    Tai mo hinh da xuat bang `export()`, tra ve `NumpyModel` co `predict`/`predict_proba`/`classes_` nhu sklearn
+    """
+    header, arrays = _read(path)
+    model = MODELS[header["kind"]](arrays, header["params"])
+    model.estimator = header["estimator"]
+    return model
+
+
+class NumpyRecognizer:
+    """
+    Du doan tu tep am thanh/bytes/mang numpy nhu `EmotionRecognizer.predict` nhung chi can NumPy cho mo hinh
+        `rec = numpy_engine.load_recognizer("models/svc.npz"); rec.predict("data/test.wav")`
+    """
+    def __init__(self, model, emotions, audio_config, classification=True, categories=None, reducer=None):
+        self.model = model
+        self.emotions = emotions
+        self.audio_config = audio_config
+        self.classification = classification
+        self.categories = categories
+        # các bước giảm chiều (`export_reducer`), mảng nằm trong model.arrays
+        self.reducer = reducer
+
+    def _extract_feature(self, audio, sample_rate=None):
+        # trích xuất đặc trưng cần librosa, chỉ import khi dùng
+        from utils import extract_feature, extract_feature_from_buffer
+        if isinstance(audio, (str, os.PathLike)):
+            feature = extract_feature(audio, **self.audio_config)
+        else:
+            feature = extract_feature_from_buffer(audio, sample_rate, **self.audio_config)
+        return self._reduce(feature.reshape(1, -1))
+
+    def _reduce(self, X):
+        # giảm chiều như `EmotionRecognizer._reduce`, StreamingRecognizer / server gọi trên đặc trưng tự trích xuất
+        if not self.reducer:
+            return X
+        return apply_reducer(X, self.reducer, self.model.arrays)
+
+    def predict(self, audio, sample_rate=None):
+        return self.model.predict(self._extract_feature(audio, sample_rate))[0]
+
+    def predict_proba(self, audio, sample_rate=None):
+        if not self.classification:
+            raise NotImplementedError("Dự đoán xác suất không liên quan đến hồi quy")
+        proba = self.model.predict_proba(self._extract_feature(audio, sample_rate))[0]
+        return dict(zip(self.model.classes_, proba))
+
+
+def load_recognizer(path):
+    "Tải tệp xuất từ `EmotionRecognizer` (`export(rec, path)`), trả về `NumpyRecognizer`"
+    header, arrays = _read(path)
+    metadata = header["metadata"]
+    if not metadata:
+        raise TypeError(f"Tệp {path} chỉ chứa mô hình, hãy xuất từ EmotionRecognizer để có audio_config")
+    model = MODELS[header["kind"]](arrays, header["params"])
+    model.estimator = header["estimator"]
+    return NumpyRecognizer(model, metadata["emotions"], metadata["audio_config"], metadata["classification"], metadata["categories"],
+                           metadata.get("reducer"))
@@ -0,0 +1,66 @@
+import numpy as np
+import wave
+
+# ngưỡng biên độ coi là im lặng và tần số lấy mẫu mặc định
+THRESHOLD = 500
+RATE = 16000
+# biên độ đích khi chuẩn hóa âm lượng
+MAXIMUM = 16385
+
+
+def from_bytes(data):
+    """
+    Doc du lieu PCM 16 bit little-endian (nhu pyaudio tra ve) thanh mang int16, khong sao chep tren may little-endian
+    """
+    return np.frombuffer(data, dtype="<i2").astype(np.int16, copy=False)
+
+
+def to_bytes(snd_data):
+    "Đổi mảng int16 về bytes PCM 16 bit little-endian"
+    return np.asarray(snd_data).astype("<i2", copy=False).tobytes()
+
+
+def to_float(snd_data):
+    "Đổi PCM int16 sang số thực trong [-1, 1), cùng thang đo với soundfile khi đọc tệp 16 bit"
+    return np.asarray(snd_data, dtype=np.float64) / 32768.0
+
+
+def is_silent(snd_data, threshold=THRESHOLD):
+    "Trả về 'True' nếu dưới ngưỡng 'silent'"
+    return np.max(snd_data) < threshold
+
+
+def normalize(snd_data, maximum=MAXIMUM):
+    "Âm lượng âm thanh đầu ra"
+    snd_data = np.asarray(snd_data, dtype=np.int16)
+    # đổi sang int32 trước khi lấy trị tuyệt đối để -32768 không bị tràn
+    peak = np.max(np.abs(snd_data.astype(np.int32))) if len(snd_data) else 0
+    if peak == 0:
+        return snd_data.copy()
+    times = float(maximum) / peak
+    # int() cắt phần thập phân về phía 0, giống np.trunc
+    return np.trunc(snd_data * times).astype(np.int16)
+
+
+def trim(snd_data, threshold=THRESHOLD):
+    "Cắt bớt âm thanh ở đầu và cuối, trả về một view của 'snd_data' (không sao chép)"
+    snd_data = np.asarray(snd_data, dtype=np.int16)
+    loud = np.flatnonzero((snd_data > threshold) | (snd_data < -threshold))
+    if not len(loud):
+        return snd_data[:0]
+    return snd_data[loud[0]:loud[-1] + 1]
+
+
+def add_silence(snd_data, seconds, rate=RATE):
+    "Thêm khoảng trống vào đầu và cuối 'snd_data' theo giây dạng (float)"
+    return np.pad(np.asarray(snd_data, dtype=np.int16), int(seconds * rate))
+
+
+def write_wav(path, snd_data, sample_width=2, rate=RATE):
+    "Ghi PCM int16 kênh đơn âm (mono) ra tệp wav"
+    wf = wave.open(path, 'wb')
+    wf.setnchannels(1)
+    wf.setsampwidth(sample_width)
+    wf.setframerate(rate)
+    wf.writeframes(to_bytes(snd_data))
+    wf.close()
@@ -0,0 +1,91 @@
+import numpy as np
+
+from time import perf_counter
+
+import numpy_engine
+
+# giảm chiều đặc trưng giữa bước trích xuất và mô hình: chuẩn hóa (StandardScaler) + PCA hoặc chọn đặc trưng (SelectKBest)
+#     EmotionRecognizer(SVC(), reducer="pca", n_components=40)
+# bộ giảm chiều chỉ được đào tạo trên dữ liệu đào tạo và được lưu cùng mô hình
+# "scaler" chỉ chuẩn hóa, không giảm chiều (dùng cho đào tạo tăng dần, xem `incremental`)
+
+REDUCERS = {"pca", "select", "scaler"}
+
+
+def make_reducer(method="pca", n_components=40, classification=True, random_state=None):
+    """
+    Bo giam chieu (chua dao tao): StandardScaler roi PCA (`n_components` chieu, hoac ty le phuong sai neu la so thuc < 1)
+    hoac SelectKBest (`n_components` dac trung co diem ANOVA F cao nhat), "scaler" chi la StandardScaler,
+    `method` khac chuoi thi duoc dung nguyen (mot transformer cua sklearn)
+    """
+    if not isinstance(method, str):
+        return method
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    if method == "scaler":
+        # không phải Pipeline để còn partial_fit được
+        return StandardScaler()
+    if method == "pca":
+        from sklearn.decomposition import PCA
+        step = PCA(n_components=n_components, random_state=random_state)
+    elif method == "select":
+        from sklearn.feature_selection import SelectKBest, f_classif, f_regression
+        step = SelectKBest(f_classif if classification else f_regression, k=n_components)
+    else:
+        raise TypeError(f"Bộ giảm chiều: {method} không được chấp nhận, chỉ chấp nhận {', '.join(sorted(REDUCERS))}")
+    return Pipeline([ ("scaler", StandardScaler()), (method, step) ])
+
+
+def reduction_report(estimator, X_train, y_train, X_test, y_test, dimensions=(10, 20, 40, 60, 90, 120), method="pca",
+                     classification=True, repeat=3, random_state=None, verbose=1):
+    """
+    Do chinh xac (phan loai) / sai so binh phuong (hoi quy), thoi gian dao tao, thoi gian du doan tap kiem tra va do tre
+    du doan tung mau cua `estimator` theo so chieu sau khi giam, dong dau tien la dac trung goc (khong giam chieu)
+    Tra ve danh sach tu dien, moi so chieu mot dong
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import accuracy_score, mean_squared_error
+    metric = accuracy_score if classification else mean_squared_error
+    n_features = X_train.shape[1]
+    rows = []
+    for dimension in [ None ] + [ d for d in dimensions if d < n_features ]:
+        reducer = None
+        Xr_train, Xr_test = X_train, X_test
+        start = perf_counter()
+        if dimension is not None:
+            reducer = make_reducer(method, dimension, classification, random_state).fit(X_train, y_train)
+            Xr_train, Xr_test = reducer.transform(X_train), reducer.transform(X_test)
+        reduce_time = perf_counter() - start
+        fit_times, predict_times = [], []
+        for _ in range(repeat):
+            model = clone(estimator)
+            start = perf_counter()
+            model.fit(Xr_train, y_train)
+            fit_times.append(perf_counter() - start)
+            start = perf_counter()
+            y_pred = model.predict(Xr_test)
+            predict_times.append(perf_counter() - start)
+        # độ trễ một mẫu tính cả bước giảm chiều (bằng NumPy như `EmotionRecognizer.predict`)
+        steps = numpy_engine.export_reducer(reducer) if reducer is not None else None
+        sample = X_test[:1]
+        latencies = []
+        for _ in range(max(repeat, 20)):
+            start = perf_counter()
+            model.predict(numpy_engine.apply_reducer(sample, *steps) if steps else sample)
+            latencies.append(perf_counter() - start)
+        row = {
+            "dimension": n_features if dimension is None else dimension,
+            "method": "none" if dimension is None else method,
+            "score": metric(y_test, y_pred),
+            "reduce_s": reduce_time,
+            "fit_s": float(np.median(fit_times)),
+            "predict_test_s": float(np.median(predict_times)),
+            "latency_ms": float(np.median(latencies)) * 1000,
+        }
+        if dimension is not None and method == "pca":
+            row["explained_variance"] = float(reducer.named_steps["pca"].explained_variance_ratio_.sum())
+        rows.append(row)
+        if verbose:
+            print(f"[{row['method']:6} {row['dimension']:4}] {'độ chính xác' if classification else 'MSE'} {row['score']:.4f}, "
+                  f"đào tạo {row['fit_s']:.3f}s, dự đoán {row['predict_test_s']:.3f}s, một mẫu {row['latency_ms']:.3f}ms")
+    return rows
@@ -0,0 +1,227 @@
+import numpy as np
+import hashlib
+import inspect
+import pickle
+import json
+import os
+from math import ceil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from joblib import Parallel, delayed
+
+import sklearn
+from sklearn.base import clone, is_classifier
+
+import instrumentation
+from utils import get_n_jobs
+from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+
+
+def get_fingerprint(*arrays):
+    """
+    Ma bam (sha1) cua noi dung cac mang, dung de nhan biet du lieu da thay doi
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.asarray(array)
+        if array.dtype == object:
+            array = array.astype(str)
+        digest.update(f"{array.dtype}{array.shape}".encode("utf-8"))
+        digest.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    return digest.hexdigest()
+
+
+class TrialCheckpoint:
+    """
+    Luu ket qua tung cau hinh da thu vao tep JSON lines, chay lai se bo qua cac cau hinh da co ket qua
+    """
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        if path and os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except ValueError:
+                        # dòng cuối có thể ghi dở khi tiến trình bị dừng
+                        continue
+                    self.scores[trial["key"]] = trial["score"]
+
+    @staticmethod
+    def get_key(estimator, params, n_resources, fingerprint, random_state, metric, cv):
+        """
+        Khoa cua mot cau hinh: mo hinh (ca tham so co dinh), sieu tham so, so mau, du lieu va cach cham diem (`random_state` chon tap con
+        cua successive halving, ham `metric`, cach chia fold `cv`), doi mot trong so do thi phai chay lai
+        """
+        params = json.dumps(params, sort_keys=True, default=str)
+        # tham số không tìm kiếm của mô hình (gồm các bước của Pipeline, ví dụ bộ giảm chiều của `grid_search`)
+        base = hashlib.sha1(json.dumps(estimator.get_params(), sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        metric = getattr(metric, "__name__", repr(metric))
+        # bộ chia fold của sklearn có repr gồm tham số, danh sách (train, test) tự tạo thì lấy mã băm
+        cv = str(cv) if isinstance(cv, int) else hashlib.sha1(repr(cv).encode("utf-8")).hexdigest()[:16]
+        return f"{estimator.__class__.__name__}|{base}|{fingerprint}|{n_resources}|{random_state}|{metric}|{cv}|{params}"
+
+    def get(self, key):
+        return self.scores.get(key)
+
+    def add(self, key, score):
+        self.scores[key] = score
+        if not self.path:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "score": score}) + "\n")
+
+
+def _evaluate(estimator, params, X, y, cv, metric):
+    # điểm trung bình qua các fold của một cấu hình, chạy được trong tiến trình con
+    estimator = clone(estimator).set_params(**params)
+    cv = check_cv(cv, y, classifier=is_classifier(estimator))
+    scores = []
+    try:
+        for train, test in cv.split(X, y):
+            estimator.fit(X[train], y[train])
+            scores.append(metric(y[test], estimator.predict(X[test])))
+    except ValueError:
+        # cấu hình không chạy được trên tập con này (ví dụ n_neighbors lớn hơn số mẫu), giống error_score=nan của sklearn
+        return float("nan")
+    return float(np.mean(scores))
+
+
+def _evaluate_candidates(estimator, candidates, X, y, cv, metric, n_jobs, checkpoint, fingerprint, random_state, verbose):
+    n_resources = len(X)
+    keys = [ TrialCheckpoint.get_key(estimator, params, n_resources, fingerprint, random_state, metric, cv) for params in candidates ]
+    scores = [ checkpoint.get(key) for key in keys ]
+    pending = [ i for i, score in enumerate(scores) if score is None ]
+    if verbose:
+        print(f"[{estimator.__class__.__name__}] {len(candidates)} cấu hình trên {n_resources} mẫu, {len(candidates) - len(pending)} đã có kết quả")
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        for i in pending:
+            scores[i] = _evaluate(estimator, candidates[i], X, y, cv, metric)
+            checkpoint.add(keys[i], scores[i])
+        return scores
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = { executor.submit(_evaluate, estimator, candidates[i], X, y, cv, metric): i for i in pending }
+        # lưu ngay khi từng cấu hình xong để bị dừng giữa chừng cũng không mất kết quả
+        for future in as_completed(futures):
+            i = futures[future]
+            scores[i] = future.result()
+            checkpoint.add(keys[i], scores[i])
+    return scores
+
+
+def budgeted_search(estimator, params, X, y, metric, greater_is_better=True, search="halving", n_candidates=None, factor=3,
+                    min_resources=None, cv=3, n_jobs=1, checkpoint=None, random_state=0, verbose=1):
+    """
+    Tim kiem sieu tham so co gioi han ngan sach, tra ve (best_estimator, best_params, best_score) giong `GridSearchCV`
+        search="halving": loai dan (successive halving) theo so mau, moi vong giu 1/`factor` cau hinh tot nhat
+                          va tang so mau len `factor` lan cho den khi dung toan bo du lieu
+        search="random": thu ngau nhien `n_candidates` cau hinh tren toan bo du lieu
+    `checkpoint` la tep JSON lines luu cac cau hinh da thu, chay lai se tiep tuc tu cho bi dung
+    """
+    X, y = np.asarray(X), np.asarray(y)
+    checkpoint = TrialCheckpoint(checkpoint)
+    fingerprint = get_fingerprint(X, y)
+    if search == "random":
+        candidates = list(ParameterSampler(params, n_iter=n_candidates or 60, random_state=random_state))
+        resources = len(X)
+    elif search == "halving":
+        candidates = list(ParameterGrid(params))
+        if n_candidates and n_candidates < len(candidates):
+            candidates = list(ParameterSampler(params, n_iter=n_candidates, random_state=random_state))
+        if min_resources is None:
+            # đủ để mỗi fold có vài mẫu của mỗi lớp (như sklearn), tối thiểu 30 mẫu
+            n_classes = len(np.unique(y)) if is_classifier(estimator) else 1
+            min_resources = max(2 * n_classes * (cv if isinstance(cv, int) else 3), 30)
+        resources = min_resources
+    else:
+        raise TypeError("Chế độ tìm kiếm không hợp lệ, chỉ chấp nhận 'halving' hoặc 'random'")
+    # các vòng dùng phần đầu của cùng một hoán vị để vòng sau chứa dữ liệu của vòng trước và chạy lại cho cùng tập con
+    permutation = np.random.default_rng(random_state).permutation(len(X))
+    while True:
+        resources = min(resources, len(X))
+        subset = permutation[:resources]
+        scores = _evaluate_candidates(estimator, candidates, X[subset], y[subset], cv, metric, n_jobs, checkpoint, fingerprint, random_state,
+                                      verbose)
+        # cấu hình lỗi (nan) luôn xếp cuối
+        order = np.argsort(-np.nan_to_num(scores, nan=-np.inf) if greater_is_better else np.nan_to_num(scores, nan=np.inf), kind="stable")
+        if len(candidates) == 1 or resources == len(X):
+            break
+        candidates = [ candidates[i] for i in order[:ceil(len(candidates) / factor)] ]
+        resources *= factor
+    best = order[0]
+    best_params = candidates[best]
+    best_estimator = clone(estimator).set_params(**best_params).fit(X, y)
+    return best_estimator, best_params, scores[best]
+
+
+def _fit_and_score(estimator, X_train, y_train, X_test, y_test, metric, sample_weight=None):
+    # đào tạo trên tập huấn luyện và chấm điểm trên tập kiểm tra, chạy được trong tiến trình con
+    if sample_weight is not None and "sample_weight" in inspect.signature(estimator.fit).parameters:
+        estimator.fit(X_train, y_train, sample_weight=sample_weight)
+    else:
+        estimator.fit(X_train, y_train)
+    return estimator, metric(y_test, estimator.predict(X_test))
+
+
+def evaluate_estimators(estimators, X_train, y_train, X_test, y_test, metric, sample_weight=None, n_jobs=1, cache_folder="grid/cache",
+                        fingerprint=None, verbose=1):
+    """
+    Dao tao va cham diem tung mo hinh trong `estimators`, tra ve danh sach (mo hinh da dao tao, diem) theo dung thu tu
+    Cac mo hinh chay song song bang joblib (X/y lon duoc chia se qua bo nho dung chung (memmap) thay vi sao chep cho tung tien trinh),
+    ket qua duoc luu trong `cache_folder` theo ma bam cua du lieu (`fingerprint`) va sieu tham so nen lan goi lai se tai ngay
+    """
+    if fingerprint is None:
+        fingerprint = get_fingerprint(X_train, y_train, X_test, y_test, [] if sample_weight is None else sample_weight)
+    paths = []
+    for estimator in estimators:
+        params = json.dumps(estimator.get_params(), sort_keys=True, default=str)
+        # <phiên bản sklearn>_<mô hình + tham số + hàm chấm điểm>_<dữ liệu>.pickle, mô hình pickle không dùng được qua phiên bản sklearn khác
+        key = hashlib.sha1(f"{estimator.__class__.__name__}|{params}|{metric.__name__}".encode("utf-8")).hexdigest()[:20]
+        data_key = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:20]
+        paths.append(os.path.join(cache_folder, f"{sklearn.__version__}_{key}_{data_key}.pickle"))
+    results = [ None ] * len(estimators)
+    for i, path in enumerate(paths):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                results[i] = pickle.load(f)
+    pending = [ i for i, result in enumerate(results) if result is None ]
+    instrumentation.increment("model_cache_hits", len(estimators) - len(pending))
+    instrumentation.increment("model_cache_misses", len(pending))
+    if verbose:
+        print(f"Đánh giá {len(pending)} mô hình, {len(estimators) - len(pending)} mô hình đã có trong bộ nhớ đệm")
+    with instrumentation.span("evaluate_estimators"):
+        fitted = Parallel(n_jobs=n_jobs)(delayed(_fit_and_score)(clone(estimators[i]), X_train, y_train, X_test, y_test, metric, sample_weight)
+                                         for i in pending)
+    if pending and not os.path.isdir(cache_folder):
+        os.makedirs(cache_folder)
+    for i, result in zip(pending, fitted):
+        results[i] = result
+        temp_path = f"{paths[i]}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(result, f)
+        os.replace(temp_path, paths[i])
+    _remove_stale_cache(cache_folder, paths)
+    return results
+
+
+def _remove_stale_cache(cache_folder, paths):
+    # xóa mô hình của phiên bản sklearn khác và của dữ liệu cũ (cùng mô hình, tham số, hàm chấm điểm) như FeatureStore,
+    # để thư mục không lớn dần sau mỗi lần nâng cấp hoặc thêm dữ liệu
+    if not os.path.isdir(cache_folder):
+        return
+    keep = { os.path.basename(path) for path in paths }
+    keys = { name.split("_")[1] for name in keep }
+    for entry in os.scandir(cache_folder):
+        if not entry.name.endswith(".pickle") or entry.name in keep:
+            continue
+        parts = entry.name.split("_")
+        if len(parts) != 3 or parts[0] != sklearn.__version__ or parts[1] in keys:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
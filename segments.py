@@ -0,0 +1,73 @@
+import numpy as np
+import soundfile
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+from utils import extract_feature_from_array, get_readable_audio, get_n_jobs, DEFAULT_DTYPE
+
+
+def count_segments(n_frames, window_frames, hop_frames):
+    "Số cửa sổ (bắt đầu tại 0, hop, 2*hop...) cần để phủ `n_frames` mẫu, cửa sổ cuối có thể ngắn hơn"
+    if n_frames <= window_frames:
+        return 1
+    return int(np.ceil((n_frames - window_frames) / hop_frames)) + 1
+
+
+def iter_segments(audio_path, window=3.0, hop=1.5, first_segment=0, n_segments=None, dtype=DEFAULT_DTYPE):
+    """
+    Doc tep theo tung khoi bang soundfile.blocks, tra ve lan luot (bat dau, ket thuc (giay), tin hieu, tan so lay mau)
+    cua cac cua so dai `window` giay cach nhau `hop` giay, bo nho chi giu mot cua so tai mot thoi diem
+    `first_segment` / `n_segments` chi doc mot doan cac cua so, dung de chia mot tep dai cho nhieu tien trinh
+    """
+    with soundfile.SoundFile(get_readable_audio(audio_path)) as sound_file:
+        sample_rate = sound_file.samplerate
+        window_frames = int(window * sample_rate)
+        hop_frames = int(hop * sample_rate)
+        if n_segments is None:
+            n_segments = count_segments(sound_file.frames, window_frames, hop_frames) - first_segment
+        start = first_segment * hop_frames
+        stop = min(sound_file.frames, start + (n_segments - 1) * hop_frames + window_frames)
+        sound_file.seek(start)
+        blocks = sound_file.blocks(blocksize=window_frames, overlap=window_frames - hop_frames, frames=stop - start, dtype=dtype)
+        for i, X in enumerate(blocks):
+            if X.ndim == 2:
+                # trộn về mono
+                X = X.mean(axis=1)
+            segment_start = start + i * hop_frames
+            yield segment_start / sample_rate, (segment_start + len(X)) / sample_rate, X, sample_rate
+
+
+def _segment_features(audio_path, audio_config, window, hop, first_segment, n_segments, instrumented=False):
+    # hàm chạy trong tiến trình con, trích xuất đặc trưng cho một đoạn các cửa sổ
+    if instrumented:
+        instrumentation.enable()
+        instrumentation.reset()
+    dtype = audio_config.get("dtype", DEFAULT_DTYPE)
+    features = [ (start, end, extract_feature_from_array(X, sample_rate, **audio_config))
+                 for start, end, X, sample_rate in iter_segments(audio_path, window, hop, first_segment, n_segments, dtype) ]
+    return features, instrumentation.collect() if instrumented else None
+
+
+def iter_segment_features(audio_path, audio_config, window=3.0, hop=1.5, n_jobs=1, segments_per_job=64):
+    """
+    Tra ve lan luot (bat dau, ket thuc, vecto dac trung) cua tung cua so theo dung thu tu thoi gian
+    Khi `n_jobs` > 1 cac cua so duoc chia thanh tung doan `segments_per_job` cua so, moi tien trinh tu doc doan cua minh tu tep
+    """
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        for start, end, X, sample_rate in iter_segments(audio_path, window, hop, dtype=audio_config.get("dtype", DEFAULT_DTYPE)):
+            yield start, end, extract_feature_from_array(X, sample_rate, **audio_config)
+        return
+    with soundfile.SoundFile(get_readable_audio(audio_path)) as sound_file:
+        sample_rate = sound_file.samplerate
+        n_segments = count_segments(sound_file.frames, int(window * sample_rate), int(hop * sample_rate))
+    spans = [ (first, min(segments_per_job, n_segments - first)) for first in range(0, n_segments, segments_per_job) ]
+    instrumented = instrumentation.is_enabled()
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [ executor.submit(_segment_features, audio_path, audio_config, window, hop, first, count, instrumented)
+                    for first, count in spans ]
+        for future in futures:
+            features, metrics = future.result()
+            instrumentation.merge(metrics)
+            yield from features
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter, time
+from urllib.parse import urlsplit, parse_qs
+
+import instrumentation
+from inference import load_predictor
+from convert_wavs import TARGET_SAMPLE_RATE
+from utils import decode_audio, extract_feature_from_array
+
+# dịch vụ HTTP dự đoán cảm xúc (chỉ dùng thư viện chuẩn asyncio), tải mô hình đã lưu một lần
+#     python server.py models/svc.pickle --port 8000
+#     curl --data-binary @ACuoi.wav http://127.0.0.1:8000/predict
+#     curl --data-binary @audio.pcm "http://127.0.0.1:8000/predict?format=pcm&rate=16000"
+# đặc trưng được trích xuất trong các tiến trình con, các yêu cầu đồng thời được gom thành một lần gọi mô hình
+
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                  500: "Internal Server Error"}
+
+
+def decode_request(body, audio_format="file", rate=TARGET_SAMPLE_RATE, dtype="float32"):
+    """
+    Giai ma noi dung yeu cau thanh (tin hieu mono, tan so lay mau goc), dac trung duoc trich xuat o tan so goc
+    giong `EmotionRecognizer.predict` va `StreamingRecognizer`
+        audio_format="file": tep am thanh (wav, flac, ogg...) soundfile doc duoc
+        audio_format="pcm": PCM 16 bit little-endian mono voi tan so lay mau `rate`
+    """
+    if audio_format not in ("file", "pcm"):
+        raise ValueError(f"Định dạng âm thanh không hợp lệ: {audio_format}, chỉ chấp nhận 'file' hoặc 'pcm'")
+    return decode_audio(body, rate if audio_format == "pcm" else None, dtype)
+
+
+def extract_request_features(body, audio_format, rate, audio_config):
+    # chạy trong tiến trình con, trả về đặc trưng kèm số liệu đo của tiến trình con
+    instrumented = instrumentation.is_enabled()
+    if instrumented:
+        instrumentation.reset()
+    with instrumentation.span("decode"):
+        X, sample_rate = decode_request(body, audio_format, rate, audio_config.get("dtype", "float32"))
+    if not len(X):
+        raise ValueError("Âm thanh rỗng")
+    feature = extract_feature_from_array(X, sample_rate, **audio_config)
+    return feature, instrumentation.collect() if instrumented else None
+
+
+def _init_worker(instrumented):
+    if instrumented:
+        instrumentation.enable()
+
+
+def get_model_name(model):
+    # mô hình của numpy_engine giữ tên lớp sklearn đã xuất
+    return getattr(model, "estimator", model.__class__.__name__)
+
+
+class MicroBatcher:
+    """
+    Gom cac yeu cau dong thoi thanh mot lan goi mo hinh: lo duoc gui khi du `max_batch_size` yeu cau
+    hoac khi yeu cau dau tien da cho `max_wait` giay, mo hinh chay trong mot luong rieng de khong chan vong lap su kien
+    `reduce` (vi du `detector._reduce`) giam chieu ca lo dac trung truoc khi goi mo hinh
+    """
+    def __init__(self, model, classification=True, max_batch_size=32, max_wait=0.005, reduce=None):
+        self.model = model
+        self.reduce = reduce
+        self.with_proba = classification and hasattr(model, "predict_proba")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        # một luồng duy nhất để các lô chạy lần lượt
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, feature):
+        "Trả về (cảm xúc, {cảm xúc: xác suất} hoặc None) cho một vectơ đặc trưng"
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((feature, future))
+        return await future
+
+    def _predict_batch(self, features):
+        if self.reduce is not None:
+            with instrumentation.span("reducer.transform"):
+                features = self.reduce(features)
+        # nhãn lấy từ predict như `EmotionRecognizer.predict` (với SVC có thể khác xác suất lớn nhất), đổi sang kiểu Python để ghi JSON
+        with instrumentation.span("model.predict"):
+            labels = self.model.predict(features).tolist()
+        if not self.with_proba:
+            return [ (label, None) for label in labels ]
+        with instrumentation.span("model.predict_proba"):
+            classes = self.model.classes_.tolist()
+            probas = self.model.predict_proba(features)
+        return [ (label, dict(zip(map(str, classes), proba.tolist()))) for label, proba in zip(labels, probas) ]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [ await self.queue.get() ]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # bỏ các yêu cầu đã bị hủy (client ngắt kết nối)
+            batch = [ (feature, future) for feature, future in batch if not future.done() ]
+            if not batch:
+                continue
+            instrumentation.increment("server_batches")
+            instrumentation.increment("server_batched_requests", len(batch))
+            try:
+                results = await loop.run_in_executor(self.executor, self._predict_batch, np.array([ feature for feature, future in batch ]))
+            except Exception as e:
+                for feature, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (feature, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class EmotionServer:
+    """
+    May chu HTTP/1.1 (giu ket noi) cho mot `EmotionRecognizer` da tai:
+        POST /predict[?format=pcm&rate=16000]  noi dung la tep am thanh hoac PCM 16 bit mono, tra ve JSON
+        GET /health                            trang thai va thong tin mo hinh
+        GET /metrics                           so lieu dang van ban Prometheus (xem `instrumentation`)
+    """
+    def __init__(self, detector, n_workers=None, max_batch_size=32, max_wait=0.005, max_body_size=50 * 1024 * 1024):
+        self.detector = detector
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_body_size = max_body_size
+        self.started = time()
+        self.pool = None
+        self.batcher = None
+
+    async def start(self, host="127.0.0.1", port=8000):
+        self.pool = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker, initargs=(instrumentation.is_enabled(),))
+        # mô hình đào tạo với `reducer` nhận đặc trưng đã giảm chiều (bước giảm chiều của EmotionRecognizer hoặc NumpyRecognizer)
+        self.batcher = MicroBatcher(self.detector.model, self.detector.classification, self.max_batch_size, self.max_wait,
+                                    reduce=self.detector._reduce)
+        self.batcher.start()
+        await self.warmup()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def warmup(self):
+        "Mỗi tiến trình trích xuất một giây nhiễu nhỏ để lần biên dịch của librosa không rơi vào yêu cầu đầu tiên"
+        # nhiễu thay vì im lặng để chroma không cảnh báo phổ rỗng
+        noise = (np.random.default_rng(0).standard_normal(TARGET_SAMPLE_RATE) * 100).astype(np.int16).tobytes()
+        results = await asyncio.gather(*[ self.extract(noise, "pcm", TARGET_SAMPLE_RATE) for _ in range(self.n_workers) ])
+        await self.batcher.predict(results[0])
+        instrumentation.reset()
+
+    async def extract(self, body, audio_format, rate):
+        loop = asyncio.get_running_loop()
+        feature, metrics = await loop.run_in_executor(self.pool, extract_request_features, body, audio_format, rate, self.detector.audio_config)
+        instrumentation.merge(metrics)
+        return feature
+
+    async def predict(self, body, query):
+        audio_format = query.get("format", ["file"])[0]
+        rate = int(query.get("rate", [TARGET_SAMPLE_RATE])[0])
+        start = perf_counter()
+        with instrumentation.span("server.extract"):
+            feature = await self.extract(body, audio_format, rate)
+        emotion, probabilities = await self.batcher.predict(feature)
+        return {"emotion": emotion, "probabilities": probabilities, "latency_ms": (perf_counter() - start) * 1000}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "model": get_model_name(self.detector.model),
+            "emotions": list(self.detector.emotions),
+            "classification": self.detector.classification,
+            "workers": self.n_workers,
+            "uptime_s": time() - self.started,
+        }
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/predict":
+            if method != "POST":
+                return 405, {"error": "Chỉ chấp nhận POST"}
+            try:
+                return 200, await self.predict(body, parse_qs(url.query))
+            except (ValueError, RuntimeError) as e:
+                # soundfile không đọc được nội dung hoặc tham số sai
+                instrumentation.increment("server_bad_requests")
+                return 400, {"error": f"Không đọc được âm thanh: {e}"}
+        if url.path == "/health":
+            return 200, self.health()
+        if url.path == "/metrics":
+            return 200, instrumentation.to_prometheus()
+        return 404, {"error": "Không tìm thấy"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Yêu cầu không hợp lệ"}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # không đọc được phần thân nên không giữ kết nối
+                    await self.respond(writer, 400, {"error": "Content-Length không hợp lệ"}, keep_alive=False)
+                    return
+                if length > self.max_body_size:
+                    await self.respond(writer, 413, {"error": "Tệp âm thanh quá lớn"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                instrumentation.increment("server_requests")
+                with instrumentation.span("server.request"):
+                    try:
+                        status, payload = await self.route(method, target, body)
+                    except Exception as e:
+                        status, payload = 500, {"error": str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        if isinstance(payload, str):
+            content, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            content, content_type = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"), "application/json; charset=utf-8"
+        head = (f"HTTP/1.1 {status} {STATUS_REASONS[status]}\r\nContent-Type: {content_type}\r\nContent-Length: {len(content)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + content)
+        await writer.drain()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.batcher is not None:
+            self.batcher.task.cancel()
+            self.batcher.executor.shutdown()
+
+
+async def serve(model_path, host="127.0.0.1", port=8000, n_workers=None, max_batch_size=32, max_wait=0.005):
+    detector = load_predictor(model_path)
+    server = EmotionServer(detector, n_workers=n_workers, max_batch_size=max_batch_size, max_wait=max_wait)
+    try:
+        http_server = await server.start(host, port)
+        print(f"Đang phục vụ {get_model_name(detector.model)} tại http://{host}:{port} ({server.n_workers} tiến trình trích xuất)")
+        async with http_server:
+            await http_server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="May chu HTTP du doan cam xuc tu mo hinh da luu bang EmotionRecognizer.save()")
+    parser.add_argument("model_path", nargs="?", help="tep mo hinh da luu (.pickle) hoac da xuat (.npz)", default="models/svc.pickle")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-j", "--workers", type=int, help="so tien trinh trich xuat dac trung, mac dinh la so nhan CPU", default=None)
+    parser.add_argument("--max-batch-size", type=int, help="so yeu cau toi da trong mot lan goi mo hinh", default=32)
+    parser.add_argument("--max-wait-ms", type=float, help="thoi gian toi da (ms) yeu cau dau tien cho gom lo", default=5.0)
+    parser.add_argument("--no-metrics", action="store_true", help="tat do dac (/metrics se trong)")
+    args = parser.parse_args()
+
+    if not args.no_metrics:
+        instrumentation.enable()
+    try:
+        asyncio.run(serve(args.model_path, args.host, args.port, args.workers, args.max_batch_size, args.max_wait_ms / 1000))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,149 @@
+import numpy as np
+import wave
+from time import perf_counter
+
+import instrumentation
+from utils import extract_feature_from_array
+from pcm import from_bytes, to_float
+
+
+class RingBuffer:
+    """
+    Bo dem vong cho mau PCM int16, chi giu `capacity` mau moi nhat
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.int16)
+        # vị trí ghi tiếp theo và số mẫu hợp lệ trong bộ đệm
+        self.position = 0
+        self.size = 0
+
+    def extend(self, samples):
+        n = len(samples)
+        if n >= self.capacity:
+            self.data[:] = samples[n - self.capacity:]
+            self.position = 0
+            self.size = self.capacity
+            return
+        first = min(n, self.capacity - self.position)
+        self.data[self.position:self.position + first] = samples[:first]
+        # phần còn lại quay vòng về đầu bộ đệm
+        self.data[:n - first] = samples[first:]
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def get(self):
+        # trả về các mẫu theo đúng thứ tự thời gian
+        if self.size < self.capacity:
+            return self.data[:self.size]
+        return np.concatenate((self.data[self.position:], self.data[:self.position]))
+
+
+class WaveStream:
+    """
+    Thay the cho luong pyaudio bang tep wav (16 bit, mono), dung de kiem tra che do streaming khong can micro
+        `for update in StreamingRecognizer(detector).run(WaveStream("test.wav")): ...`
+    """
+    def __init__(self, path):
+        self.wave_file = wave.open(path, "rb")
+        if self.wave_file.getsampwidth() != 2 or self.wave_file.getnchannels() != 1:
+            raise TypeError("Chỉ hỗ trợ tệp wav 16 bit, kênh đơn âm (mono)")
+        self.rate = self.wave_file.getframerate()
+
+    def read(self, num_frames, **kwargs):
+        return self.wave_file.readframes(num_frames)
+
+    def close(self):
+        self.wave_file.close()
+
+
+class StreamingRecognizer:
+    """
+    Nhan dien cam xuc lien tuc tren cua so truot cua luong am thanh, khong ghi ra tep
+        `for update in StreamingRecognizer(detector, window=2, hop=0.25).run(stream): print(update["emotion"])`
+    Moi `hop` giay am thanh moi se tinh dac trung tren `window` giay gan nhat va dua ra mot ket qua
+    """
+    def __init__(self, detector, window=2.0, hop=0.25, rate=16000):
+        self.detector = detector
+        self.window = window
+        self.hop = hop
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """
+        Dat tan so lay mau cua luong (cua so, buoc truot va trich xuat dac trung tinh theo tan so nay), xoa bo dem
+        """
+        self.rate = rate
+        self.window_size = int(self.window * rate)
+        self.hop_size = int(self.hop * rate)
+        self.buffer = RingBuffer(self.window_size)
+        # số mẫu mới từ lần cập nhật trước và tổng số mẫu đã nhận
+        self.pending = 0
+        self.n_samples = 0
+
+    def predict_window(self):
+        """
+        Du doan cam xuc tren cua so hien tai, tra ve (cam xuc, {cam xuc: xac suat} hoac None)
+        """
+        X = to_float(self.buffer.get())
+        feature = extract_feature_from_array(X, self.rate, **self.detector.audio_config).reshape(1, -1)
+        # mô hình đào tạo với `reducer` nhận đặc trưng đã giảm chiều
+        feature = self.detector._reduce(feature)
+        model = self.detector.model
+        # nhãn lấy từ predict như `predict()` / `predict_timeline` (với SVC có thể khác xác suất lớn nhất)
+        with instrumentation.span("model.predict"):
+            emotion = model.predict(feature)[0]
+        if self.detector.classification and hasattr(model, "predict_proba"):
+            with instrumentation.span("model.predict_proba"):
+                proba = model.predict_proba(feature)[0]
+            return emotion, dict(zip(model.classes_, proba))
+        return emotion, None
+
+    def warmup(self):
+        """
+        Du doan thu tren cua so im lang de lan du doan dau tien khong bi cham (librosa bien dich khi goi lan dau)
+        """
+        buffer, self.buffer = self.buffer, RingBuffer(self.window_size)
+        self.buffer.extend(np.zeros(self.window_size, dtype=np.int16))
+        self.predict_window()
+        self.buffer = buffer
+
+    def feed(self, pcm):
+        """
+        Dua them du lieu PCM int16 (bytes tu pyaudio hoac mang numpy), tra ve ket qua moi hoac None
+        """
+        if isinstance(pcm, (bytes, bytearray)):
+            pcm = from_bytes(pcm)
+        self.buffer.extend(pcm)
+        self.pending += len(pcm)
+        self.n_samples += len(pcm)
+        # chờ đủ một cửa sổ và đủ `hop` mẫu mới, các bước bị lỡ sẽ bỏ qua để không bị trễ dần
+        if self.buffer.size < self.window_size or self.pending < self.hop_size:
+            return None
+        self.pending = 0
+        start = perf_counter()
+        emotion, probabilities = self.predict_window()
+        return {
+            "start": (self.n_samples - self.window_size) / self.rate,
+            "end": self.n_samples / self.rate,
+            "emotion": emotion,
+            "probabilities": probabilities,
+            "latency": perf_counter() - start,
+        }
+
+    def run(self, stream, chunk_size=1024):
+        """
+        Doc lien tuc tu `stream` (pyaudio hoac `WaveStream`) va tra ve lan luot tung ket qua
+        Luong co thuoc tinh `rate` (`WaveStream`) thi dac trung duoc trich xuat theo tan so do
+        """
+        rate = getattr(stream, "rate", None)
+        if rate and rate != self.rate:
+            self.set_rate(rate)
+        while True:
+            # bỏ qua lỗi tràn bộ đệm của pyaudio khi dự đoán chậm hơn tốc độ ghi
+            pcm = stream.read(chunk_size, exception_on_overflow=False)
+            if not pcm:
+                return
+            update = self.feed(pcm)
+            if update is not None:
+                yield update
@@ -1,14 +1,21 @@
-from emotion_recognition import EmotionRecognizer
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.neural_network import MLPClassifier
-import warnings
-warnings.filterwarnings("ignore", category=DeprecationWarning)
-
-cl_model = SVC()
-
-fi = EmotionRecognizer(model=cl_model, emotions=['sad', 'neutral', 'happy'], balance=True, verbose=0)
-
-fi.train()
-
+from emotion_recognition import EmotionRecognizer
+import warnings
+import os
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+# mô hình đã đào tạo được lưu lại, các lần chạy sau chỉ cần tải lên
+model_path = "models/svc.pickle"
+
+if os.path.isfile(model_path):
+    fi = EmotionRecognizer.load(model_path, verbose=0)
+else:
+    # sklearn chỉ cần khi phải đào tạo
+    from sklearn.svm import SVC
+    cl_model = SVC()
+
+    fi = EmotionRecognizer(model=cl_model, emotions=['sad', 'neutral', 'happy'], balance=True, verbose=0)
+
+    fi.train()
+    fi.save(model_path)
+
 print("Dự đoán:", fi.predict("ACuoi.wav"))
\ No newline at end of file
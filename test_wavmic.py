@@ -2,14 +2,12 @@ from emotion_recognition import EmotionRecognizer
 
 import pyaudio
 import os
-import wave
-from sys import byteorder
-from array import array
-from struct import pack
 from sklearn.svm import SVC
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 from utils import get_best_estimators
+from streaming import StreamingRecognizer
+from pcm import from_bytes, is_silent, normalize, trim, add_silence, write_wav
 
 THRESHOLD = 500
 CHUNK_SIZE = 1024
@@ -18,51 +16,6 @@ RATE = 16000
 
 SILENCE = 30
 
-def is_silent(snd_data):
-    "Trả về 'True' nếu dưới ngưỡng 'silent'"
-    return max(snd_data) < THRESHOLD
-
-def normalize(snd_data):
-    "Âm lượng âm thanh đầu ra"
-    MAXIMUM = 16385
-    times = float(MAXIMUM)/max(abs(i) for i in snd_data)
-
-    r = array('h')
-    for i in snd_data:
-        r.append(int(i*times))
-    return r
-
-def trim(snd_data):
-    "Cắt bớt âm thanh ở đầu và cuối"
-    def _trim(snd_data):
-        snd_started = False
-        r = array('h')
-
-        for i in snd_data:
-            if not snd_started and abs(i)>THRESHOLD:
-                snd_started = True
-                r.append(i)
-
-            elif snd_started:
-                r.append(i)
-        return r
-
-    # Cắt bên trái
-    snd_data = _trim(snd_data)
-
-    # Cắt bên phải
-    snd_data.reverse()
-    snd_data = _trim(snd_data)
-    snd_data.reverse()
-    return snd_data
-
-def add_silence(snd_data, seconds):
-    "Thêm khoảng trống vào đầu và cuối 'snd_data' theo giây dạng (float)"
-    r = array('h', [0 for i in range(int(seconds*RATE))])
-    r.extend(snd_data)
-    r.extend([0 for i in range(int(seconds*RATE))])
-    return r
-
 def record():
     """Ghi âm 1 từ hoặc nhiều từ từ micro và trả về dữ liệu dưới dạng mảng âm ngắn được đánh dấu.
     Chuẩn hóa (Normalize) âm thanh, cắt bớt khoảng trống ở đầu và cuối, các phần đệm có 0,5 giây của âm trống đảm bảo VLC có thể phát mà không cần cắt nhỏ."""
@@ -74,16 +27,14 @@ def record():
     num_silent = 0
     snd_started = False
 
-    r = array('h')
+    chunks = []
 
     while 1:
         # độ bền nhỏ, âm ngắn được đánh dấu
-        snd_data = array('h', stream.read(CHUNK_SIZE))
-        if byteorder == 'big':
-            snd_data.byteswap()
-        r.extend(snd_data)
+        chunk = stream.read(CHUNK_SIZE)
+        chunks.append(chunk)
 
-        silent = is_silent(snd_data)
+        silent = is_silent(from_bytes(chunk), THRESHOLD)
 
         if silent and snd_started:
             num_silent += 1
@@ -98,22 +49,35 @@ def record():
     stream.close()
     p.terminate()
 
+    # ghép một lần thay vì nối từng đoạn
+    r = from_bytes(b"".join(chunks))
     r = normalize(r)
-    r = trim(r)
-    r = add_silence(r, 0.5)
+    r = trim(r, THRESHOLD)
+    r = add_silence(r, 0.5, RATE)
     return sample_width, r
 
 def record_to_file(path):
     "Ghi âm từ micro và đưa ra dữ liệu kết quả từ 'path'"
     sample_width, data = record()
-    data = pack('<' + ('h'*len(data)), *data)
+    write_wav(path, data, sample_width, RATE)
 
-    wf = wave.open(path, 'wb')
-    wf.setnchannels(1)
-    wf.setsampwidth(sample_width)
-    wf.setframerate(RATE)
-    wf.writeframes(data)
-    wf.close()
+
+def stream_predictions(detector, window=2.0, hop=0.25):
+    "Dự đoán cảm xúc liên tục từ micro trên cửa sổ trượt, không ghi ra tệp"
+    recognizer = StreamingRecognizer(detector, window=window, hop=hop, rate=RATE)
+    recognizer.warmup()
+    p = pyaudio.PyAudio()
+    stream = p.open(format=FORMAT, channels=1, rate=RATE,
+        input=True, frames_per_buffer=CHUNK_SIZE)
+    try:
+        for update in recognizer.run(stream, CHUNK_SIZE):
+            print("[{:.2f}s - {:.2f}s] {} ({:.0f} ms)".format(update["start"], update["end"], update["emotion"], update["latency"]*1000))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
 
 
 def get_estimators_name(estimators):
@@ -130,19 +94,33 @@ if __name__ == "__main__":
     parser.add_argument("-e", "--emotions", help="""Cam xuc de nhan dien duoc cach nhau bang dau phay ',', cam xuc de nhan dien la "sad" , "neutral", "happy" , mac dinh la "sad,neutral,happy"
 """, default="sad,neutral,happy")
     parser.add_argument("-m", "--model", help="""Mo hinh duoc dung, 3 mo hinh duoc su dung la: {}, mac dinh la "SVC" """.format(estimators_str),default="SVC")
+    parser.add_argument("-s", "--stream", action="store_true", help="""Du doan lien tuc tren cua so truot thay vi ghi am mot lan, Ctrl+C de dung""")
+    parser.add_argument("--window", type=float, help="""Do dai cua so (giay) khi dung --stream, mac dinh la 2""", default=2.0)
+    parser.add_argument("--hop", type=float, help="""Buoc truot (giay) giua hai lan du doan khi dung --stream, mac dinh la 0.25""", default=0.25)
+    parser.add_argument("-p", "--model-path", help="""Tep mo hinh da luu bang EmotionRecognizer.save(), neu da co thi tai len thay vi dao tao lai, neu chua co thi dao tao va luu vao day""", default=None)
 
 
     # Phân tích các đối số được thông qua
     args = parser.parse_args()
 
     features = ["mfcc", "chroma", "mel"]
-    detector = EmotionRecognizer(estimator_dict[args.model], emotions=args.emotions.split(","), features=features, verbose=0)
-    detector.train()
-    print("Độ chính xác khi kiểm tra dữ liệu: {:.3f}%".format(detector.test_score()*100))
+    if args.model_path and os.path.isfile(args.model_path):
+        # đã có mô hình được lưu, không cần đào tạo lại
+        detector = EmotionRecognizer.load(args.model_path, verbose=0)
+    else:
+        detector = EmotionRecognizer(estimator_dict[args.model], emotions=args.emotions.split(","), features=features, verbose=0)
+        detector.train()
+        print("Độ chính xác khi kiểm tra dữ liệu: {:.3f}%".format(detector.test_score()*100))
+        if args.model_path:
+            detector.save(args.model_path)
+    if args.stream:
+        print("Hãy nói vào mic, Ctrl+C để dừng")
+        stream_predictions(detector, window=args.window, hop=args.hop)
+        exit()
     print("Hãy nói vào mic")
     
-    filename = "test.wav"
-    record_to_file(filename)
-    result = detector.predict(filename)
+    # dự đoán ngay trên dữ liệu PCM đã ghi, không cần ghi ra tệp rồi đọc lại
+    sample_width, data = record()
+    result = detector.predict(data, sample_rate=RATE)
     print(result)
     
\ No newline at end of file
@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from audio_store import AudioStore
+
+
+@pytest.mark.parametrize("n_jobs", [None, -2, 2])
+def test_add_many_n_jobs(dataset, n_jobs):
+    paths = sorted(os.path.join("data", "train-custom", name) for name in os.listdir(os.path.join("data", "train-custom")))[:4]
+    store = AudioStore("features/audio")
+    assert store.add_many(paths, n_jobs=n_jobs, chunksize=2) == 4
+    assert all(len(store.get_float(path)) for path in paths)
+    assert store.add_many(paths, n_jobs=n_jobs) == 0
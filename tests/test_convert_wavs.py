@@ -0,0 +1,17 @@
+import instrumentation
+from convert_wavs import convert_audio
+
+
+def test_ffmpeg_counter_only_counts_ffmpeg_runs(tmp_path):
+    # soundfile không đọc được, ffmpeg bị tắt nên không có lần chạy ffmpeg nào
+    source = tmp_path / "broken.wav"
+    source.write_bytes(b"not audio")
+    instrumentation.enable()
+    try:
+        instrumentation.reset()
+        assert convert_audio(str(source), str(tmp_path / "16k.wav"), ffmpeg=False) == 1
+        counters = instrumentation.collect()["counters"]
+    finally:
+        instrumentation.disable()
+    assert counters.get("convert_errors") == 1
+    assert "files_converted_ffmpeg" not in counters
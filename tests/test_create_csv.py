@@ -0,0 +1,29 @@
+import os
+import shutil
+
+import pandas as pd
+
+from conftest import add_files
+from create_csv import write_custom_csv
+
+
+def test_empty_partition_gets_header_only_csv(dataset, capsys):
+    shutil.rmtree(os.path.join("data", "test-custom"))
+    os.makedirs(os.path.join("data", "test-custom"))
+    write_custom_csv(verbose=0, force=False)
+    assert len(pd.read_csv("train_custom.csv")) == 18
+    test = pd.read_csv("test_custom.csv")
+    assert len(test) == 0 and {"path", "emotion"} <= set(test.columns)
+    # không có gì thay đổi: dùng lại CSV
+    write_custom_csv(verbose=1, force=False)
+    assert "không thay đổi" in capsys.readouterr().out
+
+
+def test_csv_names_sharing_a_data_folder(dataset):
+    write_custom_csv(train_name="a_train.csv", test_name="a_test.csv", verbose=0, force=False)
+    add_files("train-custom", {"sad": 1}, start=100)
+    write_custom_csv(train_name="b_train.csv", test_name="b_test.csv", verbose=0, force=False)
+    assert len(pd.read_csv("b_train.csv")) == 19
+    # a_train.csv được ghi trước khi thêm tệp nên phải được ghi lại
+    write_custom_csv(train_name="a_train.csv", test_name="a_test.csv", verbose=0, force=False)
+    assert len(pd.read_csv("a_train.csv")) == 19
@@ -0,0 +1,21 @@
+import os
+
+import numpy as np
+
+from conftest import add_files
+from feature_store import FeatureStore
+
+
+def test_old_partition_matrices_are_removed(dataset):
+    store = FeatureStore("features", verbose=0)
+    paths = sorted(os.path.join("data", "train-custom", name) for name in os.listdir(os.path.join("data", "train-custom")))
+    first = store.load_features(paths, "train")
+    store.load_features(paths[:3], "test")
+    paths += add_files("train-custom", {"happy": 2}, start=100)
+    second = store.load_features(paths, "train")
+    assert np.array_equal(second[:len(first)], first)
+    names = sorted(os.listdir(store.folder))
+    assert [ name.split("_")[0] for name in names if name.endswith(".npy") ] == ["test", "train"]
+    assert not [ name for name in names if name.endswith(".tmp") ]
+    # ma trận còn lại được dùng lại
+    assert np.array_equal(store.load_features(paths, "train"), second)
@@ -0,0 +1,52 @@
+import pytest
+from sklearn.linear_model import SGDClassifier
+
+from conftest import add_files, make_recognizer
+
+
+def test_partial_train_from_scratch(dataset):
+    rec = make_recognizer(SGDClassifier(random_state=0))
+    assert rec.partial_train(batch_size=8, verbose=0) == 18
+    assert rec.reducer.n_samples_seen_ == 18
+    add_files("train-custom", {"sad": 2, "neutral": 2, "happy": 2}, start=100)
+    assert rec.partial_train(batch_size=8, verbose=0) == 6
+    assert rec.partial_train(verbose=0) == 0
+
+
+def test_partial_train_does_not_add_scaler_to_trained_model(dataset):
+    rec = make_recognizer(SGDClassifier(random_state=0))
+    rec.train(verbose=0)
+    add_files("train-custom", {"sad": 2, "neutral": 2, "happy": 2}, start=100)
+    with pytest.raises(TypeError):
+        rec.partial_train(verbose=0)
+    assert rec.reducer is None
+
+
+def test_partial_train_after_train_with_scaler(dataset):
+    rec = make_recognizer(SGDClassifier(random_state=0), reducer="scaler")
+    rec.train(verbose=0)
+    add_files("train-custom", {"sad": 2, "neutral": 2, "happy": 2}, start=100)
+    assert rec.partial_train(verbose=0) == 6
+    assert rec.reducer.n_samples_seen_ == 24
+    assert rec.test_score() == 1.0
+
+
+def test_load_then_partial_train(dataset):
+    from emotion_recognition import EmotionRecognizer
+    rec = make_recognizer(SGDClassifier(random_state=0))
+    rec.partial_train(checkpoint="models/sgd.pickle", verbose=0)
+    loaded = EmotionRecognizer.load("models/sgd.pickle", verbose=0)
+    assert loaded.n_components == rec.n_components
+    assert loaded.trained_files == rec.trained_files
+    add_files("train-custom", {"sad": 2, "neutral": 2, "happy": 2}, start=100)
+    assert loaded.partial_train(checkpoint="models/sgd.pickle", verbose=0) == 6
+    assert len(EmotionRecognizer.load("models/sgd.pickle", verbose=0).trained_files) == 24
+
+
+def test_train_records_files_dropped_by_balancing(dataset):
+    add_files("train-custom", {"happy": 3}, start=100)
+    rec = make_recognizer(SGDClassifier(random_state=0), reducer="scaler", balance="undersample")
+    rec.train(verbose=0)
+    assert len(rec.X_train) == 18
+    assert len(rec.trained_files) == 21
+    assert rec.partial_train(verbose=0) == 0
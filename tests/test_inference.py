@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sklearn.svm import SVC
+
+from conftest import make_recognizer
+
+INFERENCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inference.py")
+
+
+@pytest.mark.parametrize("probability, export", [(False, False), (False, True), (True, False), (True, True)])
+def test_inference_proba(dataset, probability, export):
+    rec = make_recognizer(SVC(probability=probability))
+    rec.train(verbose=0)
+    model_path = "models/svc.npz" if export else "models/svc.pickle"
+    rec.export(model_path) if export else rec.save(model_path)
+    audio_path = os.path.join("data", "test-custom", sorted(os.listdir(os.path.join("data", "test-custom")))[0])
+    output = subprocess.run([sys.executable, INFERENCE, model_path, audio_path, "--proba", "--json"], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+    assert result["emotion"] == rec.predict(audio_path)
+    assert ("probabilities" in result) == probability
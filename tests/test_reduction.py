@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+import numpy_engine
+
+from conftest import make_recognizer
+from reduction import make_reducer
+
+
+@pytest.mark.parametrize("search", ["grid", "random"])
+def test_grid_search_refits_reducer_per_fold(dataset, search):
+    rec = make_recognizer(KNeighborsClassifier(), reducer="select", n_components=5)
+    # nhãn ngẫu nhiên trên nhiễu: chọn đặc trưng bằng nhãn của cả các fold kiểm tra sẽ cho điểm CV cao hơn hẳn ngẫu nhiên
+    rng = np.random.default_rng(0)
+    X, y = rng.standard_normal((90, 2000)).astype(np.float32), rng.choice(rec.emotions, 90)
+    rec.reducer = make_reducer("select", 5).fit(X, y)
+    rec.X_train_raw, rec.X_train, rec.y_train = X, rec._reduce(X), y
+    rec.data_loaded = True
+    best_estimator, best_params, best_score = rec.grid_search({"n_neighbors": [3, 5]}, n_jobs=1, verbose=0, search=search, n_candidates=2)
+    assert best_score < 0.45
+    assert set(best_params) == {"n_neighbors"}
+    assert best_estimator.n_features_in_ == 5
+
+
+@pytest.mark.parametrize("with_mean, with_std", [(True, True), (False, True), (True, False), (False, False)])
+def test_exported_scaler_matches_transform(with_mean, with_std):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((50, 8)) * 3 + 5
+    scaler = StandardScaler(with_mean=with_mean, with_std=with_std).fit(X)
+    steps, arrays = numpy_engine.export_reducer(scaler)
+    assert np.allclose(numpy_engine.apply_reducer(X, steps, arrays), scaler.transform(X))
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+import sklearn
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+
+from search import budgeted_search, evaluate_estimators
+
+
+def count_trials(path):
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f)
+
+
+def macro_f1(y_true, y_pred):
+    return f1_score(y_true, y_pred, average="macro")
+
+
+def test_checkpoint_key_covers_seed_metric_and_cv(tmp_path):
+    rng = np.random.default_rng(0)
+    X, y = rng.standard_normal((90, 4)), np.repeat(["sad", "neutral", "happy"], 30)
+    checkpoint = str(tmp_path / "trials.jsonl")
+    params = {"n_neighbors": [1, 3, 5]}
+
+    def search(metric=accuracy_score, **kwargs):
+        budgeted_search(KNeighborsClassifier(), params, X, y, metric, search="random", n_candidates=3, checkpoint=checkpoint, verbose=0, **kwargs)
+
+    search(random_state=0)
+    n_trials = count_trials(checkpoint)
+    # cùng thiết lập: dùng lại kết quả
+    search(random_state=0)
+    assert count_trials(checkpoint) == n_trials
+    for kwargs in ({"random_state": 1}, {"random_state": 0, "metric": macro_f1},
+                   {"random_state": 0, "cv": StratifiedKFold(3, shuffle=True, random_state=0)}):
+        search(**kwargs)
+        assert count_trials(checkpoint) > n_trials
+        n_trials = count_trials(checkpoint)
+
+
+@pytest.mark.parametrize("n_jobs", [None, -2, 2])
+def test_budgeted_search_n_jobs(n_jobs):
+    rng = np.random.default_rng(0)
+    X, y = rng.standard_normal((60, 4)), np.repeat(["sad", "neutral", "happy"], 20)
+    best_estimator, best_params, best_score = budgeted_search(KNeighborsClassifier(), {"n_neighbors": [1, 3]}, X, y, accuracy_score,
+                                                              search="random", n_candidates=2, n_jobs=n_jobs, verbose=0)
+    assert best_params["n_neighbors"] in (1, 3)
+
+
+def test_model_cache_is_pruned(tmp_path):
+    cache_folder = str(tmp_path / "cache")
+    os.makedirs(cache_folder)
+    # mô hình của phiên bản sklearn khác và của định dạng tên cũ
+    for name in ("0.0.0_aaaa_bbbb.pickle", "0123456789abcdef.pickle"):
+        (tmp_path / "cache" / name).write_bytes(b"")
+    rng = np.random.default_rng(0)
+    y = np.repeat(["sad", "neutral", "happy"], 10)
+    estimators = [ KNeighborsClassifier(1), KNeighborsClassifier(3) ]
+    for seed in (0, 1):
+        X = rng.standard_normal((30, 4))
+        evaluate_estimators(estimators, X, y, X, y, accuracy_score, cache_folder=cache_folder, verbose=0)
+        names = os.listdir(cache_folder)
+        assert len(names) == 2 and all(name.startswith(f"{sklearn.__version__}_") for name in names)
+    # cùng dữ liệu: dùng lại mô hình đã lưu
+    results = evaluate_estimators(estimators, X, y, X, y, accuracy_score, cache_folder=cache_folder, verbose=0)
+    assert sorted(os.listdir(cache_folder)) == sorted(names) and len(results) == 2
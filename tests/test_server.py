@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from sklearn.svm import SVC
+
+import numpy_engine
+from conftest import make_recognizer, write_wav
+from load_test import make_tone, request
+from server import EmotionServer, extract_request_features
+
+
+async def predict_once(detector, body=None, target="/predict?format=pcm&rate=16000"):
+    server = EmotionServer(detector, n_workers=1)
+    try:
+        # warmup trong `start()` cũng đi qua mô hình
+        http_server = await server.start("127.0.0.1", 0)
+        port = http_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, body = await request(reader, writer, "127.0.0.1", target, make_tone(1.0).tobytes() if body is None else body)
+        writer.close()
+        http_server.close()
+        return status, json.loads(body)
+    finally:
+        server.close()
+
+
+@pytest.mark.parametrize("export", [False, True])
+def test_server_with_reducer(dataset, export):
+    detector = make_recognizer(SVC(probability=True), reducer="pca", n_components=5)
+    detector.train(verbose=0)
+    if export:
+        detector.export("models/svc.npz")
+        detector = numpy_engine.load_recognizer("models/svc.npz")
+    status, result = asyncio.run(predict_once(detector))
+    assert status == 200, result
+    assert result["emotion"] in detector.emotions
+    assert np.isclose(sum(result["probabilities"].values()), 1.0)
+
+
+def test_server_label_matches_predict(dataset):
+    detector = make_recognizer(SVC(probability=True))
+    detector.train(verbose=0)
+    for i, emotion in enumerate(detector.emotions):
+        path = f"data/request_{emotion}.wav"
+        write_wav(path, emotion, seed=i)
+        with open(path, "rb") as f:
+            status, result = asyncio.run(predict_once(detector, f.read(), "/predict"))
+        assert status == 200, result
+        assert result["emotion"] == detector.predict(path)
+
+
+def test_server_extracts_at_native_rate(dataset):
+    detector = make_recognizer(SVC())
+    detector.train(verbose=0)
+    path = "data/request_44k.wav"
+    write_wav(path, "happy", seed=3, rate=44100)
+    with open(path, "rb") as f:
+        body = f.read()
+    feature, metrics = extract_request_features(body, "file", None, detector.audio_config)
+    assert np.allclose(feature, detector._extract_feature(path)[0], atol=1e-4)
+
+
+async def send_raw(head):
+    server = EmotionServer(make_recognizer(SVC()), n_workers=1, max_body_size=1000)
+    http_server = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+    try:
+        port = http_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head)
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        return int(status_line.split()[1])
+    finally:
+        http_server.close()
+
+
+@pytest.mark.parametrize("length, status", [("abc", 400), ("-5", 400), ("1001", 413)])
+def test_server_rejects_bad_content_length(dataset, length, status):
+    head = f"POST /predict HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n".encode("latin-1")
+    assert asyncio.run(send_raw(head)) == status
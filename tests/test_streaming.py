@@ -0,0 +1,37 @@
+import os
+
+import pytest
+from sklearn.svm import SVC
+
+import numpy_engine
+from conftest import make_recognizer, write_wav
+from streaming import StreamingRecognizer, WaveStream
+
+
+@pytest.mark.parametrize("export", [False, True])
+def test_streaming_with_reducer(dataset, export):
+    detector = make_recognizer(SVC(probability=True), reducer="pca", n_components=5)
+    detector.train(verbose=0)
+    if export:
+        detector.export("models/svc.npz")
+        detector = numpy_engine.load_recognizer("models/svc.npz")
+    path = os.path.join("data", "stream_happy.wav")
+    write_wav(path, "happy", seed=0, duration=1.0)
+    updates = list(StreamingRecognizer(detector, window=0.5, hop=0.25).run(WaveStream(path)))
+    assert updates
+    for update in updates:
+        assert update["emotion"] in detector.emotions
+        assert set(update["probabilities"]) == set(detector.emotions)
+
+
+def test_streaming_uses_stream_rate_and_predict_label(dataset):
+    detector = make_recognizer(SVC(probability=True))
+    detector.train(verbose=0)
+    path = os.path.join("data", "stream_22k_sad.wav")
+    write_wav(path, "sad", seed=1, rate=22050, duration=1.0)
+    recognizer = StreamingRecognizer(detector, window=1.0, hop=0.25)
+    updates = list(recognizer.run(WaveStream(path)))
+    assert recognizer.rate == 22050
+    # một cửa sổ phủ toàn bộ tệp: cùng kết quả với predict() trên tệp
+    assert len(updates) == 1 and updates[0]["end"] == 1.0
+    assert updates[0]["emotion"] == detector.predict(path)
@@ -1,9 +1,14 @@
 import soundfile
-import librosa
 import numpy as np
 import pickle
+import io
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from convert_wavs import convert_audio
+from pcm import from_bytes, to_float
+import instrumentation
 
 
 AVAILABLE_EMOTIONS = {
@@ -18,6 +23,13 @@ AVAILABLE_EMOTIONS = {
     "boredom"
 }
 
+# nhãn số dùng cho hồi quy, chỉ hỗ trợ 3 cảm xúc
+REGRESSION_CATEGORIES = {'sad': 1, 'neutral': 2, 'happy': 3}
+
+# kiểu số thực dùng để đọc âm thanh, tính phổ và lưu đặc trưng (khóa "dtype" của audio_config)
+DEFAULT_DTYPE = "float32"
+AVAILABLE_DTYPES = {"float32", "float64"}
+
 
 def get_label(audio_config):
     """
@@ -32,6 +44,16 @@ def get_label(audio_config):
     return label.rstrip("-")
 
 
+def get_dtype(audio_config):
+    """
+    Kieu so thuc cua audio_config (khoa "dtype", mac dinh DEFAULT_DTYPE) duoi dang ten, vi du 'float32'
+    """
+    dtype = np.dtype(audio_config.get("dtype", DEFAULT_DTYPE)).name
+    if dtype not in AVAILABLE_DTYPES:
+        raise TypeError(f"Kiểu dữ liệu: {dtype} không được chấp nhận, chỉ chấp nhận {AVAILABLE_DTYPES}")
+    return dtype
+
+
 def get_dropout_str(dropout, n_layers=3):
     if isinstance(dropout, list):
         return "_".join([ str(d) for d in dropout])
@@ -43,46 +65,181 @@ def get_first_letters(emotions):
     return "".join(sorted([ e[0].upper() for e in emotions ]))
 
 
-def extract_feature(file_name, **kwargs):
+def _convert_unreadable(file_name):
+    # soundfile không đọc được thì chuyển đổi sang 16000Hz và mono (dùng ffmpeg), bỏ qua nếu tệp _0.wav đã có
+    # lấy tên mặc định
+    basename = os.path.basename(file_name)
+    dirname  = os.path.dirname(file_name)
+    name, ext = os.path.splitext(basename)
+    new_basename = f"{name}_0.wav"
+    new_filename = os.path.join(dirname, new_basename)
+    v = convert_audio(file_name, new_filename)
+    if v:
+        raise NotImplementedError("Chuyển đổi không đúng, nếu không được hãy tải ffmpeg và cài trên máy tính ở Path.")
+    return new_filename
+
+
+def get_readable_audio(file_name):
     """
-    Trich xuat dac diem tu tep am thanh `file_name`
-        `features = extract_feature(path, mel=True, mfcc=True)`
+    Tra ve duong dan soundfile doc duoc: chinh `file_name`, hoac ban chuyen doi `<ten>_0.wav` (16000Hz, mono)
     """
-    mfcc = kwargs.get("mfcc")
-    chroma = kwargs.get("chroma")
-    mel = kwargs.get("mel")
     try:
         with soundfile.SoundFile(file_name) as sound_file:
             pass
     except RuntimeError:
-        # không định dạng đúng thì chuyển đổi sang 16000Hz và mono dùng ffmpeg
-        # lấy tên mặc định
-        basename = os.path.basename(file_name)
-        dirname  = os.path.dirname(file_name)
-        name, ext = os.path.splitext(basename)
-        new_basename = f"{name}_0.wav"
-        new_filename = os.path.join(dirname, new_basename)
-        v = convert_audio(file_name, new_filename)
-        if v:
-            raise NotImplementedError("Chuyển đổi không đúng, nếu không được hãy tải ffmpeg và cài trên máy tính ở Path.")
+        return _convert_unreadable(file_name)
+    return file_name
+
+
+def _to_mono(X):
+    # (số mẫu, số kênh) -> (số mẫu,), kênh đơn chỉ lấy view không sao chép
+    if X.ndim == 2:
+        return X[:, 0] if X.shape[1] == 1 else X.mean(axis=1, dtype=X.dtype)
+    return X
+
+
+def read_audio(file_name, dtype=DEFAULT_DTYPE):
+    """
+    Doc tep am thanh (chi mo tep mot lan), tra ve (tin hieu mono, tan so lay mau)
+    Dinh dang soundfile khong doc duoc se duoc chuyen doi thanh `<ten>_0.wav` nhu `get_readable_audio`
+    """
+    try:
+        X, sample_rate = soundfile.read(file_name, dtype=dtype, always_2d=True)
+    except RuntimeError:
+        X, sample_rate = soundfile.read(_convert_unreadable(file_name), dtype=dtype, always_2d=True)
+    return _to_mono(X), sample_rate
+
+
+def decode_audio(data, sample_rate=None, dtype=DEFAULT_DTYPE):
+    """
+    Giai ma bytes trong bo nho, tra ve (tin hieu mono, tan so lay mau)
+        `sample_rate=None`: `data` la noi dung tep am thanh (wav, flac, ogg...) soundfile doc duoc
+        co `sample_rate`: `data` la PCM 16 bit little-endian mono (nhu pyaudio tra ve)
+    """
+    if sample_rate is None:
+        X, sample_rate = soundfile.read(io.BytesIO(data), dtype=dtype, always_2d=True)
+        return _to_mono(X), sample_rate
+    return to_float(from_bytes(data)).astype(dtype, copy=False), sample_rate
+
+
+def extract_feature(file_name, **kwargs):
+    """
+    Trich xuat dac diem tu tep am thanh `file_name`
+        `features = extract_feature(path, mel=True, mfcc=True, dtype="float32")`
+    """
+    with instrumentation.span("decode"):
+        X, sample_rate = read_audio(file_name, get_dtype(kwargs))
+    return extract_feature_from_array(X, sample_rate, **kwargs)
+
+
+def extract_feature_from_buffer(data, sample_rate=None, **kwargs):
+    """
+    Trich xuat dac diem tu am thanh trong bo nho, khong can ghi ra tep
+        bytes: noi dung tep am thanh, hoac PCM 16 bit neu co `sample_rate` (xem `decode_audio`)
+        mang numpy: PCM int16 hoac so thuc trong [-1, 1], (so mau,) hoac (so mau, so kenh), bat buoc co `sample_rate`
+        `features = extract_feature_from_buffer(pcm, 16000, mfcc=True, chroma=True, mel=True)`
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        with instrumentation.span("decode"):
+            X, sample_rate = decode_audio(data, sample_rate, get_dtype(kwargs))
     else:
-        new_filename = file_name
-    with soundfile.SoundFile(new_filename) as sound_file:
-        X = sound_file.read(dtype="float64")
-        sample_rate = sound_file.samplerate
-        if chroma:
-            stft = np.abs(librosa.stft(X))
-        result = np.array([])
-        if mfcc:
-            mfccs = np.mean(librosa.feature.mfcc(y=X, sr=sample_rate, n_mfcc=40).T, axis=0)
-            result = np.hstack((result, mfccs))
-        if chroma:
-            chroma = np.mean(librosa.feature.chroma_stft(S=stft, sr=sample_rate).T,axis=0)
-            result = np.hstack((result, chroma))
-        if mel:
-            mel = np.mean(librosa.feature.melspectrogram(X, sr=sample_rate).T,axis=0)
-            result = np.hstack((result, mel))
-    return result
+        if sample_rate is None:
+            raise TypeError("Cần truyền sample_rate khi dự đoán từ mảng numpy")
+        X = np.asarray(data)
+        if X.dtype == np.int16:
+            X = to_float(X)
+        X = _to_mono(X)
+    return extract_feature_from_array(X, sample_rate, **kwargs)
+
+
+def extract_feature_from_array(X, sample_rate, **kwargs):
+    """
+    Trich xuat dac diem tu tin hieu `X` (mang numpy) voi tan so lay mau `sample_rate`
+        `features = extract_feature_from_array(X, 16000, mel=True, mfcc=True)`
+    Pho nang luong chi duoc tinh mot lan bang STFT, mel, MFCC (tu log-mel) va chroma deu lay tu pho nay
+    Moi phep bien doi chay voi kieu `dtype` (mac dinh float32), ket qua cung co kieu nay
+    """
+    mfcc = kwargs.get("mfcc")
+    chroma = kwargs.get("chroma")
+    mel = kwargs.get("mel")
+    dtype = get_dtype(kwargs)
+    result = np.array([], dtype=dtype)
+    if not (mfcc or chroma or mel):
+        return result
+    # librosa (kèm numba, scipy...) chỉ được import khi trích xuất lần đầu, tiến trình chỉ tải mô hình không phải chờ
+    import librosa
+    # librosa giữ nguyên kiểu của tín hiệu (float32 -> STFT complex64) nên chỉ cần ép kiểu đầu vào
+    X = np.asarray(X, dtype=dtype)
+    # cùng tham số mặc định (n_fft=2048, hop_length=512) mà librosa.feature.* dùng khi tự tính STFT
+    with instrumentation.span("stft"):
+        magnitude = np.abs(librosa.stft(X))
+    if mfcc or mel:
+        with instrumentation.span("mel"):
+            mel_spectrogram = librosa.feature.melspectrogram(S=magnitude**2, sr=sample_rate)
+    if mfcc:
+        with instrumentation.span("mfcc"):
+            mfccs = librosa.feature.mfcc(S=librosa.power_to_db(mel_spectrogram), n_mfcc=40)
+        result = np.hstack((result, np.mean(mfccs.T, axis=0)))
+    if chroma:
+        with instrumentation.span("chroma"):
+            chroma = np.mean(librosa.feature.chroma_stft(S=magnitude, sr=sample_rate).T, axis=0)
+        result = np.hstack((result, chroma))
+    if mel:
+        mel = np.mean(mel_spectrogram.T, axis=0)
+        result = np.hstack((result, mel))
+    return result.astype(dtype, copy=False)
+
+
+def _extract_chunk(audio_paths, audio_config, instrumented=False, audio_cache=None):
+    # hàm chạy trong tiến trình con, phải ở mức module để pickle được
+    extract = extract_feature if audio_cache is None else audio_cache.extract_feature
+    if not instrumented:
+        return [ extract(audio_path, **audio_config) for audio_path in audio_paths ], None
+    # tiến trình con đo riêng rồi gửi số liệu về cho tiến trình chính cộng dồn,
+    # xóa số liệu kế thừa khi tiến trình được tạo bằng fork để không bị cộng hai lần
+    instrumentation.enable()
+    instrumentation.reset()
+    features = [ extract(audio_path, **audio_config) for audio_path in audio_paths ]
+    return features, instrumentation.collect()
+
+
+def get_n_jobs(n_jobs):
+    """
+    Quy doi `n_jobs` giong sklearn: None -> 1, so am -> so nhan CPU (-1 la tat ca)
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def iter_features(audio_paths, audio_config, n_jobs=1, chunksize=16, audio_cache=None):
+    """
+    Trich xuat dac trung cho tung tep trong `audio_paths` va tra ve lan luot theo dung thu tu
+        `for feature in iter_features(paths, audio_config, n_jobs=-1): ...`
+    Khi `n_jobs` > 1 cac tep duoc chia thanh tung nhom `chunksize` tep va xu ly trong ProcessPoolExecutor,
+    chi giu toi da 2 nhom moi tien trinh dang cho de bo nho khong tang theo so tep
+    `audio_cache` (`audio_store.AudioStore`) doc tin hieu da giai ma (16000Hz, mono) thay vi giai ma lai tung tep
+    """
+    n_jobs = get_n_jobs(n_jobs)
+    audio_paths = iter(audio_paths)
+    if n_jobs == 1:
+        extract = extract_feature if audio_cache is None else audio_cache.extract_feature
+        for audio_path in audio_paths:
+            yield extract(audio_path, **audio_config)
+        return
+    chunks = iter(lambda: list(islice(audio_paths, chunksize)), [])
+    instrumented = instrumentation.is_enabled()
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque(executor.submit(_extract_chunk, chunk, audio_config, instrumented, audio_cache) for chunk in islice(chunks, 2 * n_jobs))
+        while pending:
+            features, metrics = pending.popleft().result()
+            instrumentation.merge(metrics)
+            # gửi nhóm tiếp theo trước khi trả kết quả để các tiến trình không phải chờ
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(_extract_chunk, chunk, audio_config, instrumented, audio_cache))
+            yield from features
 
 
 def get_best_estimators(classification):
@@ -92,15 +249,16 @@ def get_best_estimators(classification):
         return pickle.load(open("grid/best_regressors.pickle", "rb"))
 
 
-def get_audio_config(features_list):
+def get_audio_config(features_list, dtype=DEFAULT_DTYPE):
     """
     Chuyen doi danh sach dac trung (feature) thanh tu dien de hieu tu loai
-    `data_extractor.AudioExtractor`
+    `data_extractor.AudioExtractor`, kem kieu so thuc `dtype` dung khi trich xuat va luu dac trung
     """
     audio_config = {'mfcc': False, 'chroma': False, 'mel': False}
     for feature in features_list:
         if feature not in audio_config:
             raise TypeError(f"Đặc trưng truyền vào: {feature} không được chấp nhận.")
         audio_config[feature] = True
+    audio_config["dtype"] = get_dtype({"dtype": dtype})
     return audio_config
     
\ No newline at end of file